@@ -0,0 +1,61 @@
+"""
+Scoring benchmark for blog.utils.recommendation.
+
+    python -m benchmarks.recommendation [--candidates 100000] [--runs 50]
+
+Builds a synthetic candidate set (no database needed) and times scoring plus
+top-K selection for one viewer. The budget is 100 ms per viewer on one core.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from blog.utils.recommendation import CandidateSet, score_candidates, top_post_ids
+
+BUDGET_MS = 100
+
+
+def synthetic_candidates(size, vocabulary=2000, authors=5000, seed=7):
+    rng = random.Random(seed)
+    now = time.time()
+    tags = [f"tag{i}" for i in range(vocabulary)]
+
+    return CandidateSet(
+        post_ids=[f"post-{i}" for i in range(size)],
+        author_ids=[f"user-{rng.randrange(authors)}" for _ in range(size)],
+        created_ts=[now - rng.uniform(0, 14 * 24 * 3600) for _ in range(size)],
+        likes=[rng.randrange(500) for _ in range(size)],
+        comments=[rng.randrange(100) for _ in range(size)],
+        saves=[rng.randrange(50) for _ in range(size)],
+        tags=[rng.sample(tags, rng.randrange(6)) for _ in range(size)],
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.recommendation")
+    parser.add_argument("--candidates", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    candidates = synthetic_candidates(args.candidates)
+    print(f"built {candidates.size} candidates ({candidates.tag_codes.size} tags) "
+          f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+    interests = [f"tag{i}" for i in range(0, 200, 10)]
+    timings = []
+    for run in range(args.runs):
+        started = time.perf_counter()
+        scores = score_candidates(candidates, interests, viewer_id=f"user-{run}")
+        top_post_ids(candidates, scores)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    median, worst = statistics.median(timings), max(timings)
+    print(f"score + top-K: median {median:.2f} ms, max {worst:.2f} ms over {args.runs} runs")
+    print("within budget" if median < BUDGET_MS else f"OVER the {BUDGET_MS} ms budget")
+    return 0 if median < BUDGET_MS else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
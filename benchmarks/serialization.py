@@ -0,0 +1,138 @@
+"""
+Response serialization benchmark for the feed page.
+
+    python -m benchmarks.serialization [--requests 2000] [--page-size 20]
+
+Serves the same page of synthetic post cards through two FastAPI routes: the
+default path (pydantic page model + response_model validation + stdlib JSON)
+and the fast path from blog.utils.fast_json (slots adapters + orjson). Reports
+CPU time per request for each, through the full ASGI stack and for the
+response-building step alone (what FastAPI does between the endpoint
+returning and bytes going out).
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+
+os.environ["FAST_JSON_RESPONSES"] = "1"
+
+from fastapi import FastAPI  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+from blog import schemas  # noqa: E402
+from blog.utils import fast_json  # noqa: E402
+
+
+def synthetic_cards(size):
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "post_id": uuid.uuid4(),
+            "content": "Leaf spots spreading on the lower canopy, any advice? " * 3,
+            "created_at": now,
+            "likes": 120 + i,
+            "saves": 8,
+            "liked": i % 2 == 0,
+            "saved": False,
+            "user_id": uuid.uuid4(),
+            "has_video": 0,
+            "comments": 14,
+            "username": f"farmer{i}",
+            "images": "https://storage.example.com/a.jpg,https://storage.example.com/b.jpg",
+            "tags": "tomato,blight",
+            "videos": "",
+            "user_image": "https://storage.example.com/avatar.jpg",
+        }
+        for i in range(size)
+    ]
+
+
+def build_app(cards):
+    app = FastAPI()
+
+    @app.get("/default", response_model=schemas.AllPost)
+    async def default_path():
+        posts = [dict(card) for card in cards]
+        return schemas.AllPost(posts=posts, numb_found=1000, has_more=True, next_cursor="abc")
+
+    @app.get("/fast", response_model=schemas.AllPost)
+    async def fast_path():
+        posts = [dict(card) for card in cards]
+        return fast_json.list_response(
+            schemas.AllPost, "posts", fast_json.PostCardRow, posts,
+            numb_found=1000, has_more=True, next_cursor="abc"
+        )
+
+    return app
+
+
+def encode_default(cards, page_adapter):
+    # Mirrors FastAPI: dump the returned model, validate it against
+    # response_model, serialize to JSON types, then json.dumps
+    page = schemas.AllPost(posts=[dict(card) for card in cards], numb_found=1000, has_more=True, next_cursor="abc")
+    validated = page_adapter.validate_python(page.model_dump())
+    content = page_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def encode_fast(cards):
+    response = fast_json.list_response(
+        schemas.AllPost, "posts", fast_json.PostCardRow, [dict(card) for card in cards],
+        numb_found=1000, has_more=True, next_cursor="abc"
+    )
+    return response.body
+
+
+def cpu_per_call(fn, calls):
+    fn()  # warm up
+    started = time.process_time()
+    for _ in range(calls):
+        fn()
+    return (time.process_time() - started) / calls * 1000
+
+
+def cpu_per_request(client, path, requests):
+    client.get(path)  # warm up
+    started = time.process_time()
+    for _ in range(requests):
+        client.get(path)
+    return (time.process_time() - started) / requests * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.serialization")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--page-size", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if not fast_json.ENABLED:
+        print("orjson is not installed; the fast path is unavailable")
+        return 1
+
+    client = TestClient(build_app(synthetic_cards(args.page_size)))
+
+    # Both paths must produce the same document
+    if client.get("/default").json() != client.get("/fast").json():
+        print("fast path output differs from the default path")
+        return 1
+
+    cards = synthetic_cards(args.page_size)
+    page_adapter = TypeAdapter(schemas.AllPost)
+    print(f"{args.page_size} cards per page, {args.requests} requests each")
+
+    default_ms = cpu_per_call(lambda: encode_default(cards, page_adapter), args.requests)
+    fast_ms = cpu_per_call(lambda: encode_fast(cards), args.requests)
+    print(f"response building  default {default_ms:.3f} ms  fast {fast_ms:.3f} ms  ({default_ms / fast_ms:.1f}x)")
+
+    default_ms = cpu_per_request(client, "/default", args.requests)
+    fast_ms = cpu_per_request(client, "/fast", args.requests)
+    print(f"full request       default {default_ms:.3f} ms  fast {fast_ms:.3f} ms  ({default_ms / fast_ms:.2f}x)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,146 @@
+"""
+Admin commands.
+
+    python -m blog.cli migrate
+    python -m blog.cli reconcile-counters
+    python -m blog.cli rebuild-post-cards [--post-id ID ...]
+    python -m blog.cli refresh-trending [--every SECONDS]
+    python -m blog.cli gc-media [--dry-run] [--delete-missing] [--grace SECONDS] [--verbose]
+"""
+import argparse
+import asyncio
+from pathlib import Path
+
+from sqlalchemy import text
+
+MIGRATIONS_DIR = Path(__file__).parent / "database" / "migrations"
+
+
+def migrate(args):
+    from .database import sync_engine
+
+    with sync_engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                name TEXT PRIMARY KEY,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """))
+        applied = {row.name for row in conn.execute(text("SELECT name FROM schema_migrations"))}
+
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        if path.name in applied:
+            continue
+
+        # One transaction per file so a failing migration leaves earlier ones applied
+        with sync_engine.begin() as conn:
+            conn.exec_driver_sql(path.read_text(encoding="utf-8"))
+            conn.execute(text("INSERT INTO schema_migrations (name) VALUES (:name)"), {"name": path.name})
+        print(f"applied {path.name}")
+
+
+def run_with_session(fn, *args):
+    from .database import async_session
+
+    async def run():
+        async with async_session() as db:
+            return await fn(db, *args)
+
+    return asyncio.run(run())
+
+
+def reconcile_counters(args):
+    from .utils.counters import reconcile_counters as reconcile
+
+    for table, repaired in run_with_session(reconcile).items():
+        print(f"{table}: {repaired} rows repaired")
+
+
+def rebuild_post_cards(args):
+    from .utils import feed_cache
+    from .utils.post_cards import refresh_post_cards
+
+    async def rebuild(db, post_ids):
+        written = await refresh_post_cards(db, post_ids)
+        await db.commit()
+
+        # Only reaches other workers when the feed cache is shared
+        for post_id in post_ids or ():
+            await feed_cache.invalidate_post(post_id)
+        return written
+
+    written = run_with_session(rebuild, args.post_id or None)
+    print(f"post_cards: {written} rows rebuilt")
+
+
+def refresh_trending(args):
+    from .utils.trending import refresh_trending as refresh
+
+    # Run once (for cron), or keep running every --every seconds
+    async def run(db):
+        while True:
+            stats = await refresh(db)
+            print(f"trending: {stats['events']} new events, {stats['posts']} posts and {stats['tags']} tags ranked")
+            if not args.every:
+                return
+            await asyncio.sleep(args.every)
+
+    run_with_session(run)
+
+
+def gc_media(args):
+    from .utils import feed_cache
+    from .utils.media_gc import GC_GRACE_SECONDS, collect_garbage
+
+    grace = GC_GRACE_SECONDS if args.grace is None else args.grace
+
+    async def run(db):
+        report = await collect_garbage(db, dry_run=args.dry_run, delete_missing=args.delete_missing, grace_seconds=grace)
+        for post_id in report.changed_posts:
+            await feed_cache.invalidate_post(post_id)
+        return report
+
+    report = run_with_session(run)
+    verb = "would delete" if report.dry_run else "deleted"
+    print(f"media_objects: {report.repaired_refs} reference counts repaired, {report.released_objects} unreferenced rows dropped")
+    print(f"upload_sessions: {report.expired_sessions} expired")
+    print(f"storage: {report.scanned} objects scanned, {verb} {len(report.orphaned)} unreferenced ({report.orphaned_bytes} bytes)")
+    if not report.dry_run:
+        print(f"storage: {report.deleted} deleted, {report.failed} failed")
+    print(f"rows with a missing object: {len(report.missing)}, {report.removed_rows} removed")
+
+    if args.verbose:
+        for key in report.orphaned:
+            print(f"unreferenced {key}")
+        for table, row_id, key in report.missing:
+            print(f"missing {key} ({table} {row_id})" if row_id is not None else f"missing {key} ({table})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m blog.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("migrate", help="apply pending SQL migrations").set_defaults(func=migrate)
+    commands.add_parser("reconcile-counters", help="recompute engagement counters and repair drift").set_defaults(func=reconcile_counters)
+
+    rebuild = commands.add_parser("rebuild-post-cards", help="recompute post_cards from the source tables")
+    rebuild.add_argument("--post-id", action="append", help="rebuild only this post (repeatable); default is every post")
+    rebuild.set_defaults(func=rebuild_post_cards)
+
+    trending = commands.add_parser("refresh-trending", help="fold new engagement into the trending tables")
+    trending.add_argument("--every", type=int, help="keep running, once every this many seconds")
+    trending.set_defaults(func=refresh_trending)
+
+    gc = commands.add_parser("gc-media", help="delete unreferenced media and report rows whose media is missing")
+    gc.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    gc.add_argument("--delete-missing", action="store_true", help="also delete rows whose object is missing from storage")
+    gc.add_argument("--grace", type=int, default=None, help="keep objects younger than this many seconds (default MEDIA_GC_GRACE_SECONDS)")
+    gc.add_argument("--verbose", action="store_true", help="list every affected key")
+    gc.set_defaults(func=gc_media)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,3 @@
+-- Keyset pagination for the home feed walks posts by (created_at, id).
+CREATE INDEX IF NOT EXISTS posts_created_at_id_idx
+    ON posts (created_at DESC, id DESC);
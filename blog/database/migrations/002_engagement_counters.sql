@@ -0,0 +1,57 @@
+-- Denormalized engagement counters, maintained by the write paths through
+-- blog/utils/counters.py and repaired by `python -m blog.cli reconcile-counters`.
+
+CREATE TABLE IF NOT EXISTS post_stats (
+    post_id UUID PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    likes INTEGER NOT NULL DEFAULT 0,
+    saves INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0  -- top-level comments only
+);
+
+CREATE TABLE IF NOT EXISTS comment_stats (
+    comment_id UUID PRIMARY KEY REFERENCES comments(id) ON DELETE CASCADE,
+    likes INTEGER NOT NULL DEFAULT 0,
+    replies INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    followers INTEGER NOT NULL DEFAULT 0,
+    following INTEGER NOT NULL DEFAULT 0,
+    unread_notifications INTEGER NOT NULL DEFAULT 0
+);
+
+-- Backfill from the source tables
+INSERT INTO post_stats (post_id, likes, saves, comments)
+SELECT
+    p.id,
+    COALESCE(l.n, 0),
+    COALESCE(s.n, 0),
+    COALESCE(c.n, 0)
+FROM posts p
+LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM post_likes GROUP BY post_id) l ON l.post_id = p.id
+LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM saved_posts GROUP BY post_id) s ON s.post_id = p.id
+LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM comments WHERE parent_id IS NULL GROUP BY post_id) c ON c.post_id = p.id
+ON CONFLICT (post_id) DO NOTHING;
+
+INSERT INTO comment_stats (comment_id, likes, replies)
+SELECT
+    c.id,
+    COALESCE(l.n, 0),
+    COALESCE(r.n, 0)
+FROM comments c
+LEFT JOIN (SELECT comment_id, COUNT(*) AS n FROM comment_likes GROUP BY comment_id) l ON l.comment_id = c.id
+LEFT JOIN (SELECT parent_id, COUNT(*) AS n FROM comments WHERE parent_id IS NOT NULL GROUP BY parent_id) r ON r.parent_id = c.id
+ON CONFLICT (comment_id) DO NOTHING;
+
+INSERT INTO user_stats (user_id, followers, following, unread_notifications)
+SELECT
+    u.id,
+    COALESCE(fr.n, 0),
+    COALESCE(fg.n, 0),
+    COALESCE(nt.n, 0)
+FROM users u
+LEFT JOIN (SELECT following_id, COUNT(*) AS n FROM followers GROUP BY following_id) fr ON fr.following_id = u.id
+LEFT JOIN (SELECT follower_id, COUNT(*) AS n FROM followers GROUP BY follower_id) fg ON fg.follower_id = u.id
+LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM notifications WHERE is_read = 0 GROUP BY user_id) nt ON nt.user_id = u.id
+ON CONFLICT (user_id) DO NOTHING;
@@ -0,0 +1,24 @@
+-- Per-user "following" timeline, filled by fan-out-on-write in create_post.
+-- Authors above TIMELINE_FANOUT_THRESHOLD followers are not fanned out;
+-- their posts are merged in at read time from posts_user_created_at_idx.
+
+CREATE TABLE IF NOT EXISTS home_timeline (
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL,
+    post_id UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    author_id UUID NOT NULL,
+    PRIMARY KEY (user_id, created_at, post_id)
+);
+
+-- Unfollow removes one author's entries from one timeline
+CREATE INDEX IF NOT EXISTS home_timeline_user_author_idx
+    ON home_timeline (user_id, author_id);
+
+CREATE INDEX IF NOT EXISTS posts_user_created_at_idx
+    ON posts (user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS followers_following_follower_idx
+    ON followers (following_id, follower_id);
+
+CREATE INDEX IF NOT EXISTS followers_follower_following_idx
+    ON followers (follower_id, following_id);
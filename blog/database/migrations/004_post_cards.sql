@@ -0,0 +1,62 @@
+-- Materialized post cards: everything a feed, history, saved or single-post
+-- response shows, one row per post. create_post writes the row, the counters
+-- in blog/utils/counters.py update it in place, profile edits rewrite the
+-- author columns, and `python -m blog.cli rebuild-post-cards` recomputes it.
+-- The post counters move here from post_stats, which is dropped.
+
+CREATE TABLE IF NOT EXISTS post_cards (
+    post_id UUID PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    user_id UUID NOT NULL,
+    content TEXT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL,
+    has_video INTEGER NOT NULL DEFAULT 0,
+    username TEXT NOT NULL,
+    user_image TEXT NOT NULL DEFAULT '',
+    images TEXT[] NOT NULL DEFAULT '{}',
+    videos TEXT[] NOT NULL DEFAULT '{}',
+    tags TEXT[] NOT NULL DEFAULT '{}',
+    likes INTEGER NOT NULL DEFAULT 0,
+    saves INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0  -- top-level comments only
+);
+
+CREATE INDEX IF NOT EXISTS post_cards_created_at_idx
+    ON post_cards (created_at DESC, post_id DESC);
+
+CREATE INDEX IF NOT EXISTS post_cards_user_created_at_idx
+    ON post_cards (user_id, created_at DESC, post_id DESC);
+
+-- Profile edits rewrite the author columns of every card
+CREATE INDEX IF NOT EXISTS post_cards_user_idx
+    ON post_cards (user_id);
+
+-- Backfill from the source tables
+INSERT INTO post_cards (
+    post_id, user_id, content, created_at, has_video, username, user_image,
+    images, videos, tags, likes, saves, comments
+)
+SELECT
+    p.id,
+    p.user_id,
+    p.content,
+    p.created_at,
+    COALESCE(p.has_video, 0),
+    u.username,
+    COALESCE(u.user_image, ''),
+    COALESCE(i.urls, '{}'),
+    COALESCE(v.urls, '{}'),
+    COALESCE(t.names, '{}'),
+    COALESCE(l.n, 0),
+    COALESCE(s.n, 0),
+    COALESCE(c.n, 0)
+FROM posts p
+JOIN users u ON u.id = p.user_id
+LEFT JOIN (SELECT post_id, ARRAY_AGG(image_url) AS urls FROM post_images GROUP BY post_id) i ON i.post_id = p.id
+LEFT JOIN (SELECT post_id, ARRAY_AGG(video_url) AS urls FROM post_videos GROUP BY post_id) v ON v.post_id = p.id
+LEFT JOIN (SELECT post_id, ARRAY_AGG(tag_name) AS names FROM tags GROUP BY post_id) t ON t.post_id = p.id
+LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM post_likes GROUP BY post_id) l ON l.post_id = p.id
+LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM saved_posts GROUP BY post_id) s ON s.post_id = p.id
+LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM comments WHERE parent_id IS NULL GROUP BY post_id) c ON c.post_id = p.id
+ON CONFLICT (post_id) DO NOTHING;
+
+DROP TABLE IF EXISTS post_stats;
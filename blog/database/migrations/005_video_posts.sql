@@ -0,0 +1,19 @@
+-- Posts that belong in GET /streams: a video was uploaded or the post was
+-- flagged has_video. create_post adds the row; deleting the post cascades.
+-- Replaces the `has_video = 1 OR videos IS NOT NULL` scan over all posts.
+
+CREATE TABLE IF NOT EXISTS video_posts (
+    post_id UUID PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS video_posts_created_at_idx
+    ON video_posts (created_at DESC, post_id DESC);
+
+-- Backfill from the source tables
+INSERT INTO video_posts (post_id, created_at)
+SELECT p.id, p.created_at
+FROM posts p
+WHERE p.has_video = 1
+   OR EXISTS (SELECT 1 FROM post_videos v WHERE v.post_id = p.id)
+ON CONFLICT (post_id) DO NOTHING;
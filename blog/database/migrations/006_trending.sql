@@ -0,0 +1,71 @@
+-- Trending posts and tags, maintained by `python -m blog.cli refresh-trending`
+-- (blog/utils/trending.py). Each run folds the likes, saves and comments
+-- created since trending_watermark into hourly buckets and into decayed
+-- scores, then rewrites the ranked trending_posts / trending_tags tables
+-- that the endpoints page through by rank.
+--
+-- Scores are kept as log2 of the score relative to a fixed epoch, so older
+-- rows never need to be decayed in place: ordering by log_score is the same
+-- as ordering by the decayed score at any moment.
+
+CREATE TABLE IF NOT EXISTS trending_watermark (
+    name TEXT PRIMARY KEY,
+    processed_until TIMESTAMPTZ NOT NULL
+);
+
+-- The first run picks up the last three days of engagement
+INSERT INTO trending_watermark (name, processed_until)
+VALUES ('engagement', NOW() - INTERVAL '3 days')
+ON CONFLICT (name) DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS post_engagement_buckets (
+    post_id UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    bucket TIMESTAMPTZ NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    saves INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (post_id, bucket)
+);
+
+CREATE TABLE IF NOT EXISTS tag_engagement_buckets (
+    tag_name TEXT NOT NULL,
+    bucket TIMESTAMPTZ NOT NULL,
+    likes INTEGER NOT NULL DEFAULT 0,
+    saves INTEGER NOT NULL DEFAULT 0,
+    comments INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (tag_name, bucket)
+);
+
+CREATE INDEX IF NOT EXISTS post_engagement_buckets_bucket_idx ON post_engagement_buckets (bucket);
+CREATE INDEX IF NOT EXISTS tag_engagement_buckets_bucket_idx ON tag_engagement_buckets (bucket);
+
+CREATE TABLE IF NOT EXISTS post_trend_scores (
+    post_id UUID PRIMARY KEY REFERENCES posts(id) ON DELETE CASCADE,
+    log_score DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS tag_trend_scores (
+    tag_name TEXT PRIMARY KEY,
+    log_score DOUBLE PRECISION NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS post_trend_scores_log_score_idx ON post_trend_scores (log_score DESC);
+CREATE INDEX IF NOT EXISTS tag_trend_scores_log_score_idx ON tag_trend_scores (log_score DESC);
+
+-- Ranked snapshots read by GET /posts/trending and GET /tags/trending
+CREATE TABLE IF NOT EXISTS trending_posts (
+    rank INTEGER PRIMARY KEY,
+    post_id UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    score DOUBLE PRECISION NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS trending_tags (
+    rank INTEGER PRIMARY KEY,
+    tag_name TEXT NOT NULL,
+    score DOUBLE PRECISION NOT NULL
+);
+
+-- Only engagement newer than the watermark is read on each run
+CREATE INDEX IF NOT EXISTS post_likes_created_at_idx ON post_likes (created_at);
+CREATE INDEX IF NOT EXISTS saved_posts_created_at_idx ON saved_posts (created_at);
+CREATE INDEX IF NOT EXISTS comments_created_at_idx ON comments (created_at);
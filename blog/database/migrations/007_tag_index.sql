@@ -0,0 +1,37 @@
+-- Normalized tag dictionary and the post_tags inverted index behind
+-- GET /tags/{tag}/posts. `tags` keeps the tag text as typed (shown on cards);
+-- tag_dictionary holds each normalized name (trimmed, lowercase, no leading
+-- '#') once, and post_tags lists a tag's posts newest first.
+
+CREATE TABLE IF NOT EXISTS tag_dictionary (
+    id INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS post_tags (
+    tag_id INTEGER NOT NULL REFERENCES tag_dictionary(id) ON DELETE CASCADE,
+    created_at TIMESTAMPTZ NOT NULL,
+    post_id UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    PRIMARY KEY (tag_id, created_at, post_id)
+);
+
+-- Deletes cascading from posts and the trending job look tags up by post
+CREATE INDEX IF NOT EXISTS post_tags_post_idx ON post_tags (post_id);
+
+-- Backfill from the source tables
+INSERT INTO tag_dictionary (name)
+SELECT DISTINCT LOWER(LTRIM(TRIM(tag_name), '#'))
+FROM tags
+WHERE post_id IS NOT NULL AND LTRIM(TRIM(tag_name), '#') <> ''
+ON CONFLICT (name) DO NOTHING;
+
+INSERT INTO post_tags (tag_id, created_at, post_id)
+SELECT DISTINCT td.id, p.created_at, p.id
+FROM tags t
+JOIN posts p ON p.id = t.post_id
+JOIN tag_dictionary td ON td.name = LOWER(LTRIM(TRIM(t.tag_name), '#'))
+ON CONFLICT DO NOTHING;
+
+-- Trending tag scores and buckets are keyed by the normalized name from now on
+DELETE FROM tag_trend_scores WHERE tag_name NOT IN (SELECT name FROM tag_dictionary);
+DELETE FROM tag_engagement_buckets WHERE tag_name NOT IN (SELECT name FROM tag_dictionary);
@@ -0,0 +1,3 @@
+-- GET /like-history pages through one user's likes, newest like first
+CREATE INDEX IF NOT EXISTS post_likes_user_created_at_idx
+    ON post_likes (user_id, created_at DESC, post_id DESC);
@@ -0,0 +1,3 @@
+-- GET /saves/saved pages through one user's saves, most recently saved first
+CREATE INDEX IF NOT EXISTS saved_posts_user_created_at_idx
+    ON saved_posts (user_id, created_at DESC, post_id DESC);
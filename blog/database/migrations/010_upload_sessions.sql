@@ -0,0 +1,22 @@
+-- Direct-to-storage uploads. POST /uploads records a session and returns a
+-- presigned URL for one object; the client uploads straight to storage and
+-- passes the session id to the endpoint creating the post, comment, message
+-- or product, which checks the object and sets consumed_at in its own
+-- transaction (blog/utils/media.py).
+
+CREATE TABLE IF NOT EXISTS upload_sessions (
+    id UUID PRIMARY KEY,
+    user_id UUID NOT NULL,
+    filename TEXT NOT NULL,
+    content_type TEXT NOT NULL,
+    generated_name TEXT NOT NULL,
+    max_size BIGINT NOT NULL,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    consumed_at TIMESTAMPTZ
+);
+
+-- Sessions that were never used, for cleaning up their objects
+CREATE INDEX IF NOT EXISTS upload_sessions_pending_idx
+    ON upload_sessions (expires_at)
+    WHERE consumed_at IS NULL;
@@ -0,0 +1,46 @@
+-- Image renditions (blog/utils/renditions.py). Image rows record the WebP
+-- thumb and medium URLs, the inline blur placeholder and the original's
+-- dimensions; NULL for images stored before renditions existed, which keep
+-- being shown at their original URL.
+
+ALTER TABLE post_images
+    ADD COLUMN IF NOT EXISTS thumb_url TEXT,
+    ADD COLUMN IF NOT EXISTS medium_url TEXT,
+    ADD COLUMN IF NOT EXISTS placeholder TEXT,
+    ADD COLUMN IF NOT EXISTS width INTEGER,
+    ADD COLUMN IF NOT EXISTS height INTEGER;
+
+ALTER TABLE comment_images
+    ADD COLUMN IF NOT EXISTS thumb_url TEXT,
+    ADD COLUMN IF NOT EXISTS medium_url TEXT,
+    ADD COLUMN IF NOT EXISTS placeholder TEXT,
+    ADD COLUMN IF NOT EXISTS width INTEGER,
+    ADD COLUMN IF NOT EXISTS height INTEGER;
+
+ALTER TABLE message_images
+    ADD COLUMN IF NOT EXISTS thumb_url TEXT,
+    ADD COLUMN IF NOT EXISTS medium_url TEXT,
+    ADD COLUMN IF NOT EXISTS placeholder TEXT,
+    ADD COLUMN IF NOT EXISTS width INTEGER,
+    ADD COLUMN IF NOT EXISTS height INTEGER;
+
+ALTER TABLE product_images
+    ADD COLUMN IF NOT EXISTS thumb_url TEXT,
+    ADD COLUMN IF NOT EXISTS medium_url TEXT,
+    ADD COLUMN IF NOT EXISTS placeholder TEXT,
+    ADD COLUMN IF NOT EXISTS width INTEGER,
+    ADD COLUMN IF NOT EXISTS height INTEGER;
+
+-- Cards carry one entry per image, aligned with `images`: the thumb and
+-- medium URL (the original when there is no rendition) and the placeholder
+-- ('' when there is none)
+ALTER TABLE post_cards
+    ADD COLUMN IF NOT EXISTS thumbnails TEXT[] NOT NULL DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS previews TEXT[] NOT NULL DEFAULT '{}',
+    ADD COLUMN IF NOT EXISTS placeholders TEXT[] NOT NULL DEFAULT '{}';
+
+UPDATE post_cards
+SET thumbnails = images,
+    previews = images,
+    placeholders = array_fill(''::text, ARRAY[cardinality(images)])
+WHERE cardinality(images) > 0;
@@ -0,0 +1,30 @@
+-- Content-addressed media (blog/utils/media.py). Uploads are stored as
+-- "<sha256>.<ext>" under the uploader's prefix, and each stored object has
+-- one row here with its renditions and the number of media rows that
+-- reference it, so the same content is uploaded and rendered once per user.
+-- ref_count is raised in the transaction that inserts the media rows and
+-- lowered when they go away; released_at records when it reached zero, and
+-- the media GC deletes such objects after a grace period.
+
+CREATE TABLE IF NOT EXISTS media_objects (
+    user_id UUID NOT NULL,
+    name TEXT NOT NULL,
+    sha256 TEXT,
+    size BIGINT,
+    content_type TEXT NOT NULL,
+    url TEXT NOT NULL,
+    thumb_url TEXT,
+    medium_url TEXT,
+    placeholder TEXT,
+    width INTEGER,
+    height INTEGER,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    released_at TIMESTAMPTZ,
+    PRIMARY KEY (user_id, name)
+);
+
+-- Unreferenced objects, for the media GC
+CREATE INDEX IF NOT EXISTS media_objects_released_idx
+    ON media_objects (released_at)
+    WHERE ref_count = 0;
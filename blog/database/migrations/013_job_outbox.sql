@@ -0,0 +1,22 @@
+-- Outbox of background jobs (blog/utils/jobs.py). Request handlers insert
+-- rows in their own transaction; each app process claims due rows with
+-- FOR UPDATE SKIP LOCKED, leases them until locked_until and deletes them
+-- once done. A job out of attempts keeps its row with failed_at set.
+
+CREATE TABLE IF NOT EXISTS job_outbox (
+    id UUID PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload JSONB NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    locked_until TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    failed_at TIMESTAMPTZ
+);
+
+-- Jobs still to run, in the order they are claimed
+CREATE INDEX IF NOT EXISTS job_outbox_due_idx
+    ON job_outbox (run_after)
+    WHERE failed_at IS NULL;
@@ -0,0 +1,39 @@
+-- Unique edges for the single-statement toggles (blog/utils/toggles.py).
+-- The toggles insert with ON CONFLICT DO NOTHING and adjust counters by the
+-- rows they actually changed, so a double tap can no longer create two likes,
+-- saves, follows or like notifications.
+--
+-- Duplicates left by the old check-then-insert paths are removed first; run
+-- `python -m blog.cli reconcile-counters` afterwards to recount.
+
+DELETE FROM post_likes a USING post_likes b
+WHERE a.user_id = b.user_id AND a.post_id = b.post_id AND a.ctid > b.ctid;
+
+DELETE FROM saved_posts a USING saved_posts b
+WHERE a.user_id = b.user_id AND a.post_id = b.post_id AND a.ctid > b.ctid;
+
+DELETE FROM comment_likes a USING comment_likes b
+WHERE a.user_id = b.user_id AND a.comment_id = b.comment_id AND a.ctid > b.ctid;
+
+DELETE FROM followers a USING followers b
+WHERE a.follower_id = b.follower_id AND a.following_id = b.following_id AND a.ctid > b.ctid;
+
+DELETE FROM notifications a USING notifications b
+WHERE a.type = 'like' AND b.type = 'like'
+  AND a.actor_id = b.actor_id AND a.entity_type = b.entity_type AND a.entity_id = b.entity_id
+  AND a.ctid > b.ctid;
+
+CREATE UNIQUE INDEX IF NOT EXISTS post_likes_user_post_key ON post_likes (user_id, post_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS saved_posts_user_post_key ON saved_posts (user_id, post_id);
+
+CREATE UNIQUE INDEX IF NOT EXISTS comment_likes_user_comment_key ON comment_likes (user_id, comment_id);
+
+-- Replaces the plain index from 003_home_timeline.sql
+CREATE UNIQUE INDEX IF NOT EXISTS followers_follower_following_key ON followers (follower_id, following_id);
+DROP INDEX IF EXISTS followers_follower_following_idx;
+
+-- One like notification per actor and post or comment
+CREATE UNIQUE INDEX IF NOT EXISTS notifications_like_key
+    ON notifications (actor_id, entity_type, entity_id)
+    WHERE type = 'like';
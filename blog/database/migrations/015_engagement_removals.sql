@@ -0,0 +1,14 @@
+-- Unlikes and unsaves for the trending job (blog/utils/trending.py). The
+-- toggles log every removed like or save with the time it was created, so a
+-- run can take it out of the hourly bucket it was counted in. Rows are
+-- deleted by the run that processes them.
+
+CREATE TABLE IF NOT EXISTS engagement_removals (
+    post_id UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL CHECK (kind IN ('like', 'save')),
+    created_at TIMESTAMPTZ NOT NULL,
+    removed_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS engagement_removals_created_at_idx ON engagement_removals (created_at);
+CREATE INDEX IF NOT EXISTS engagement_removals_removed_at_idx ON engagement_removals (removed_at);
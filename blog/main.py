@@ -14,7 +14,8 @@ from .middleware.authMiddleware import AuthMiddleware
 
 # from .routers import predictionRoute,productRoute, conversationRoute,notificationRoute,postRoute,commentRoute,authRoute,userRoute
 
-from .routers import predictions, post,user, comment, likes, saved, notifications, products, messages
+from .routers import predictions, post,user, comment, likes, saved, notifications, products, messages, tags, uploads
+from .utils import storage, jobs
 
 app = FastAPI()
 
@@ -49,6 +50,23 @@ app.include_router(saved.router)
 app.include_router(notifications.router)
 app.include_router(products.router)
 app.include_router(messages.router)
+app.include_router(tags.router)
+app.include_router(uploads.router)
+
+# Background jobs run in every app process, after the commits that enqueue them
+@app.on_event("startup")
+async def start_jobs():
+    jobs.start_queue()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    await jobs.stop_queue()
+
+
+# With the local storage backend the app serves uploaded media itself
+if storage.STORAGE_BACKEND == "local" and storage.LOCAL_STORAGE_URL.startswith("/"):
+    app.mount(storage.LOCAL_STORAGE_URL, storage.LocalMediaFiles(directory=storage.LOCAL_STORAGE_ROOT, check_dir=False), name="media")
 
 
 for routed in app.routes:
@@ -7,6 +7,7 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1 hour
 from fastapi import Request, HTTPException, status
 from starlette.middleware.base import BaseHTTPMiddleware
 from starlette.responses import JSONResponse
+from ..utils.storage import STORAGE_BACKEND, LOCAL_STORAGE_URL, LOCAL_UPLOAD_PATH
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -27,6 +28,14 @@ class AuthMiddleware(BaseHTTPMiddleware):
         if request.url.path.startswith("/auth/generate-verification-token"):
             return await call_next(request)
 
+        # Presigned local uploads carry their own signature
+        if request.url.path == LOCAL_UPLOAD_PATH:
+            return await call_next(request)
+
+        # Locally stored media is public, like the Firebase objects it stands in for
+        if STORAGE_BACKEND == "local" and request.url.path.startswith(f"{LOCAL_STORAGE_URL}/"):
+            return await call_next(request)
+
         auth_header = request.headers.get("Authorization")
         if not auth_header or not auth_header.startswith("Bearer "):
             return JSONResponse(
@@ -1,8 +1 @@
-from ..controllers.users import route as userRoute
-from ..controllers.authentication import route as authRoute
-from ..controllers.comment import route as commentRoute
-from ..controllers.post import route as postRoute
-from ..controllers.notification import route as notificationRoute
-from ..controllers.conversation import route as conversationRoute
-from ..controllers.product import route as productRoute
-from ..controllers.prediction import route as predictionRoute
\ No newline at end of file
+# The legacy controllers are no longer mounted (see blog/main.py)
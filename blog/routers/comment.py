@@ -6,25 +6,24 @@ import uuid
 from .. import schemas
 from blog.database import get_async_db
 from ..utils.stored_procedure_strings import _get_comments, _get_comment,_get_replies
-from ..utils import generate_random_string
-from ..utils.firebase_interactions import upload_file_to_storage, delete_file_from_storage
+from ..utils.media import upload_media, claim_uploads, parse_upload_ids, insert_media, media_urls
+from ..utils.counters import bump_post_counter, bump_comment_counter, bump_user_counter
+from ..utils.totals import cached_total, forget_total
+from ..utils import feed_cache, toggles
+from ..utils.tags import add_comment_tags, parse_tags
+from ..utils.fast_json import CommentRow, list_response
 
 
 router = APIRouter()
 
+_count_post_comments = text("SELECT COUNT(*) FROM comments WHERE post_id = :post_id")
+
 @router.get('/comments/{post_id}', status_code=status.HTTP_200_OK, response_model = schemas.AllComment)
 async def get_comments(post_id: str,request:Request, db: AsyncSession = Depends(get_async_db)):
     try:
         current_user = request.state.user
-        # Step 1: Get total comment count for the post
-        current_user = request.state.user
-        count_stmt = text("""
-            SELECT COUNT(*) 
-            FROM comments
-            WHERE post_id = :post_id 
-        """)
-        count_result = await db.execute(count_stmt, {"post_id": post_id})
-        total_count = count_result.scalar()
+        # Step 1: Get total comment count for the post (cached, dropped on new comments)
+        total_count = await cached_total(db, f"comments:post:{post_id}", _count_post_comments, {"post_id": post_id})
 
         # Step 2: Get all comments and replies
         result = await db.execute(_get_comments, {"post_id": post_id,"current_user_id":current_user.get('user_id')})
@@ -49,10 +48,7 @@ async def get_comments(post_id: str,request:Request, db: AsyncSession = Depends(
             for row in rows
         ]
          
-        return schemas.AllComment(
-            comments=comments if comments else [],
-            numb_found=total_count or 0
-        )
+        return list_response(schemas.AllComment, "comments", CommentRow, comments, numb_found=total_count or 0, has_more=None)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -96,10 +92,7 @@ async def get_replies(comment_id: str,request:Request, db: AsyncSession = Depend
             for row in rows
         ]
                  
-        return schemas.AllComment(
-            comments=comments if comments else [],
-            numb_found=total_count or 0
-        )
+        return list_response(schemas.AllComment, "comments", CommentRow, comments, numb_found=total_count or 0, has_more=None)
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -130,65 +123,17 @@ async def toggle_comment_like(
     try:
         current_user = request.state.user
 
-        # Check if the comment exists
-        result = await db.execute(
-            text("SELECT content FROM comments WHERE id = :comment_id"),
-            {"comment_id": comment_id}
-        )
-        comment = result.fetchone()
-        if not comment:
+        # Like or unlike, counters and notification in one statement
+        row = await toggles.toggle_comment_like(db, current_user.get("user_id"), comment_id, post_owner)
+        if not row.found:
             raise HTTPException(status_code=404, detail="Comment not found.")
 
-        # Check if the current user already liked the comment
-        like_check = await db.execute(
-            text("SELECT 1 FROM comment_likes WHERE user_id = :user_id AND comment_id = :comment_id"),
-            {"user_id": current_user.get("user_id"), "comment_id": comment_id}
-        )
-        liked = like_check.fetchone()
-
-        if liked:
-            # Remove the like and related notification
-            await db.execute(
-                text("DELETE FROM comment_likes WHERE user_id = :user_id AND comment_id = :comment_id"),
-                {"user_id": current_user.get("user_id"), "comment_id": comment_id}
-            )
-            await db.execute(
-                text("""
-                    DELETE FROM notifications
-                    WHERE actor_id = :user_id AND entity_type = 'comment'
-                    AND entity_id = :comment_id AND type = 'like'
-                """),
-                {"user_id": current_user.get("user_id"), "comment_id": comment_id}
-            )
-            liked = False
-        else:
-            # Insert the like
-            await db.execute(
-                text("""
-                    INSERT INTO comment_likes (comment_id, user_id, created_at)
-                    VALUES (:comment_id, :user_id, NOW())
-                """),
-                {"comment_id": comment_id, "user_id": current_user.get("user_id")}
-            )
-
-            # Insert a notification for the like
-            await db.execute(text("""
-                INSERT INTO notifications (
-                    user_id, actor_id, type, entity_type, entity_id, message, is_read, created_at
-                ) VALUES (
-                    :user_id, :actor_id, 'like', 'comment', :entity_id, :message, 0, NOW()
-                )
-            """), {
-                "user_id": post_owner,
-                "actor_id": current_user.get("user_id"),
-                "entity_id": comment_id,
-                "message": comment.content,
-            })
-            liked = True
-
         await db.commit()
-        return {"comment_id": comment_id, "liked": liked}
+        return {"comment_id": comment_id, "liked": row.liked}
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
@@ -204,6 +149,7 @@ async def add_comment(
     content: str = Form(...),
     tags: Optional[str] = Form(None),    
     files: Optional[List[UploadFile]] = File(None), 
+    upload_ids: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
@@ -225,6 +171,12 @@ async def add_comment(
         if not user:
             raise HTTPException(status_code=400, detail="Unauthenticated user.")
 
+        # Upload before inserting, so no row locks are held across storage round trips.
+        # The checks above only read; ending their transaction frees the connection meanwhile
+        await db.rollback()
+        uploaded_media = await upload_media(db, current_user.get("user_id"), files, owner="comment")
+        media = uploaded_media + await claim_uploads(db, current_user.get("user_id"), parse_upload_ids(upload_ids), "comment")
+
         # Insert comment
         comment_result = await db.execute(text("""
             INSERT INTO comments (post_id, user_id, content, created_at, has_video)
@@ -235,63 +187,11 @@ async def add_comment(
         created_comment = comment_result.fetchone()
         comment_id = created_comment._mapping["id"]
         
-        if tags:
-            tag_list = tags.split(",")
-            for tag in tag_list:
-                await db.execute(text("""
-                    INSERT INTO tags ( tag_name, created_at, comment_id, creator)
-                    VALUES( :tag_name, NOW(), :comment_id, :creator)
-                """), {
-                    "tag_name": tag,
-                    "comment_id": comment_id,
-                    "creator": "user"
-                })
-
-        image_urls = []
-        video_urls = []
-        generated_names = []
-
-        if files:
-            for file in files:
-                mimetype = file.content_type.split("/")[0]
-                content_type = file.content_type
-                file_bytes = await file.read()
-                file_name = file.filename
-                extension = file_name.split(".")[-1]
-                generated_name = f"plant.disease.detection.{generate_random_string()}.{extension}"
-                generated_names.append(generated_name)
-
-                file_url = await upload_file_to_storage(current_user.get("user_id"), generated_name, file_bytes, content_type)
-
-                if file_url:
-                    if mimetype == "image":
-                        await db.execute(text("""
-                            INSERT INTO comment_images (comment_id, image_url, filename, user_id, generated_name)
-                            VALUES (:comment_id, :image_url, :filename, :user_id, :generated_name)
-                        """), {
-                            "comment_id": comment_id,
-                            "image_url": file_url,
-                            "filename": file_name,
-                            "user_id": current_user.get("user_id"),
-                            "generated_name": generated_name
-                        })
-                        
-                        image_urls.append(file_url)
-
-                    elif mimetype == "video":
-                        await db.execute(text("""
-                            INSERT INTO comment_videos (comment_id, video_url, filename, user_id, generated_name)
-                            VALUES (:comment_id, :video_url, :filename, :user_id, :generated_name)
-                        """), {
-                            "comment_id": comment_id,
-                            "video_url": file_url,
-                            "filename": file_name,
-                            "user_id": current_user.get("user_id"),
-                            "generated_name": generated_name
-                        })
-                        
-                        video_urls.append(file_url)
+        await add_comment_tags(db, comment_id, parse_tags(tags))
 
+        await insert_media(db, "comment", comment_id, current_user.get("user_id"), media)
+        image_urls = media_urls(media, "image")
+        video_urls = media_urls(media, "video")
 
         # Create notification
         await db.execute(text("""
@@ -310,7 +210,12 @@ async def add_comment(
             "message": post.content
         })
 
+        await bump_post_counter(db, post_id, "comments", 1)
+        await bump_user_counter(db, post_owner, "unread_notifications", 1)
+
         await db.commit()
+        forget_total(f"comments:post:{post_id}")
+        await feed_cache.invalidate_post(post_id)
 
         return {
             "id": comment_id,
@@ -321,14 +226,11 @@ async def add_comment(
             "videos": ",".join(video_urls)
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e: 
         await db.rollback()
-        if generated_names:
-            for gen_name in generated_names:
-                try:
-                    await delete_file_from_storage(current_user.get("user_id"), gen_name)
-                except Exception as cleanup_error:
-                    print(f"Failed to delete uploaded file {gen_name}: {cleanup_error}")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 
@@ -342,14 +244,10 @@ async def add_reply_comment(
     has_video: Optional[int] = Form(None),
     post_owner: str = Form(...),
     files: List[UploadFile] = File(None), 
+    upload_ids: Optional[str] = Form(None),
     content: str = Form(...),
     db: AsyncSession = Depends(get_async_db)
 ):
-    # ✅ Ensure these are defined before try block
-    generated_names = []
-    image_urls = []
-    video_urls = []
-
     try:
         current_user = request.state.user
         video_value = int(has_video) if has_video else 0
@@ -370,6 +268,12 @@ async def add_reply_comment(
         if not user:
             raise HTTPException(status_code=400, detail="Unauthenticated user.")
 
+        # ✅ Upload files before inserting, so no row locks are held across storage round trips.
+        # The checks above only read; ending their transaction frees the connection meanwhile
+        await db.rollback()
+        uploaded_media = await upload_media(db, current_user.get("user_id"), files, owner="comment")
+        media = uploaded_media + await claim_uploads(db, current_user.get("user_id"), parse_upload_ids(upload_ids), "comment")
+
         # ✅ Insert the reply comment
         comment_result = await db.execute(text("""
             INSERT INTO comments (post_id, user_id, content, parent_id, created_at, has_video)
@@ -388,58 +292,12 @@ async def add_reply_comment(
         created_at = created_comment._mapping["created_at"]
 
         # ✅ Handle tags
-        if tags:
-            tag_list = tags.split(",")
-            for tag in tag_list:
-                await db.execute(text("""
-                    INSERT INTO tags (tag_name, created_at, comment_id, creator)
-                    VALUES (:tag_name, NOW(), :comment_id, :creator)
-                """), {
-                    "tag_name": tag.strip(),
-                    "comment_id": new_comment_id,
-                    "creator": "user"
-                })
-
-        # ✅ Handle file uploads (images/videos)
-        if files:
-            for file in files:
-                mimetype = file.content_type.split("/")[0]
-                content_type = file.content_type
-                file_bytes = await file.read()
-                file_name = file.filename
-                extension = file_name.split(".")[-1]
-                generated_name = f"plant.disease.detection.{generate_random_string()}.{extension}"
-
-                file_url = await upload_file_to_storage(current_user.get("user_id"), generated_name, file_bytes, content_type)
-
-                if file_url:
-                    generated_names.append(generated_name)
-
-                    if mimetype == "image":
-                        await db.execute(text("""
-                            INSERT INTO comment_images (comment_id, image_url, filename, user_id, generated_name)
-                            VALUES (:comment_id, :image_url, :filename, :user_id, :generated_name)
-                        """), {
-                            "comment_id": new_comment_id,
-                            "image_url": file_url,
-                            "filename": file_name,
-                            "user_id": current_user.get("user_id"),
-                            "generated_name": generated_name
-                        })
-                        image_urls.append(file_url)
-
-                    elif mimetype == "video":
-                        await db.execute(text("""
-                            INSERT INTO comment_videos (comment_id, video_url, filename, user_id, generated_name)
-                            VALUES (:comment_id, :video_url, :filename, :user_id, :generated_name)
-                        """), {
-                            "comment_id": new_comment_id,
-                            "video_url": file_url,
-                            "filename": file_name,
-                            "user_id": current_user.get("user_id"),
-                            "generated_name": generated_name
-                        })
-                        video_urls.append(file_url)
+        await add_comment_tags(db, new_comment_id, parse_tags(tags))
+
+        # ✅ Store the uploaded images/videos
+        await insert_media(db, "comment", new_comment_id, current_user.get("user_id"), media)
+        image_urls = media_urls(media, "image")
+        video_urls = media_urls(media, "video")
 
         # ✅ Create notification
         await db.execute(text("""
@@ -458,7 +316,11 @@ async def add_reply_comment(
             "message": parent_comment.content
         })
 
+        await bump_comment_counter(db, comment_id, "replies", 1)
+        await bump_user_counter(db, post_owner, "unread_notifications", 1)
+
         await db.commit()
+        forget_total(f"comments:post:{post_id}")
 
         return {
             "id": new_comment_id,
@@ -471,15 +333,10 @@ async def add_reply_comment(
             "created_at": created_at
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
 
-        # ✅ Cleanup uploaded files on error
-        if generated_names:
-            for gen_name in generated_names:
-                try:
-                    await delete_file_from_storage(current_user.get("user_id"), gen_name)
-                except Exception as cleanup_error:
-                    print(f"Failed to delete uploaded file {gen_name}: {cleanup_error}")
-
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
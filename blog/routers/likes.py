@@ -1,16 +1,21 @@
 from fastapi import APIRouter,Request
-from fastapi import status,Form
+from fastapi import status,Form,Query
 from .. import schemas
 from sqlalchemy import text
 from fastapi import Depends
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
-from typing import List
+from typing import List, Optional
 import uuid
 from datetime import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
 from blog.database import get_db,get_async_db
-from .. utils.stored_procedure_strings import _get_recommeneded_post
+from .. utils.stored_procedure_strings import _get_liked_post_ids, _get_liked_post_ids_after_cursor
+from ..utils import feed_cache, toggles
+from ..utils.jobs import enqueue
+from ..utils.pagination import decode_cursor, page_with_cursor
+from ..utils.hydration import hydrate_viewer_state
+from ..utils.totals import paged_total
 
 
 router = APIRouter()
@@ -23,109 +28,42 @@ async def toggle_like(
     post_owner: str = Form(...),
     db: AsyncSession = Depends(get_async_db)
 ):
+    # post_owner is still accepted from the client; the notification goes to posts.user_id
     try:
-        from ..socket_manager import sio, getSocket
         current_user = request.state.user
-        like_id = None
-        notification_id = None
-        post_owner_id = None
-
-        # Check if already liked
-        result = await db.execute(text("""
-            SELECT 1 FROM post_likes WHERE user_id = :user_id AND post_id = :post_id
-        """), {
-            "user_id": current_user.get("user_id"),
-            "post_id": post_id
-        })
-        existing_like = result.fetchone()
 
-        # Get post content and owner
-        post_row = await db.execute(text("""
-            SELECT content, user_id FROM posts WHERE id = :post_id
-        """), {
-            "post_id": post_id
-        })
-        row = post_row.fetchone()
-        if not row:
+        # Like or unlike, counters and notification in one statement
+        row = await toggles.toggle_post_like(db, current_user.get("user_id"), post_id)
+        if row.owner_id is None:
             raise HTTPException(status_code=404, detail="Post not found")
 
-        post_content = row.content or ""
-        post_owner_id = row.user_id
-
-        if existing_like:
-            # Unlike
-            await db.execute(text("""
-                DELETE FROM post_likes WHERE user_id = :user_id AND post_id = :post_id
-            """), {
-                "user_id": current_user.get("user_id"),
-                "post_id": post_id
-            })
-
-            await db.execute(text("""
-                DELETE FROM notifications 
-                WHERE entity_id = :post_id AND actor_id = :user_id AND type = 'like'
-            """), {
-                "post_id": post_id,
-                "user_id": current_user.get("user_id")
-            })
-
-            liked = False
-        else:
-            # Like and get inserted post_like ID
-            insert_like = await db.execute(text("""
-                INSERT INTO post_likes (post_id, user_id, created_at)
-                VALUES (:post_id, :user_id, CURRENT_TIMESTAMP)
-                RETURNING id
-            """), {
-                "post_id": post_id,
-                "user_id": current_user.get("user_id"),
-            })
-            like_row = insert_like.fetchone()
-            like_id = like_row.id if like_row else None
-
-            # Insert notification
-            insert_notif = await db.execute(text("""
-                INSERT INTO notifications (
-                    user_id, actor_id, type, entity_type, entity_id,
-                    message, is_read, created_at
-                ) VALUES (
-                    :user_id, :actor_id, :type, :entity_type, :entity_id,
-                    :message, :is_read, CURRENT_TIMESTAMP
-                )
-                RETURNING id
-            """), {
-                "user_id": post_owner,
-                "actor_id": current_user.get("user_id"),
-                "type": "like",
+        # Broadcast to the Socket.IO group (room) once committed
+        await enqueue(db, "socket.emit", {
+            "event": "foot_notifications",
+            "data": {
+                "user_id": str(row.owner_id),
                 "entity_type": "post",
+                "type": "like",
                 "entity_id": post_id,
-                "message": post_content,
-                "is_read": 0,
-            })
-            notif_row = insert_notif.fetchone()
-            notification_id = notif_row.id if notif_row else None
-
-            liked = True
-
-        # ✅ Emit to the Socket.IO group (room)
-        sid = getSocket(str(current_user.get("user_id"))) 
-        await sio.emit("foot_notifications", {
-            "user_id": str(post_owner_id),
-            "entity_type": "post",
-            "type": "like",
-            "entity_id": post_id,
-            "liked": liked
-        }, room="post_footer_notifications",skip_sid=sid)  
+                "liked": row.liked
+            },
+            "room": "post_footer_notifications",
+            "skip_user": str(current_user.get("user_id")),
+        })
 
         await db.commit()
+        await feed_cache.invalidate_post(post_id)
 
         return {
             "post_id": post_id,
-            "liked": liked,
-            "like_id": like_id,
-            "notification_id": notification_id if liked else None
+            "liked": row.liked,
+            "like_id": row.like_id,
+            "notification_id": row.notification_id if row.liked else None
         }
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -133,27 +71,40 @@ async def toggle_like(
 
 
 
-@router.get('/like-history/{user_id}', status_code=status.HTTP_200_OK, response_model=List[schemas.GetAllPost])
-async def like_history( request:Request, db: AsyncSession = Depends(get_async_db)):
+@router.get('/like-history/{user_id}', status_code=status.HTTP_200_OK, response_model=schemas.AllPost)
+async def like_history(
+    request:Request,
+    limit: int = Query(10, gt=0, le=50),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
     try:
-        # Get liked post IDs
+        # Always the caller's own likes, whatever user_id the path carries
         current_user = request.state.user
-        likes_stmt = text("""SELECT STRING_AGG(post_id, ',') AS post_ids FROM post_likes WHERE user_id = :user_id""")
-        result = await db.execute(likes_stmt, {"user_id": current_user.get("user_id")})
-        post_ids_row = result.fetchone()
-        post_ids_str = post_ids_row.post_ids if post_ids_row and post_ids_row.post_ids else ""
-
-        if post_ids_str:
-            recommended_posts_result = await db.execute(_get_recommeneded_post, {"PostIds": post_ids_str})
-            posts = recommended_posts_result.fetchall()
-
-            return [dict(row._mapping) for row in posts]
+        params = {"user_id": current_user.get("user_id"), "limit": limit + 1}
+
+        if cursor:
+            try:
+                params["cursor_created_at"], params["cursor_post_id"] = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            result = await db.execute(_get_liked_post_ids_after_cursor, params)
         else:
-            raise HTTPException(status_code=404, detail="No liked posts found.")
-
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+            result = await db.execute(_get_liked_post_ids, params)
 
+        page, next_cursor = page_with_cursor([dict(row._mapping) for row in result.fetchall()], limit)
 
+        posts = await feed_cache.get_cards(db, [entry["post_id"] for entry in page])
+        await hydrate_viewer_state(db, posts, current_user.get("user_id"))
 
+        return schemas.AllPost(
+            posts=posts,
+            numb_found=paged_total(0, len(posts), next_cursor is not None),
+            has_more=next_cursor is not None,
+            next_cursor=next_cursor
+        )
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -8,11 +8,10 @@ from blog.database import get_async_db
 from ..utils.stored_procedure_strings import _get_messaged_friends,_get_group_conversations
 import uuid
 import bcrypt
-from ..utils import generate_random_string
 from uuid import UUID
 router = APIRouter()
 userMap = {}  # Stores user_id -> socket_id mapping
-from ..utils.firebase_interactions import upload_file_to_storage, delete_file_from_storage
+from ..utils.media import upload_media, claim_uploads, parse_upload_ids, insert_media, media_urls
 
 
 
@@ -223,6 +222,7 @@ async def send_message(
     is_group: Optional[int] = Form(None),
     files: Optional[List[UploadFile]] = File(None),
     conversation_id: Optional[str] = Form(None),
+    upload_ids: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
@@ -231,11 +231,13 @@ async def send_message(
         edited_member_ids = member_ids[0].split(",")
         new_conversation_id = conversation_id
 
-        image_urls = []
-        video_urls = []
-        generated_names = []
+        # 1. Upload the attachments concurrently, before any row is written
+        uploaded_media = await upload_media(db, current_user.get("user_id"), files, owner="message")
+        media = uploaded_media + await claim_uploads(db, current_user.get("user_id"), parse_upload_ids(upload_ids), "message")
+        image_urls = media_urls(media, "image")
+        video_urls = media_urls(media, "video")
 
-        # 1. Insert the base message
+        # 2. Insert the base message
         msg_result = await db.execute(text("""
             INSERT INTO messages (conversation_id, sender_id, content, created_at)
             VALUES (:conversation_id, :sender_id, :content, NOW())
@@ -251,47 +253,10 @@ async def send_message(
             raise HTTPException(status_code=500, detail="Failed to create message")
         row = row._mapping
 
-        # 2. Process file uploads and insert into your tracking tables
-        if files:
-            for file in files:
-                mimetype = file.content_type.split("/")[0]
-                content_type = file.content_type
-                file_bytes = await file.read()
-                extension = file.filename.split(".")[-1]
-                generated_name = f"plant.disease.detection.{generate_random_string()}.{extension}"
-                generated_names.append(generated_name)
-
-                file_url = await upload_file_to_storage(current_user.get("user_id"), generated_name, file_bytes, content_type)
-
-                if file_url:
-                    if mimetype == "image":
-                        image_urls.append(file_url)
-                        await db.execute(text("""
-                            INSERT INTO message_images 
-                            (message_id, image_url, filename, user_id, generated_name)
-                            VALUES (:msg_id, :url, :fname, :uid, :gname)
-                        """), {
-                            "msg_id": row["id"],
-                            "url": file_url,
-                            "fname": file.filename,
-                            "uid": current_user.get("user_id"),
-                            "gname": generated_name
-                        })
-                    elif mimetype == "video":
-                        video_urls.append(file_url)
-                        await db.execute(text("""
-                            INSERT INTO message_videos 
-                            (message_id, video_url, filename, user_id, generated_name)
-                            VALUES (:msg_id, :url, :fname, :uid, :gname)
-                        """), {
-                            "msg_id": row["id"],
-                            "url": file_url,
-                            "fname": file.filename,
-                            "uid": current_user.get("user_id"),
-                            "gname": generated_name
-                        })
-
-        # 3. Fetch sender image
+        # 3. Insert the attachments into the tracking tables
+        await insert_media(db, "message", row["id"], current_user.get("user_id"), media)
+
+        # 4. Fetch sender image
         user_info = await db.execute(text("SELECT user_image FROM users WHERE id = :uid"), {
             "uid": current_user.get("user_id")
         })
@@ -300,21 +265,27 @@ async def send_message(
 
         await db.commit()
 
-        # 4. Emit via WebSocket to other member(s)
+        # 5. Emit via WebSocket to other member(s). Sent from this process rather
+        # than a socket.emit job: getSocket() only knows sockets connected to the
+        # process it runs in, and a job runs in whichever process claims it
         receiver_ids = [uid for uid in edited_member_ids if uid != current_user.get("reference_id")]
         if receiver_ids:
             sid = getSocket(receiver_ids[0])
             if sid:
-                await sio.emit("chat_response", {
-                    "id": str(row["id"]),
-                    "conversation_id": str(row["conversation_id"]),
-                    "sender_id": str(row["sender_id"]),
-                    "content": row["content"],
-                    "created_at": row["created_at"].isoformat(),
-                    "image_urls": image_urls,
-                    "video_urls": video_urls,
-                    "user_image": user_image
-                }, to=str(sid))
+                try:
+                    await sio.emit("chat_response", {
+                        "id": str(row["id"]),
+                        "conversation_id": str(row["conversation_id"]),
+                        "sender_id": str(row["sender_id"]),
+                        "content": row["content"],
+                        "created_at": row["created_at"].isoformat(),
+                        "image_urls": image_urls,
+                        "video_urls": video_urls,
+                        "user_image": user_image
+                    }, to=str(sid))
+                except Exception as e:
+                    # The message is stored; the receiver gets it on the next fetch
+                    print(f"Failed to emit chat_response: {e}")
 
         return schemas.MessageOut(
             id=str(row["id"]),
@@ -326,14 +297,11 @@ async def send_message(
             created_at=row["created_at"]
         )
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
-        if generated_names:
-            for gen_name in generated_names:
-                try:
-                    await delete_file_from_storage(current_user.get("user_id"), gen_name)
-                except Exception as cleanup_error:
-                    print(f"Failed to delete uploaded file {gen_name}: {cleanup_error}")
         raise HTTPException(status_code=500, detail=f"Server error: {str(e)}")
 
 @router.post('/conversation/create', status_code=status.HTTP_201_CREATED)
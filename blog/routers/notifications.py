@@ -5,6 +5,9 @@ from typing import List
 from blog.database import get_async_db
 from .. import schemas
 from ..utils.stored_procedure_strings import _get_notifications_by_user_id
+from ..utils.counters import bump_user_counter
+from ..utils.totals import paged_total
+from ..utils.fast_json import NotificationRow, list_response
 from sqlalchemy import text, bindparam
 from sqlalchemy.sql import tuple_
 
@@ -18,32 +21,31 @@ async def get_notifications(
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        # Get total count
         current_user = request.state.user
-        get_size_stmt = text("SELECT COUNT(*) FROM notifications WHERE user_id = :user_id")
-        total_count_result = await db.execute(get_size_stmt, {"user_id": str(current_user.get("user_id"))})
-        total_count = total_count_result.scalar()
 
         # Pagination offset
         cal_offset = (offset - 1) * limit
 
-        # Use _get_notifications_by_user_id directly (it's already a TextClause)
+        # Use _get_notifications_by_user_id directly (it's already a TextClause).
+        # One extra row tells us whether another page exists, so no COUNT(*) is needed.
         result = await db.execute(_get_notifications_by_user_id, {
             "user_id": str(current_user.get("user_id")),
             "offset": cal_offset,
-            "limit": limit
+            "limit": limit + 1
         })
 
         rows = result.fetchall()
         if not rows:
             raise HTTPException(status_code=404, detail="No notifications found.")
 
-        notifications = [dict(row._mapping) for row in rows]
+        notifications = [dict(row._mapping) for row in rows[:limit]]
+        has_more = len(rows) > limit
         
         if notifications:    
-            return schemas.AllNotifications(
-                notifications=notifications,
-                numb_found=total_count
+            return list_response(
+                schemas.AllNotifications, "notifications", NotificationRow, notifications,
+                numb_found=paged_total(cal_offset, len(notifications), has_more),
+                has_more=has_more
             )
         
         return schemas.AllNotifications(notifications=[],numb_found=0) 
@@ -65,11 +67,12 @@ async def get_notifications(
         if not notification_id:
             raise HTTPException(status_code=400, detail="No notification IDs provided")
 
-        # Use tuple_() to safely inject list into IN clause
+        # Use tuple_() to safely inject list into IN clause.
+        # Only unread rows are touched so the unread counter stays exact.
         stmt = text("""
             UPDATE notifications
             SET is_read = :is_read
-            WHERE id IN :ids AND user_id = :user_id
+            WHERE id IN :ids AND user_id = :user_id AND is_read = 0
             RETURNING id
         """).bindparams(
             bindparam("ids", expanding=True)  # key to make :ids work with lists
@@ -79,12 +82,15 @@ async def get_notifications(
             stmt,
             {
                 "ids": notification_id,
-                "is_read": 1
+                "is_read": 1,
+                "user_id": current_user.get("user_id")
             }
         )
+        updated_ids = [row.id for row in result.fetchall()]
+
+        await bump_user_counter(db, current_user.get("user_id"), "unread_notifications", -len(updated_ids))
         await db.commit()
 
-        updated_ids = [row.id for row in result.fetchall()]
         return {"updated": updated_ids}
 
     except Exception as e:
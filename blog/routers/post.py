@@ -5,12 +5,46 @@ from typing import List, Optional
 import uuid
 from .. import schemas
 from blog.database import get_async_db
-from ..utils.firebase_interactions import upload_file_to_storage, delete_file_from_storage
-from ..utils import generate_random_string
-from ..utils.stored_procedure_strings import _get_recommeneded_post, _get_post, _get_post_history,_get_all_posts,_get_single_post,_get_all_streams
+from ..utils.jobs import enqueue
+from ..utils.media import (
+    upload_media, claim_uploads, parse_upload_ids, insert_media, drop_media, media_urls,
+)
+from ..utils.stored_procedure_strings import _get_post, _get_post_history,_get_all_post_ids,_get_single_post,_get_all_streams,_get_all_post_ids_after_cursor,_get_all_streams_after_cursor
+from ..utils.stored_procedure_strings import _get_following_timeline, _get_following_timeline_after_cursor, _get_trending_post_ids
+from ..utils.pagination import decode_cursor, page_with_cursor
+from ..utils.hydration import hydrate_viewer_state
+from ..utils.totals import cached_total, estimated_total, forget_total, paged_total
+from ..utils.timeline import FANOUT_THRESHOLD
+from ..utils import feed_cache
+from ..utils.post_cards import refresh_post_cards
+from ..utils.recommendation import recommend_posts
+from ..utils.tags import add_post_tags, parse_tags
+from ..utils.fast_json import PostCardRow, list_response
 
 router = APIRouter()
 
+# Most post ids GET /posts/batch and POST /posts/interactions take per request
+MAX_BATCH_IDS = 50
+MAX_INTERACTION_IDS = 100
+
+_count_user_posts = text("SELECT COUNT(*) FROM posts WHERE user_id = :user_id")
+
+_count_video_posts = text("SELECT COUNT(*) FROM video_posts")
+
+_add_video_post = text("""
+    INSERT INTO video_posts (post_id, created_at)
+    SELECT id, created_at FROM posts WHERE id = :post_id
+    ON CONFLICT (post_id) DO NOTHING
+""")
+
+# Counters are read from post_cards on every call, not from the per-process
+# card cache: a viewer polling them must see taps made through other workers
+_get_interaction_counts = text("""
+    SELECT post_id, likes, saves, comments
+    FROM post_cards
+    WHERE post_id = ANY(CAST(:post_ids AS uuid[]))
+""")
+
 
 @router.get("/posts/history", response_model=schemas.AllPost)
 async def post_history(
@@ -24,23 +58,17 @@ async def post_history(
         
         cal_offset = (offset - 1) * limit
 
-        # Count the number of posts
-        count_stmt = text("""
-            SELECT COUNT(*)
-            FROM posts p
-            WHERE p.user_id = :user_id
-        """)
-
-        count_result = await db.execute(count_stmt, {"user_id": user_id})
-        total_count = count_result.scalar()
+        # Count the number of posts (cached, dropped when the user posts or deletes)
+        total_count = await cached_total(db, f"posts:user:{user_id}", _count_user_posts, {"user_id": user_id})
 
         # Fetch post history
         result = await db.execute(_get_post_history, {"user_id": user_id, "offset": cal_offset,
-            "limit": limit,"current_user_id":current_user.get('user_id')})
-        posts = result.fetchall()
+            "limit": limit})
+        posts = [dict(row._mapping) for row in result.fetchall()]
+        await hydrate_viewer_state(db, posts, user_id)
 
         return schemas.AllPost(
-            posts=[row._mapping for row in posts] if posts else [],
+            posts=posts,
             numb_found=total_count or 0
         )
 
@@ -48,52 +76,190 @@ async def post_history(
         raise HTTPException(status_code=500, detail=f"Error fetching post history: {str(e)}")
 
 
+@router.get("/posts/following", response_model=schemas.AllPost)
+async def following_feed(
+    request: Request,
+    limit: int = Query(10, gt=0, le=50),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)):
+    try:
+        current_user = request.state.user
+        params = {
+            "viewer_id": current_user.get("user_id"),
+            "fanout_threshold": FANOUT_THRESHOLD,
+            "limit": limit + 1
+        }
+
+        if cursor:
+            try:
+                params["cursor_created_at"], params["cursor_post_id"] = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            result = await db.execute(_get_following_timeline_after_cursor, params)
+        else:
+            result = await db.execute(_get_following_timeline, params)
+
+        page, next_cursor = page_with_cursor([dict(row._mapping) for row in result.fetchall()], limit)
+
+        posts = await feed_cache.get_cards(db, [entry["post_id"] for entry in page])
+        await hydrate_viewer_state(db, posts, current_user.get("user_id"))
+
+        return schemas.AllPost(
+            posts=posts,
+            numb_found=paged_total(0, len(posts), next_cursor is not None),
+            has_more=next_cursor is not None,
+            next_cursor=next_cursor
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching following feed: {str(e)}")
+
+
+@router.get("/posts/trending", response_model=schemas.AllPost)
+async def trending_posts(
+    request: Request,
+    offset: int = Query(1, ge=1),
+    limit: int = Query(10, gt=0, le=50),
+    db: AsyncSession = Depends(get_async_db)):
+    try:
+        current_user = request.state.user
+        cal_offset = (offset - 1) * limit
+
+        result = await db.execute(_get_trending_post_ids, {"offset": cal_offset, "limit": limit})
+        rows = result.fetchall()
+        last_rank = (rows[0].last_rank if rows else 0) or 0
+
+        posts = await feed_cache.get_cards(db, [row.post_id for row in rows])
+        await hydrate_viewer_state(db, posts, current_user.get("user_id"))
+
+        return schemas.AllPost(
+            posts=posts,
+            numb_found=last_rank,
+            has_more=cal_offset + limit < last_rank
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching trending posts: {str(e)}")
+
+
+@router.get("/posts/recommended", response_model=schemas.AllPost)
+async def recommended_posts(
+    request: Request,
+    offset: int = Query(1, ge=1),
+    limit: int = Query(10, gt=0, le=50),
+    db: AsyncSession = Depends(get_async_db)):
+    try:
+        current_user = request.state.user
+        user_id = current_user.get("user_id")
+
+        # Ranked ids are cached per viewer; pages are slices of that list
+        post_ids = await recommend_posts(db, user_id)
+        cal_offset = (offset - 1) * limit
+        page_ids = post_ids[cal_offset:cal_offset + limit]
+
+        posts = await feed_cache.get_cards(db, page_ids)
+        await hydrate_viewer_state(db, posts, user_id)
+
+        return schemas.AllPost(
+            posts=posts,
+            numb_found=len(post_ids),
+            has_more=cal_offset + limit < len(post_ids)
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching recommended posts: {str(e)}")
+
+
+@router.get("/posts/batch", response_model=schemas.PostBatch)
+async def get_posts_batch(
+    request: Request,
+    ids: str = Query(..., description="comma-separated post ids"),
+    db: AsyncSession = Depends(get_async_db)):
+    try:
+        try:
+            post_ids = list(dict.fromkeys(str(uuid.UUID(post_id.strip())) for post_id in ids.split(",") if post_id.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid post id")
+
+        if not post_ids or len(post_ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"Give between 1 and {MAX_BATCH_IDS} post ids")
+
+        # Cards keep the requested order; ids without a card are reported back
+        posts = await feed_cache.get_cards(db, post_ids)
+        await hydrate_viewer_state(db, posts, request.state.user.get("user_id"))
+
+        found = {str(post["post_id"]) for post in posts}
+        return schemas.PostBatch(
+            posts=posts,
+            missing=[post_id for post_id in post_ids if post_id not in found]
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get('/posts/{post_id}', response_model=schemas.GetAllPost)
 async def get_post(post_id: str,request:Request,db: AsyncSession = Depends(get_async_db)):
     try:
         current_user = request.state.user
-        result = await db.execute(_get_single_post, {"currentPostId": post_id, "current_user_id":current_user.get('user_id')})
+        result = await db.execute(_get_single_post, {"currentPostId": post_id})
         post = result.fetchone()
 
         if not post:
             raise HTTPException(status_code=404, detail="No recommended posts found.")
 
-        return post._mapping
+        posts = await hydrate_viewer_state(db, [dict(post._mapping)], current_user.get('user_id'))
+        return posts[0]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
     
 
    
-@router.get('/get-post-interactions/{post_id}',)
-async def get_single_post(post_id: str, db: AsyncSession = Depends(get_async_db)):
+@router.post('/posts/interactions', response_model=schemas.AllPostInteractions)
+async def post_interactions(
+    request: Request,
+    body: schemas.PostInteractionsRequest,
+    db: AsyncSession = Depends(get_async_db)):
     try:
-        
-        _get_post_interactions = text("""
-            SELECT 
-                p.id AS post_id,
-                p.created_at,
-                p.user_id,
-                (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-                EXISTS (
-                    SELECT 1 
-                    FROM post_likes  
-                    WHERE post_id = p.id
-                ) AS liked , 
-                (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saved,
-                (SELECT COUNT(*) FROM comments WHERE post_id = p.id AND parent_id ISNULL ) AS comments,
-            FROM posts p
-            WHERE p.id = :currentPostId
-        """)
-
-        result = await db.execute(_get_post_interactions, {"currentPostId": post_id})
-        post = result.fetchone()
+        post_ids = list(dict.fromkeys(str(post_id) for post_id in body.post_ids))
+        if len(post_ids) > MAX_INTERACTION_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_INTERACTION_IDS} post ids per request")
+
+        # One primary-key lookup per post for the counters, one query for the viewer's flags
+        result = await db.execute(_get_interaction_counts, {"post_ids": post_ids})
+        cards = [dict(row._mapping) for row in result.fetchall()]
+        await hydrate_viewer_state(db, cards, request.state.user.get("user_id"))
+
+        found = {str(card["post_id"]) for card in cards}
+        return schemas.AllPostInteractions(
+            interactions=cards,
+            missing=[post_id for post_id in post_ids if post_id not in found]
+        )
 
-        if not post:
-            raise HTTPException(status_code=404, detail="No recommended posts found.")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        return post._mapping
 
+@router.get('/get-post-interactions/{post_id}', response_model=schemas.PostInteraction)
+async def get_single_post(post_id: uuid.UUID, request: Request, db: AsyncSession = Depends(get_async_db)):
+    try:
+        result = await db.execute(_get_interaction_counts, {"post_ids": [str(post_id)]})
+        cards = [dict(row._mapping) for row in result.fetchall()]
+        if not cards:
+            raise HTTPException(status_code=404, detail="Post not found.")
+
+        await hydrate_viewer_state(db, cards, request.state.user.get("user_id"))
+        return cards[0]
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))    
 
@@ -101,21 +267,39 @@ async def get_single_post(post_id: str, db: AsyncSession = Depends(get_async_db)
 @router.get('/streams', response_model=schemas.AllPost)
 async def streams(
     request:Request,
-    offset: int = Query(1, ge=0),
+    offset: int = Query(1, ge=1),
     limit: int = Query(3, gt=0),
+    cursor: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
         current_user = request.state.user
-        count_stmt = text("SELECT COUNT(*) FROM posts")
-        result = await db.execute(count_stmt)
-        total_count = result.scalar()
-        cal_offset = (offset - 1) * limit
-        result = await db.execute(_get_all_streams, {"offset": cal_offset, "limit": limit, "current_user_id":current_user.get('user_id')})
-        posts = [dict(row._mapping) for row in result.fetchall()]
-        
-        return schemas.AllPost(posts=posts, numb_found=total_count)
-
+        total_count = await cached_total(db, "streams", _count_video_posts)
+
+        # Fetch one extra row so we know whether a next page exists
+        if cursor:
+            try:
+                cursor_created_at, cursor_post_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+            result = await db.execute(_get_all_streams_after_cursor, {
+                "cursor_created_at": cursor_created_at,
+                "cursor_post_id": cursor_post_id,
+                "limit": limit + 1
+            })
+        else:
+            # Legacy page-number mode, kept for older clients
+            cal_offset = (offset - 1) * limit
+            result = await db.execute(_get_all_streams, {"offset": cal_offset, "limit": limit + 1})
+
+        posts, next_cursor = page_with_cursor([dict(row._mapping) for row in result.fetchall()], limit)
+        await hydrate_viewer_state(db, posts, current_user.get('user_id'))
+
+        return schemas.AllPost(posts=posts, numb_found=total_count, has_more=next_cursor is not None, next_cursor=next_cursor)
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -125,21 +309,54 @@ async def get_posts(
     request:Request,
     offset: int = Query(1, ge=0),
     limit: int = Query(10, gt=0),
+    cursor: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
         current_user = request.state.user
-        count_stmt = text("SELECT COUNT(*) FROM posts")
-        result = await db.execute(count_stmt)
-        total_count = result.scalar()
-        cal_offset = (offset - 1) * limit
-        result = await db.execute(_get_all_posts, {"offset": cal_offset, "limit": limit,"current_user_id":current_user.get("user_id")})    
-        if result:
-            posts = [dict(row._mapping) for row in result.fetchall()]
-            return schemas.AllPost(posts=posts, numb_found=total_count)
-        
-        return schemas.AllPost(posts=[], numb_found=0)
 
+        if cursor:
+            try:
+                cursor_created_at, cursor_post_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        async def load_page():
+            total_count = await estimated_total(db, "posts")
+
+            # Fetch one extra id so we know whether a next page exists
+            if cursor:
+                result = await db.execute(_get_all_post_ids_after_cursor, {
+                    "cursor_created_at": cursor_created_at,
+                    "cursor_post_id": cursor_post_id,
+                    "limit": limit + 1
+                })
+            else:
+                # Legacy page-number mode, kept for older clients
+                cal_offset = (offset - 1) * limit
+                result = await db.execute(_get_all_post_ids, {"offset": cal_offset, "limit": limit + 1})
+
+            rows, next_cursor = page_with_cursor([dict(row._mapping) for row in result.fetchall()], limit)
+            return {
+                "post_ids": [str(row["post_id"]) for row in rows],
+                "next_cursor": next_cursor,
+                "numb_found": total_count,
+            }
+
+        # Page ids and cards come from the feed cache; only viewer flags hit the db
+        page_name = f"cursor:{cursor}:{limit}" if cursor else f"offset:{offset}:{limit}"
+        page = await feed_cache.get_page(page_name, load_page)
+        posts = await feed_cache.get_cards(db, page["post_ids"])
+        await hydrate_viewer_state(db, posts, current_user.get("user_id"))
+
+        next_cursor = page["next_cursor"]
+        return list_response(
+            schemas.AllPost, "posts", PostCardRow, posts,
+            numb_found=page["numb_found"], has_more=next_cursor is not None, next_cursor=next_cursor
+        )
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -152,14 +369,19 @@ async def create_post(
     has_video: Optional[int] = Form(None),
     tags: Optional[str] = Form(None),
     files: Optional[List[UploadFile]] = File(None),
+    upload_ids: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_async_db)
 ):
-    uploaded_files = []
-
     try:
         current_user = request.state.user
         video_value = has_video if has_video else 0
 
+        # Upload first, so no row locks are held across storage round trips
+        uploaded_media = await upload_media(db, current_user.get("user_id"), files, owner="post")
+        # Files the client already sent straight to storage
+        media = uploaded_media + await claim_uploads(db, current_user.get("user_id"), parse_upload_ids(upload_ids), "post")
+        is_stream = video_value == 1 or bool(media_urls(media, "video"))
+
         # Insert post
         post_result = await db.execute(text("""
             INSERT INTO posts (user_id, content, has_video)
@@ -175,123 +397,67 @@ async def create_post(
         post_id = create_post._mapping["id"]
 
         # Handle tags
-        if tags:
-            tag_list = tags.split(",")
-            for tag in tag_list:
-                await db.execute(text("""
-                    INSERT INTO tags (tag_name, created_at, post_id, creator)
-                    VALUES (:tag_name, NOW(), :post_id, :creator)
-                """), {
-                    "tag_name": tag.strip(),
-                    "post_id": post_id,
-                    "creator": "user"
-                })
+        await add_post_tags(db, post_id, parse_tags(tags))
+        await insert_media(db, "post", post_id, current_user.get("user_id"), media)
 
-        # Handle multiple file uploads
-        if files:
-            for file in files:
-                mimetype = file.content_type.split("/")[0]
-                content_type = file.content_type
-                file_bytes = await file.read()
-                file_name = file.filename
-                extension = file_name.split(".")[-1]
-                generated_name = f"plant.disease.detection.{generate_random_string()}.{extension}"
-
-                file_url = await upload_file_to_storage(
-                    current_user.get("user_id"),
-                    generated_name,
-                    file_bytes,
-                    content_type
-                )
-
-                if file_url:
-                    uploaded_files.append((file_name, current_user.get("user_id")))
-
-                    if mimetype == "image":
-                        await db.execute(text("""
-                            INSERT INTO post_images (post_id, image_url, filename, user_id, generated_name)
-                            VALUES (:post_id, :image_url, :filename, :user_id, :generated_name)
-                        """), {
-                            "post_id": post_id,
-                            "image_url": file_url,
-                            "filename": file_name,
-                            "user_id": current_user.get("user_id"),
-                            "generated_name": generated_name
-                        })
-
-                    elif mimetype == "video":
-                        await db.execute(text("""
-                            INSERT INTO post_videos (post_id, video_url, filename, user_id, generated_name)
-                            VALUES (:post_id, :video_url, :filename, :user_id, :generated_name)
-                        """), {
-                            "post_id": post_id,
-                            "video_url": file_url,
-                            "filename": file_name,
-                            "user_id": current_user.get("user_id"),
-                            "generated_name": generated_name
-                        })
+        # Materialize the card in the same transaction; followers' timelines
+        # are written by a background job after the commit
+        await refresh_post_cards(db, [post_id])
+        await enqueue(db, "timeline.fan_out", {"post_id": post_id})
+        if is_stream:
+            await db.execute(_add_video_post, {"post_id": post_id})
 
         await db.commit()
+        forget_total(f"posts:user:{current_user.get('user_id')}")
+        if is_stream:
+            forget_total("streams")
+        await feed_cache.invalidate_feed()
 
         # Fetch and return the newly created post using existing query
         result = await db.execute(_get_single_post, 
-            {"currentPostId": str(post_id),"current_user_id":current_user.get("user_id")}
-        )
-        created_post = result.fetchone()
-
-        return schemas.GetAllPost(
-            post_id=created_post.post_id,
-            content=created_post.content,
-            created_at=created_post.created_at,
-            likes=created_post.likes,
-            saved=created_post.saved,
-            user_id=created_post.user_id,
-            has_video=created_post.has_video,
-            comments=created_post.comments,
-            username=created_post.username,     
-            images=created_post.images,
-            tags=created_post.tags,
-            videos=created_post.videos,
-            user_image=created_post.user_image,
+            {"currentPostId": str(post_id)}
         )
+        created_post = dict(result.fetchone()._mapping)
+
+        # A brand-new post is neither liked nor saved by its author
+        return schemas.GetAllPost(**created_post, liked=False, saved=False)
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
-        # Cleanup uploaded files if error occurs
-        for filename, user_id in uploaded_files:
-            await delete_file_from_storage(user_id, filename)
         raise HTTPException(status_code=500, detail=str(e))
 
 
 
 
+_delete_post_images = text("DELETE FROM post_images WHERE post_id = :post_id RETURNING user_id, generated_name")
+_delete_post_videos = text("DELETE FROM post_videos WHERE post_id = :post_id RETURNING user_id, generated_name")
+
+
 @router.delete('/posts/{post_id}')
 async def delete_post(post_id: str, db: AsyncSession = Depends(get_async_db)):
     try:
-        list_of_files_to_delete = []
-
-        image_stmt = text("SELECT filename, user_id FROM post_images WHERE post_id=:post_id")
-        image_result = await db.execute(image_stmt, {"post_id": post_id})
-        image_row = image_result.fetchone()
-
-        if image_row:
-            list_of_files_to_delete.append({"filename": image_row.filename, "user_id": image_row.user_id})
-            await db.execute(text("DELETE FROM post_images WHERE post_id=:post_id"), {"post_id": post_id})
-
-        video_stmt = text("SELECT filename, user_id FROM post_videos WHERE post_id=:post_id")
-        video_result = await db.execute(video_stmt, {"post_id": post_id})
-        video_row = video_result.fetchone()
-
-        if video_row:
-            list_of_files_to_delete.append({"filename": video_row.filename, "user_id": video_row.user_id})
-            await db.execute(text("DELETE FROM post_videos WHERE post_id=:post_id"), {"post_id": post_id})
-
-        await db.execute(text("DELETE FROM posts WHERE id=:post_id"), {"post_id": post_id})
+        # Every image and video of the post; their objects are released once
+        # the rows are gone (see drop_media)
+        images = await db.execute(_delete_post_images, {"post_id": post_id})
+        videos = await db.execute(_delete_post_videos, {"post_id": post_id})
+        await drop_media(
+            db,
+            [(row.user_id, row.generated_name, "image") for row in images.fetchall()]
+            + [(row.user_id, row.generated_name, "video") for row in videos.fetchall()],
+        )
 
-        for file_data in list_of_files_to_delete:
-            await delete_file_from_storage(file_data["user_id"], file_data["filename"])
+        deleted = await db.execute(text("DELETE FROM posts WHERE id=:post_id RETURNING user_id"), {"post_id": post_id})
+        deleted_post = deleted.fetchone()
 
         await db.commit()
+        if deleted_post:
+            forget_total(f"posts:user:{deleted_post.user_id}")
+            forget_total("streams")
+            await feed_cache.invalidate_post(post_id)
+            await feed_cache.invalidate_feed()
         return {"message": "Post deleted successfully", "post_id": post_id}
 
     except Exception as e:
@@ -309,23 +475,17 @@ async def get_post_history_user(
     try:
                 
         cal_offset = (offset - 1) * limit
-        # Count the number of posts
-        count_stmt = text("""
-            SELECT COUNT(*)
-            FROM posts p
-            WHERE p.user_id = :user_id
-        """)
-
-        count_result = await db.execute(count_stmt, {"user_id": user_id})
-        total_count = count_result.scalar()
+        # Count the number of posts (cached, dropped when the user posts or deletes)
+        total_count = await cached_total(db, f"posts:user:{user_id}", _count_user_posts, {"user_id": user_id})
 
         # Fetch post history
         result = await db.execute(_get_post_history, {"user_id": user_id, "offset": cal_offset,
-            "limit": limit , "current_user_id":user_id})
-        posts = result.fetchall()
+            "limit": limit})
+        posts = [dict(row._mapping) for row in result.fetchall()]
+        await hydrate_viewer_state(db, posts, user_id)
 
         return schemas.AllPost(
-            posts=[row._mapping for row in posts] if posts else [],
+            posts=posts,
             numb_found=total_count or 0
         )
 
@@ -14,11 +14,12 @@ from .. import schemas
 #     generate_random_string,
 #     download_and_process_file
 # )
-from ..utils.firebase_interactions import (
+from ..utils.storage import (
     upload_file_to_storage,
     delete_file_from_storage
 )
 # from ..utils.localDependent import predict_image_class
+from ..utils.jobs import enqueue
 from blog.database import get_db, get_async_db
 load_dotenv()
 router = APIRouter()
@@ -373,7 +374,8 @@ async def delete_prediction(prediction_id: str, db: AsyncSession = Depends(get_a
         generated_name, user_id = row
 
         await db.execute(text("DELETE FROM predictions WHERE id = :prediction_id"), {"prediction_id": prediction_id})
-        await delete_file_from_storage(user_id, generated_name)
+        # The object is deleted by a background job once the row is gone
+        await enqueue(db, "storage.delete", {"user_id": user_id, "names": [generated_name]})
         await db.commit()
 
         return {"prediction_id": prediction_id}
@@ -5,9 +5,12 @@ from typing import Optional, List
 import uuid
 
 from .. import schemas
-from ..utils.firebase_interactions import upload_file_to_storage,delete_file_from_storage
-from ..utils import generate_random_string
+from ..utils.media import (
+    upload_media, claim_uploads, parse_upload_ids, insert_media, drop_media,
+    register_media, release_media,
+)
 from blog.database import get_async_db
+from ..utils.totals import estimated_total, paged_total
 from ..utils.stored_procedure_strings import _get_product, _get_product_history, _get_all_products,_get_product
 
 router = APIRouter()
@@ -174,21 +177,22 @@ async def get_products_user(request:Request, db: AsyncSession = Depends(get_asyn
 @router.get('/products', status_code=status.HTTP_200_OK, response_model=schemas.AllProducts)
 async def get_all_products(offset: int = Query(1, ge=0), limit: int = Query(10, gt=0), db: AsyncSession = Depends(get_async_db)):
     try:
-        total_stmt = text("SELECT COUNT(*) FROM products")
-        total_result = await db.execute(total_stmt)
-        total_count = total_result.scalar()
+        total_count = await estimated_total(db, "products")
 
         cal_offset = (offset - 1) * limit
         result = await db.execute(_get_all_products, {
             "offset": cal_offset,
-            "limit": limit,
+            "limit": limit + 1,
             "order": "DSC"
         })
         
-        products = [dict(row._mapping) for row in result.fetchall()]
+        rows = [dict(row._mapping) for row in result.fetchall()]
+        products, has_more = rows[:limit], len(rows) > limit
 
         if products:
-            return schemas.AllProducts(products=products, numb_found=total_count) 
+            # The planner estimate can lag behind; never report fewer than we have seen
+            total_count = max(total_count, paged_total(cal_offset, len(products), has_more))
+            return schemas.AllProducts(products=products, numb_found=total_count, has_more=has_more) 
         
         return schemas.AllProducts(products=[], numb_found=0)
         
@@ -219,12 +223,19 @@ async def create_product(
     price: str = Form(...),
     oldPrice: Optional[str] = Form(None),
     unit: Optional[str] = Form(None),
-    files: List[UploadFile] = File(...),
+    files: Optional[List[UploadFile]] = File(None),
+    upload_ids: Optional[str] = Form(None),
     db: AsyncSession = Depends(get_async_db)
 ):
-    uploaded_files = []  # track uploaded file names
     try:
         current_user = request.state.user
+        if not files and not upload_ids:
+            raise HTTPException(status_code=400, detail="At least one image is required.")
+
+        # Upload the images concurrently before writing any row
+        uploaded_media = await upload_media(db, current_user.get("user_id"), files, owner="product")
+        media = uploaded_media + await claim_uploads(db, current_user.get("user_id"), parse_upload_ids(upload_ids), "product")
+
         # Insert product and return its ID
         result = await db.execute(text("""
             INSERT INTO products (
@@ -242,33 +253,7 @@ async def create_product(
         })
         product_id = result.scalar_one()
 
-        # Handle image uploads
-        for file in files:
-            content_type = file.content_type
-            file_bytes = await file.read()
-            file_name = file.filename
-            extension = file_name.split('.')[-1]
-            generated_name = f"plant.disease.detection.{generate_random_string()}.{extension}"
-
-            file_url = await upload_file_to_storage(current_user.get("user_id"), generated_name, file_bytes, content_type)
-            if not file_url:
-                raise HTTPException(status_code=500, detail="Error uploading file")
-
-            uploaded_files.append(generated_name)
-
-            await db.execute(text("""
-                INSERT INTO product_images (
-                    product_id, image_url, user_id, filename, generated_name
-                ) VALUES (
-                    :product_id, :image_url, :user_id, :filename, :generated_name
-                )
-            """), {
-                "product_id": product_id,
-                "image_url": file_url,
-                "user_id": current_user.get("user_id"),
-                "filename": file_name,
-                "generated_name": generated_name
-            })
+        await insert_media(db, "product", product_id, current_user.get("user_id"), media)
 
         # Fetch and return the newly created product
         result = await db.execute(_get_product, {"product_id": product_id})
@@ -279,11 +264,11 @@ async def create_product(
         column_names = result.keys()
         return dict(zip(column_names, row))
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
-        # Clean up any uploaded files
-        for filename in uploaded_files:
-            await delete_file_from_storage(current_user.get("user_id"), filename)
         raise HTTPException(status_code=500, detail=str(e))
 
 
@@ -325,21 +310,30 @@ async def update_product(
             raise HTTPException(status_code=400, detail="No fields provided for update.")
 
         if file:
-            content_type = file.content_type
-            file_bytes = await file.read()
-            file_name = file.filename
-            extension = file_name.split('.')[-1]
-            generated_name = f"plant.disease.detection.{generate_random_string()}.{extension}"
-            file_url = await upload_file_to_storage(current_user.get("user_id"), generated_name, file_bytes, content_type)
-            if not file_url:
-                raise HTTPException(status_code=500, detail="Error uploading file")
-
-            await db.execute(text("""
-                UPDATE product_images SET image_url = :image_url WHERE id = :image_id
+            uploaded_media = await upload_media(db, current_user.get("user_id"), [file], owner="product")
+            replaced = await db.execute(text("""
+                UPDATE product_images pi
+                SET image_url = :image_url, filename = :filename, generated_name = :generated_name,
+                    thumb_url = :thumb_url, medium_url = :medium_url, placeholder = :placeholder,
+                    width = :width, height = :height
+                FROM product_images old
+                WHERE old.id = pi.id AND pi.id = :image_id
+                RETURNING old.user_id, old.generated_name
             """), {
-                "image_url": file_url,
+                "image_url": uploaded_media[0].url,
+                "filename": uploaded_media[0].filename,
+                "generated_name": uploaded_media[0].generated_name,
+                "thumb_url": uploaded_media[0].thumb_url,
+                "medium_url": uploaded_media[0].medium_url,
+                "placeholder": uploaded_media[0].placeholder,
+                "width": uploaded_media[0].width,
+                "height": uploaded_media[0].height,
                 "image_id": image_id
             })
+            previous = replaced.fetchone()
+            await register_media(db, current_user.get("user_id"), uploaded_media)
+            if previous is not None:
+                await release_media(db, previous.user_id, [previous.generated_name])
 
         update_stmt = text(f"""
             UPDATE products
@@ -352,6 +346,9 @@ async def update_product(
 
         await db.commit()
         return {"message": "Product updated successfully."}
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -360,12 +357,21 @@ async def update_product(
 @router.delete('/products/{product_id}', status_code=status.HTTP_200_OK)
 async def delete_product(product_id: str, db: AsyncSession = Depends(get_async_db)):
     try:
+        images = await db.execute(text("""
+            DELETE FROM product_images WHERE product_id = :product_id
+            RETURNING user_id, generated_name
+        """), {"product_id": product_id})
+        await drop_media(db, [(row.user_id, row.generated_name, "image") for row in images.fetchall()])
+
         delete_stmt = text("DELETE FROM products WHERE id = :product_id")
         result = await db.execute(delete_stmt, {"product_id": product_id})
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Product not found.")
         await db.commit()
         return {"product_id": product_id}
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
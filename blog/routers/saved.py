@@ -1,59 +1,71 @@
 from fastapi import APIRouter, Form, Depends, HTTPException, status, Request, Query
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from typing import List, Optional
 from datetime import datetime
 from uuid import UUID
 from .. import schemas
 from blog.database import get_async_db
-from ..utils.stored_procedure_strings import _get_saved_posts
+from ..utils.stored_procedure_strings import _get_saved_post_ids, _get_saved_post_ids_after_cursor
+from ..utils.pagination import decode_cursor, page_with_cursor
+from ..utils.counters import bump_post_counter
+from ..utils.hydration import hydrate_viewer_state
+from ..utils.totals import cached_total, forget_total
+from ..utils import feed_cache, toggles
+from ..utils.jobs import enqueue
 
 router = APIRouter()
 
+_count_saved_posts = text("SELECT COUNT(*) FROM saved_posts WHERE user_id = :user_id")
+
 # 🔒 1. This must be declared BEFORE any /posts/{post_id} route
 @router.get("/saves/saved", status_code=status.HTTP_200_OK, response_model=schemas.AllPost)
 async def saved_history(
     request: Request,
     offset: int = Query(1, ge=1),
     limit: int = Query(10, gt=0),
+    cursor: Optional[str] = Query(None),
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
         current_user = request.state.user
         user_id = str(current_user.get("user_id"))
-        cal_offset = (offset - 1) * limit
-
-        # Count total saved
-        count_stmt = text("SELECT COUNT(*) FROM saved_posts WHERE user_id = :user_id")
-        count_result = await db.execute(count_stmt, {"user_id": user_id})
-        total_count = count_result.scalar()
-
-        # Get saved post IDs
-        saved_stmt = text("""
-            SELECT STRING_AGG(post_id::text, ',') AS post_ids 
-            FROM saved_posts 
-            WHERE user_id = :user_id
-        """)
-        result = await db.execute(saved_stmt, {"user_id": user_id})
-        joined_post_ids = result.scalar()
-
-        if not joined_post_ids:
-            return schemas.AllPost(posts=[], numb_found=0)
-
-        result = await db.execute(_get_saved_posts, {
-            "PostIds": joined_post_ids,
-            "offset": cal_offset,
-            "limit": limit,
-            "current_user_id":current_user.get("user_id")
-        })
 
-        saved_posts = result.fetchall()
+        # Count total saved (cached, dropped when the user saves or unsaves)
+        total_count = await cached_total(db, f"saved:user:{user_id}", _count_saved_posts, {"user_id": user_id})
+
+        # Fetch one extra row so we know whether a next page exists
+        if cursor:
+            try:
+                cursor_created_at, cursor_post_id = decode_cursor(cursor)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+
+            result = await db.execute(_get_saved_post_ids_after_cursor, {
+                "user_id": user_id,
+                "cursor_created_at": cursor_created_at,
+                "cursor_post_id": cursor_post_id,
+                "limit": limit + 1
+            })
+        else:
+            # Legacy page-number mode, kept for older clients
+            cal_offset = (offset - 1) * limit
+            result = await db.execute(_get_saved_post_ids, {"user_id": user_id, "offset": cal_offset, "limit": limit + 1})
+
+        page, next_cursor = page_with_cursor([dict(row._mapping) for row in result.fetchall()], limit)
+
+        saved_posts = await feed_cache.get_cards(db, [entry["post_id"] for entry in page])
+        await hydrate_viewer_state(db, saved_posts, user_id)
 
         return schemas.AllPost(
-            posts=[row._mapping for row in saved_posts],
-            numb_found=total_count or 0
+            posts=saved_posts,
+            numb_found=total_count or 0,
+            has_more=next_cursor is not None,
+            next_cursor=next_cursor
         )
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -66,65 +78,37 @@ async def toggle_save(
     db: AsyncSession = Depends(get_async_db)
 ):
     try:
-        from ..socket_manager import sio, getSocket
         user_id = request.state.user.get("user_id")  # actor
-        saved = None
-
-        # Params for queries
-        params = {"user_id": user_id, "post_id": str(post_id)}
-
-        # Check if post is already saved
-        saved_post_stmt = text("""
-            SELECT * FROM saved_posts 
-            WHERE user_id = :user_id AND post_id = :post_id
-        """)
-        result = await db.execute(saved_post_stmt, params)
-        saved_post = result.fetchone()
-
-        if saved_post:
-            # Unsave
-            saved = False
-            await db.execute(text("""
-                DELETE FROM saved_posts 
-                WHERE user_id = :user_id AND post_id = :post_id
-            """), params)
-        else:
-            # Save
-            saved = True
-            await db.execute(text("""
-                INSERT INTO saved_posts (post_id, user_id, created_at)
-                VALUES (:post_id, :user_id, CURRENT_TIMESTAMP)
-            """), params)
-
-        # ✅ Commit before emitting
-        await db.commit()
 
-        # Fetch the post owner (so we can notify them if needed)
-        owner_stmt = text("""
-            SELECT user_id FROM posts WHERE id = :post_id
-        """)
-        result = await db.execute(owner_stmt, {"post_id": str(post_id)})
-        row = result.fetchone()
-        post_owner_id = row.user_id if row else None
-
-        # ✅ Emit to Socket.IO
-        sid = getSocket(str(user_id))  # socket id of actor
-        await sio.emit(
-            "foot_notifications",
-            {
-                "actor_id": str(user_id),     
-                "owner_id": str(post_owner_id),
+        # Save or unsave and the counter in one statement, which also returns the post owner
+        row = await toggles.toggle_save(db, user_id, str(post_id))
+        if row.owner_id is None:
+            raise HTTPException(status_code=404, detail="Post not found")
+
+        # Broadcast to Socket.IO once committed, leaving out the actor's socket
+        await enqueue(db, "socket.emit", {
+            "event": "foot_notifications",
+            "data": {
+                "actor_id": str(user_id),
+                "owner_id": str(row.owner_id),
                 "entity_type": "post",
                 "type": "bookmark",
                 "entity_id": str(post_id),
-                "saved": saved,
+                "saved": row.saved,
             },
-            room="post_footer_notifications",
-            skip_sid=sid  
-        )
+            "room": "post_footer_notifications",
+            "skip_user": str(user_id),
+        })
+
+        await db.commit()
+        forget_total(f"saved:user:{user_id}")
+        await feed_cache.invalidate_post(post_id)
 
-        return {"post_id": str(post_id), "saved": saved}
+        return {"post_id": str(post_id), "saved": row.saved}
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -137,16 +121,28 @@ async def delete_saved(
 ):
     try:
         user_id = request.state.user.get("user_id")
+        # The removal is logged for the trending job, like toggle_save's
         result = await db.execute(text("""
-            DELETE FROM saved_posts WHERE user_id = :user_id AND post_id = :post_id
+            WITH removed AS (
+                DELETE FROM saved_posts WHERE user_id = :user_id AND post_id = :post_id
+                RETURNING post_id, created_at
+            )
+            INSERT INTO engagement_removals (post_id, kind, created_at)
+            SELECT post_id, 'save', created_at FROM removed
         """), {"user_id": user_id, "post_id": str(post_id)})
 
         if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="No saved post to delete.")
 
+        await bump_post_counter(db, str(post_id), "saves", -1)
         await db.commit()
+        forget_total(f"saved:user:{user_id}")
+        await feed_cache.invalidate_post(post_id)
         return {"post_id": str(post_id)}
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,104 @@
+from fastapi import APIRouter, Query, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional
+from .. import schemas
+from blog.database import get_async_db
+from ..utils.stored_procedure_strings import _get_trending_tags
+from ..utils.pagination import decode_cursor, page_with_cursor
+from ..utils.hydration import hydrate_viewer_state
+from ..utils.totals import paged_total
+from ..utils.tags import MAX_QUERY_TAGS, get_tag_ids, normalize_tag, parse_tags, tag_posts_stmt
+from ..utils import feed_cache
+
+router = APIRouter()
+
+
+@router.get('/tags/trending', response_model=schemas.AllTrendingTags)
+async def trending_tags(
+    offset: int = Query(1, ge=1),
+    limit: int = Query(20, gt=0, le=100),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        cal_offset = (offset - 1) * limit
+        result = await db.execute(_get_trending_tags, {"offset": cal_offset, "limit": limit})
+        rows = result.fetchall()
+
+        last_rank = rows[0].last_rank if rows else 0
+        return schemas.AllTrendingTags(
+            tags=[{"tag_name": row.tag_name, "score": row.score} for row in rows],
+            numb_found=last_rank or 0,
+            has_more=cal_offset + limit < (last_rank or 0)
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _tag_feed(request, db, names, match_all, limit, cursor):
+    empty = schemas.AllPost(posts=[], numb_found=0, has_more=False)
+
+    tag_ids = await get_tag_ids(db, names)
+    keys = {normalize_tag(name) for name in names}
+    if not tag_ids or (match_all and len(tag_ids) < len(keys)):
+        return empty
+
+    params = {f"tag_{i}": tag_id for i, tag_id in enumerate(sorted(tag_ids.values()))}
+    params["limit"] = limit + 1
+    if cursor:
+        try:
+            params["cursor_created_at"], params["cursor_post_id"] = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    result = await db.execute(tag_posts_stmt(len(tag_ids), match_all, bool(cursor)), params)
+    page, next_cursor = page_with_cursor([dict(row._mapping) for row in result.fetchall()], limit)
+
+    posts = await feed_cache.get_cards(db, [entry["post_id"] for entry in page])
+    await hydrate_viewer_state(db, posts, request.state.user.get("user_id"))
+
+    return schemas.AllPost(
+        posts=posts,
+        numb_found=paged_total(0, len(posts), next_cursor is not None),
+        has_more=next_cursor is not None,
+        next_cursor=next_cursor
+    )
+
+
+@router.get('/tags/posts', response_model=schemas.AllPost)
+async def posts_by_tags(
+    request: Request,
+    tags: str = Query(..., description="comma-separated tags"),
+    match: str = Query("all", pattern="^(all|any)$"),
+    limit: int = Query(10, gt=0, le=50),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        names = parse_tags(tags)
+        if not names or len(names) > MAX_QUERY_TAGS:
+            raise HTTPException(status_code=400, detail=f"Give between 1 and {MAX_QUERY_TAGS} tags")
+
+        return await _tag_feed(request, db, names, match == "all", limit, cursor)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching tagged posts: {str(e)}")
+
+
+@router.get('/tags/{tag}/posts', response_model=schemas.AllPost)
+async def posts_by_tag(
+    tag: str,
+    request: Request,
+    limit: int = Query(10, gt=0, le=50),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
+):
+    try:
+        return await _tag_feed(request, db, [tag], True, limit, cursor)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error fetching tagged posts: {str(e)}")
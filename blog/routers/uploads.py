@@ -0,0 +1,69 @@
+import tempfile
+
+from fastapi import APIRouter, Query, Depends, HTTPException, Request, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from .. import schemas
+from blog.database import get_async_db
+from ..utils.media import create_upload_session
+from ..utils.storage import LOCAL_UPLOAD_PATH, LocalStorage, get_backend
+
+router = APIRouter()
+
+# Request bodies for local uploads stay in memory up to this size, then spill to disk
+_SPOOL_MEMORY_BYTES = 1024 * 1024
+
+
+@router.post('/uploads', status_code=status.HTTP_201_CREATED, response_model=schemas.UploadSession)
+async def create_upload(request: Request, body: schemas.UploadSessionCreate, db: AsyncSession = Depends(get_async_db)):
+    """
+    Starts a direct upload of one file: the client sends the file to the
+    returned URL with the returned method and headers, then passes upload_id
+    in `upload_ids` when creating a post, comment, message or product. When
+    the body carries the file's sha256 and the user already stored that
+    content, `exists` is true and the upload step is skipped.
+    """
+    try:
+        if body.size <= 0:
+            raise HTTPException(status_code=400, detail="size must be positive.")
+
+        current_user = request.state.user
+        session = await create_upload_session(
+            db, current_user.get("user_id"), body.filename, body.content_type, body.size, body.sha256
+        )
+        return schemas.UploadSession(**session)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.put(LOCAL_UPLOAD_PATH, status_code=status.HTTP_200_OK)
+async def put_local_upload(
+    request: Request,
+    key: str = Query(...),
+    content_type: str = Query(...),
+    max_size: int = Query(...),
+    expires: int = Query(...),
+    signature: str = Query(...),
+):
+    """Target of presigned URLs from the local storage backend; the signature authorizes it."""
+    backend = get_backend()
+    if not isinstance(backend, LocalStorage):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not backend.verify_upload(key, content_type, max_size, expires, signature):
+        raise HTTPException(status_code=403, detail="Invalid or expired upload URL")
+
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_MEMORY_BYTES) as spool:
+        size = 0
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > max_size:
+                raise HTTPException(status_code=413, detail=f"Upload is larger than {max_size} bytes")
+            spool.write(chunk)
+
+        spool.seek(0)
+        await backend.upload(key, spool, size, content_type)
+
+    return Response(status_code=status.HTTP_200_OK)
@@ -5,9 +5,13 @@ from ..database.models import user_table, predictions_history_table
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from blog.database import get_async_db
-from ..utils.firebase_interactions import upload_file_to_storage, delete_file_from_storage
+from ..utils.media import upload_media, register_media, release_media_url
 from ..utils.stored_procedure_strings import _get_user_profile
-from ..utils import send_email_to_recipient,generate_random_string
+from ..utils.totals import paged_total
+from ..utils.post_cards import refresh_author_cards
+from ..utils.recommendation import forget_recommendations
+from ..utils import generate_random_string, toggles
+from ..utils.jobs import enqueue
 from ..middleware.authMiddleware import create_access_token,verify_access_token
 import uuid
 import bcrypt
@@ -165,20 +169,7 @@ async def get_suggested_users_to_follow(
     try:
         current_user = request.state.user
 
-        # Get total count
-        get_followers_count_stmt = text("""
-            SELECT COUNT(*) 
-            FROM users 
-            WHERE id != :user_id AND id NOT IN (
-                SELECT following_id 
-                FROM followers 
-                WHERE follower_id = :user_id
-            )
-        """)
-        total_count_result = await db.execute(get_followers_count_stmt, {"user_id": current_user.get("user_id")})
-        total_count = total_count_result.scalar()
-
-        # Get followers
+        # Get followers, one extra row tells us whether another page exists
         cal_offset = (offset - 1) * limit
 
         get_followers_stmt = text("""
@@ -197,9 +188,11 @@ async def get_suggested_users_to_follow(
         result = await db.execute(get_followers_stmt, {
             "user_id": current_user.get("user_id"),
             "offset": cal_offset,
-            "limit": limit
+            "limit": limit + 1
         })
         followers_raw = result.fetchall()
+        has_more = len(followers_raw) > limit
+        followers_raw = followers_raw[:limit]
 
         # Convert each Row to a dict, then to Follower
         followers = [
@@ -213,7 +206,11 @@ async def get_suggested_users_to_follow(
             for row in followers_raw
         ]
 
-        return schemas.AllFollowers(followers=followers, numb_found=total_count)
+        return schemas.AllFollowers(
+            followers=followers,
+            numb_found=paged_total(cal_offset, len(followers), has_more),
+            has_more=has_more
+        )
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -221,24 +218,31 @@ async def get_suggested_users_to_follow(
 
 @router.put("/user/image")
 async def update_user_profile(request:Request, file: UploadFile = File(...), db: AsyncSession = Depends(get_async_db)):
-    file_name = file.filename
     try:
-        current_user = request.state.user         
-        content_type = file.content_type
-        file_bytes = await file.read()
-
-        file_url = await upload_file_to_storage(current_user.get("user_id"), file_name, file_bytes, content_type)
-        if not file_url:
-            raise HTTPException(status_code=500, detail="Failed to upload image")
+        current_user = request.state.user
+        uploaded_media = await upload_media(db, current_user.get("user_id"), [file])
 
-        update_stmt = text("UPDATE users SET user_image = :user_image WHERE id = :user_id")
-        await db.execute(update_stmt, {"user_image": file_url, "user_id": current_user.get("user_id")})
+        update_stmt = text("""
+            UPDATE users u SET user_image = :user_image
+            FROM users old
+            WHERE old.id = u.id AND u.id = :user_id
+            RETURNING old.user_image
+        """)
+        # The thumb rendition is plenty for an avatar; the original is kept in storage
+        avatar = uploaded_media[0].thumb_url or uploaded_media[0].url
+        previous = (await db.execute(update_stmt, {"user_image": avatar, "user_id": current_user.get("user_id")})).fetchone()
+        await register_media(db, current_user.get("user_id"), uploaded_media)
+        if previous is not None:
+            await release_media_url(db, current_user.get("user_id"), previous.user_image)
+        await refresh_author_cards(db, current_user.get("user_id"))
         await db.commit()
 
         return "Upload was successful"
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
-        await delete_file_from_storage(current_user.get("user_id"), file_name)
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -332,6 +336,8 @@ async def update_user(
                 WHERE id = :user_id
             """
             await db.execute(text(query), values)
+            if username:
+                await refresh_author_cards(db, current_user.get("user_id"))
 
         if interests:
             split_interests = [i.strip() for i in interests.split(",") if i.strip()]
@@ -345,11 +351,13 @@ async def update_user(
                     interest_id = str(uuid.uuid4())
                     insert_stmt = text("""
                         INSERT INTO user_interests (id, user_id, interest, created_at)
-                        VALUES (:id, :user_id, :interest, GETDATE())
+                        VALUES (:id, :user_id, :interest, NOW())
                     """)
                     await db.execute(insert_stmt, {"id": interest_id, "user_id": current_user.get("user_id"), "interest": interest})
 
         await db.commit()
+        if interests:
+            forget_recommendations(current_user.get("user_id"))
         return {"message": "User updated successfully."}
 
     except Exception as e:
@@ -414,27 +422,18 @@ async def is_following(user_id: str, request:Request, db: AsyncSession = Depends
 async def toggle_follow(request:Request,user_id: str = Form(...), db: AsyncSession = Depends(get_async_db)):
     try:
         current_user = request.state.user
-        result = await db.execute(text("""
-            SELECT 1 FROM followers 
-            WHERE following_id = :user_id AND follower_id = :localUser
-        """), {"localUser": current_user.get("user_id"), "user_id": user_id})
-
-        if result.fetchone():
-            await db.execute(text("""
-                DELETE FROM followers 
-                WHERE following_id = :user_id AND follower_id = :localUser
-            """), {"localUser": current_user.get("user_id"), "user_id": user_id})
-            is_following = False
-        else:
-            await db.execute(text("""
-                INSERT INTO followers (following_id, follower_id) 
-                VALUES (:user_id, :localUser)
-            """), {"localUser": current_user.get("user_id"), "user_id": user_id})
-            is_following = True
+
+        # Follow or unfollow, counters and home timeline in one statement
+        row = await toggles.toggle_follow(db, current_user.get("user_id"), user_id)
+        if not row.found:
+            raise HTTPException(status_code=404, detail="User not found")
 
         await db.commit()
-        return {"follow": is_following}
+        return {"follow": row.following}
 
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
@@ -483,7 +482,8 @@ async def send_email_for_verification(
             "verification_link": f"{url[1]}/{verification_string}/update-password/"
         }
 
-        await send_email_to_recipient(verification_data)
+        # Sent by a background job once the new string is committed
+        await enqueue(db, "email.verification", verification_data)
 
         await db.commit()
 
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List,Any
+from typing import Optional, List, Any, Dict
 from datetime import datetime
 from uuid import UUID
 
@@ -74,6 +74,11 @@ class GetAllPost(BaseModel):
     comments: int
     username:str
     images: Optional[str] = None
+    # Per image, aligned with `images`: WebP thumb and medium renditions and
+    # an inline blur placeholder data URI ('' when there is none)
+    thumbnails: Optional[str] = None
+    previews: Optional[str] = None
+    placeholders: Optional[List[str]] = None
     tags: Optional[str] = None
     videos: Optional[str] = None
     user_image:Optional[str]=None
@@ -81,6 +86,37 @@ class GetAllPost(BaseModel):
 class AllPost(BaseModel):
     posts: List[GetAllPost]
     numb_found:int
+    has_more:Optional[bool] = None
+    next_cursor:Optional[str] = None
+
+class PostBatch(BaseModel):
+    posts: List[GetAllPost]
+    missing: List[UUID] = []
+
+class PostInteractionsRequest(BaseModel):
+    post_ids: List[UUID]
+
+class PostInteraction(BaseModel):
+    post_id: UUID
+    likes: int
+    saves: int
+    comments: int
+    liked: bool
+    saved: bool
+
+class AllPostInteractions(BaseModel):
+    interactions: List[PostInteraction]
+    missing: List[UUID] = []
+
+# ---------------------- Tags ----------------------
+class TrendingTag(BaseModel):
+    tag_name: str
+    score: float
+
+class AllTrendingTags(BaseModel):
+    tags: List[TrendingTag]
+    numb_found: int
+    has_more: Optional[bool] = None
 
 # ---------------------- PostVideos ----------------------
 class PostVideoCreate(BaseModel):
@@ -165,6 +201,7 @@ class Comment(BaseModel):
 class AllComment(BaseModel):
     comments:List[Comment]
     numb_found:int
+    has_more:Optional[bool] = None
      
     
 # ---------------------- notifications ----------------------
@@ -188,6 +225,7 @@ class Notifications(BaseModel):
 class AllNotifications(BaseModel):
      notifications:List[Notifications]
      numb_found:int
+     has_more:Optional[bool] = None
 
     
 # ---------------------- Search ----------------------
@@ -209,6 +247,7 @@ class Follower(BaseModel):
 class AllFollowers(BaseModel):
     followers:List[Follower]
     numb_found:int
+    has_more:Optional[bool] = None
     
     
 # ---------------------- Products ----------------------
@@ -228,6 +267,7 @@ class Products(BaseModel):
 class AllProducts(BaseModel):
     products:List[Products]
     numb_found:int
+    has_more:Optional[bool] = None
 
 class ConversationCreate(BaseModel):
     name: Optional[str]
@@ -283,4 +323,20 @@ class Reviews(BaseModel):
 
 class AllReviews(BaseModel):
     reviews:List[Reviews]
-    numb_found:int
\ No newline at end of file
+    numb_found:int
+# ---------------------- Uploads ----------------------
+class UploadSessionCreate(BaseModel):
+    filename: str
+    content_type: str
+    size: int
+    # Hex SHA-256 of the file; lets the API skip uploads of content already stored
+    sha256: Optional[str] = None
+
+class UploadSession(BaseModel):
+    upload_id: UUID
+    # None when exists is true: the content is already stored, nothing to upload
+    url: Optional[str] = None
+    method: Optional[str] = None
+    headers: Dict[str, str] = {}
+    expires_at: datetime
+    exists: bool = False
@@ -0,0 +1,124 @@
+from sqlalchemy import text
+
+# Denormalized engagement counters. Write paths bump them inside their own
+# transaction; reconcile_counters() recomputes them from the source tables.
+
+# table -> (key column, counter columns)
+COUNTER_TABLES = {
+    "post_cards": ("post_id", ("likes", "saves", "comments")),
+    "comment_stats": ("comment_id", ("likes", "replies")),
+    "user_stats": ("user_id", ("followers", "following", "unread_notifications")),
+}
+
+# Read-model tables whose rows are written by their owning path (create_post
+# for post_cards), so a counter bump only ever updates an existing row.
+_UPDATE_ONLY_TABLES = {"post_cards"}
+
+
+async def bump_counter(db, table, key, counter, delta=1):
+    key_column, counters = COUNTER_TABLES[table]
+    if counter not in counters:
+        raise ValueError(f"Unknown counter {table}.{counter}")
+
+    if not delta:
+        return
+
+    if table in _UPDATE_ONLY_TABLES:
+        await db.execute(text(f"""
+            UPDATE {table}
+            SET {counter} = GREATEST({counter} + :delta, 0)
+            WHERE {key_column} = :key
+        """), {"key": key, "delta": delta})
+        return
+
+    await db.execute(text(f"""
+        INSERT INTO {table} ({key_column}, {counter})
+        VALUES (:key, GREATEST(:delta, 0))
+        ON CONFLICT ({key_column}) DO UPDATE
+        SET {counter} = GREATEST({table}.{counter} + :delta, 0)
+    """), {"key": key, "delta": delta})
+
+
+async def bump_post_counter(db, post_id, counter, delta=1):
+    await bump_counter(db, "post_cards", post_id, counter, delta)
+
+
+async def bump_comment_counter(db, comment_id, counter, delta=1):
+    await bump_counter(db, "comment_stats", comment_id, counter, delta)
+
+
+async def bump_user_counter(db, user_id, counter, delta=1):
+    await bump_counter(db, "user_stats", user_id, counter, delta)
+
+
+# Each statement writes the true value and only touches rows that drifted,
+# so RETURNING gives the number of repaired rows.
+_reconcile_post_cards = text("""
+    UPDATE post_cards pc
+    SET likes = t.likes, saves = t.saves, comments = t.comments
+    FROM (
+        SELECT
+            p.id,
+            COALESCE(l.n, 0) AS likes,
+            COALESCE(s.n, 0) AS saves,
+            COALESCE(c.n, 0) AS comments
+        FROM posts p
+        LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM post_likes GROUP BY post_id) l ON l.post_id = p.id
+        LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM saved_posts GROUP BY post_id) s ON s.post_id = p.id
+        LEFT JOIN (SELECT post_id, COUNT(*) AS n FROM comments WHERE parent_id IS NULL GROUP BY post_id) c ON c.post_id = p.id
+    ) t
+    WHERE pc.post_id = t.id
+      AND (pc.likes, pc.saves, pc.comments) IS DISTINCT FROM (t.likes, t.saves, t.comments)
+    RETURNING pc.post_id
+""")
+
+_reconcile_comment_stats = text("""
+    INSERT INTO comment_stats (comment_id, likes, replies)
+    SELECT
+        c.id,
+        COALESCE(l.n, 0),
+        COALESCE(r.n, 0)
+    FROM comments c
+    LEFT JOIN (SELECT comment_id, COUNT(*) AS n FROM comment_likes GROUP BY comment_id) l ON l.comment_id = c.id
+    LEFT JOIN (SELECT parent_id, COUNT(*) AS n FROM comments WHERE parent_id IS NOT NULL GROUP BY parent_id) r ON r.parent_id = c.id
+    ON CONFLICT (comment_id) DO UPDATE
+    SET likes = EXCLUDED.likes, replies = EXCLUDED.replies
+    WHERE (comment_stats.likes, comment_stats.replies)
+        IS DISTINCT FROM (EXCLUDED.likes, EXCLUDED.replies)
+    RETURNING comment_id
+""")
+
+_reconcile_user_stats = text("""
+    INSERT INTO user_stats (user_id, followers, following, unread_notifications)
+    SELECT
+        u.id,
+        COALESCE(fr.n, 0),
+        COALESCE(fg.n, 0),
+        COALESCE(nt.n, 0)
+    FROM users u
+    LEFT JOIN (SELECT following_id, COUNT(*) AS n FROM followers GROUP BY following_id) fr ON fr.following_id = u.id
+    LEFT JOIN (SELECT follower_id, COUNT(*) AS n FROM followers GROUP BY follower_id) fg ON fg.follower_id = u.id
+    LEFT JOIN (SELECT user_id, COUNT(*) AS n FROM notifications WHERE is_read = 0 GROUP BY user_id) nt ON nt.user_id = u.id
+    ON CONFLICT (user_id) DO UPDATE
+    SET followers = EXCLUDED.followers,
+        following = EXCLUDED.following,
+        unread_notifications = EXCLUDED.unread_notifications
+    WHERE (user_stats.followers, user_stats.following, user_stats.unread_notifications)
+        IS DISTINCT FROM (EXCLUDED.followers, EXCLUDED.following, EXCLUDED.unread_notifications)
+    RETURNING user_id
+""")
+
+
+async def reconcile_counters(db):
+    """Repairs counter drift. Returns the number of repaired rows per table."""
+    repaired = {}
+    for table, stmt in (
+        ("post_cards", _reconcile_post_cards),
+        ("comment_stats", _reconcile_comment_stats),
+        ("user_stats", _reconcile_user_stats),
+    ):
+        result = await db.execute(stmt)
+        repaired[table] = len(result.fetchall())
+
+    await db.commit()
+    return repaired
@@ -0,0 +1,118 @@
+import os
+from dataclasses import dataclass, fields
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from starlette.responses import Response
+
+# Opt-in fast path for list responses. Normally an endpoint returns a pydantic
+# page model, which FastAPI validates a second time against response_model and
+# then encodes with jsonable_encoder + json.dumps. With FAST_JSON_RESPONSES=1
+# (and orjson installed) list_response() instead copies each row into a typed
+# __slots__ adapter and returns an orjson-encoded response directly, skipping
+# both validation passes. The adapters mirror the schemas in blog/schemas.py
+# field for field; rows come from our own SQL, so their types are already known.
+
+try:
+    import orjson
+except ImportError:  # optional dependency, the pydantic path is used without it
+    orjson = None
+
+ENABLED = orjson is not None and os.getenv("FAST_JSON_RESPONSES", "0") == "1"
+
+
+def _default(value):
+    # asyncpg returns its own UUID subclass, which orjson does not pick up
+    if isinstance(value, UUID):
+        return str(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        # OPT_UTC_Z matches pydantic's "Z" suffix for UTC datetimes
+        return orjson.dumps(content, default=_default, option=orjson.OPT_UTC_Z)
+
+
+@dataclass(slots=True)
+class PostCardRow:
+    post_id: UUID
+    content: str
+    created_at: datetime
+    likes: int
+    saves: int
+    liked: Optional[bool]
+    saved: Optional[bool]
+    user_id: UUID
+    has_video: Optional[int]
+    comments: int
+    username: str
+    images: Optional[str]
+    thumbnails: Optional[str]
+    previews: Optional[str]
+    placeholders: Optional[list]
+    tags: Optional[str]
+    videos: Optional[str]
+    user_image: Optional[str]
+
+
+@dataclass(slots=True)
+class CommentRow:
+    id: UUID
+    post_id: UUID
+    user_id: UUID
+    likes: int
+    liked: Optional[bool]
+    saved: Optional[bool]
+    videos: Optional[str]
+    images: Optional[str]
+    has_video: Optional[int]
+    username: str
+    content: str
+    tags: Optional[str]
+    replies: int
+    created_at: datetime
+    user_image: Optional[str]
+    parent_id: Optional[str]
+
+
+@dataclass(slots=True)
+class NotificationRow:
+    id: UUID
+    user_id: UUID
+    actor_id: UUID
+    type: str
+    entity_id: UUID
+    images: Optional[str]
+    videos: Optional[str]
+    entity_type: str
+    user_image: str
+    username: str
+    action_id: Optional[str]
+    message: str
+    is_read: int
+    created_at: datetime
+
+
+_field_names = {}
+
+
+def adapt_rows(adapter, rows):
+    """Copies mappings (dicts or row._mapping) into `adapter` instances; missing keys become None."""
+    names = _field_names.get(adapter)
+    if names is None:
+        names = _field_names[adapter] = tuple(field.name for field in fields(adapter))
+    return [adapter(*[row.get(name) for name in names]) for row in rows]
+
+
+def list_response(model, key, adapter, rows, **page_fields):
+    """
+    A page of `rows` under `key`, as `model` (the pydantic page schema) or,
+    when the fast path is enabled, as a pre-encoded orjson response.
+    """
+    if ENABLED:
+        return FastJSONResponse({key: adapt_rows(adapter, rows), **page_fields})
+    return model(**{key: rows}, **page_fields)
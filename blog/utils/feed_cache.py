@@ -0,0 +1,165 @@
+import json
+import os
+import time
+from datetime import datetime
+from uuid import UUID
+
+from cachetools import LRUCache
+
+from .post_cards import get_post_cards
+
+# Feed cache. Holds viewer-independent post cards keyed by post id plus
+# short-lived feed pages (the ordered ids of one page). Viewer flags are never
+# cached; callers hydrate them on top of the cards.
+#
+# Write paths call invalidate_post() when a card changes (likes, saves,
+# comments) and invalidate_feed() when the set of posts changes (create,
+# delete). Feed pages are keyed by a generation number, so invalidate_feed()
+# drops every cached page at once by bumping it.
+
+CARD_TTL = int(os.getenv("FEED_CACHE_CARD_TTL", "300"))
+PAGE_TTL = int(os.getenv("FEED_CACHE_PAGE_TTL", "15"))
+MAX_ENTRIES = int(os.getenv("FEED_CACHE_MAX_ENTRIES", "10000"))
+
+_GENERATION_KEY = "feed:generation"
+
+
+class MemoryCacheBackend:
+    """In-process LRU with per-entry TTL, bounded to `maxsize` entries."""
+
+    def __init__(self, maxsize=MAX_ENTRIES):
+        self._entries = LRUCache(maxsize=maxsize)
+
+    async def get_many(self, keys):
+        now = time.monotonic()
+        found = {}
+        for key in keys:
+            entry = self._entries.get(key)
+            if entry is None:
+                continue
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= now:
+                self._entries.pop(key, None)
+                continue
+            found[key] = value
+        return found
+
+    async def set_many(self, items, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        for key, value in items.items():
+            self._entries[key] = (value, expires_at)
+
+    async def delete_many(self, keys):
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def incr(self, key):
+        value = (await self.get_many([key])).get(key, 0) + 1
+        await self.set_many({key: value})
+        return value
+
+
+def _json_default(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot cache {type(value).__name__}")
+
+
+class NetworkCacheBackend:
+    """
+    Shared cache over a Redis-style async client (mget/set/delete/incr), so
+    every worker sees the same cards and invalidations. Tests can pass any
+    object with those methods in place of a real client.
+    """
+
+    def __init__(self, client, prefix="agri:"):
+        self._client = client
+        self._prefix = prefix
+
+    async def get_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = await self._client.mget([self._prefix + key for key in keys])
+        return {key: json.loads(value) for key, value in zip(keys, values) if value is not None}
+
+    async def set_many(self, items, ttl=None):
+        for key, value in items.items():
+            await self._client.set(self._prefix + key, json.dumps(value, default=_json_default), ex=ttl)
+
+    async def delete_many(self, keys):
+        keys = [self._prefix + key for key in keys]
+        if keys:
+            await self._client.delete(*keys)
+
+    async def incr(self, key):
+        return await self._client.incr(self._prefix + key)
+
+
+def _backend_from_env():
+    url = os.getenv("FEED_CACHE_URL")
+    if not url:
+        return MemoryCacheBackend()
+
+    # Optional dependency, only needed when a shared cache is configured
+    import redis.asyncio as redis
+    return NetworkCacheBackend(redis.from_url(url))
+
+
+_backend = _backend_from_env()
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def get_backend():
+    return _backend
+
+
+def _card_key(post_id):
+    return f"post:{post_id}"
+
+
+async def get_cards(db, post_ids):
+    """Post cards for `post_ids` in order, loading cache misses with one query."""
+    post_ids = [str(post_id) for post_id in post_ids]
+    cached = await _backend.get_many([_card_key(post_id) for post_id in post_ids])
+
+    missing = [post_id for post_id in post_ids if _card_key(post_id) not in cached]
+    if missing:
+        loaded = await get_post_cards(db, missing)
+        fresh = {_card_key(card["post_id"]): card for card in loaded}
+        await _backend.set_many(fresh, ttl=CARD_TTL)
+        cached.update(fresh)
+
+    # Copies, since callers hydrate viewer flags into them
+    return [dict(cached[_card_key(post_id)]) for post_id in post_ids if _card_key(post_id) in cached]
+
+
+async def get_page(name, loader):
+    """
+    Cached feed page. `loader` is an async callable returning a JSON-friendly
+    dict (ids, next cursor, totals) and only runs on a miss.
+    """
+    generation = (await _backend.get_many([_GENERATION_KEY])).get(_GENERATION_KEY, 0)
+    key = f"feed:{generation}:{name}"
+
+    cached = await _backend.get_many([key])
+    if key in cached:
+        return cached[key]
+
+    page = await loader()
+    await _backend.set_many({key: page}, ttl=PAGE_TTL)
+    return page
+
+
+async def invalidate_post(post_id):
+    await _backend.delete_many([_card_key(post_id)])
+
+
+async def invalidate_feed():
+    await _backend.incr(_GENERATION_KEY)
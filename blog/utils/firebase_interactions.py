@@ -1,46 +1,4 @@
-import firebase_admin
-from firebase_admin import credentials, storage
-import os
-from io import BytesIO
-from pathlib import Path
-from dotenv import load_dotenv
-load_dotenv()
-
-import os
-import firebase_admin
-from firebase_admin import credentials
-
-cred_path = [
-    "/etc/secrets/file-transfer-app-74625-firebase-adminsdk-4vum9-d106be7043.json",
-    f"{Path(__file__).parent}/file-transfer-app-74625-firebase-adminsdk-4vum9-d106be7043.json"
-]
-
-# Initialize Firebase Admin SDK only once
-if not firebase_admin._apps:
-    cred = credentials.Certificate(cred_path[0])
-    firebase_admin.initialize_app(cred, {
-        'storageBucket': os.getenv("FIREBASE_STORAGE_BUCKET")
-    })
-
-bucket = storage.bucket()
-
-# Upload file to Firebase Storage
-async def upload_file_to_storage(user_id, file_name, file_bytes, content_type):
-    try:
-        blob = bucket.blob(f'plant_disease_detection/{user_id}/{file_name}')
-        blob.upload_from_string(file_bytes, content_type=content_type) 
-        blob.make_public()
-        return blob.public_url
-    except Exception as e:
-        print(f"❌ Upload failed: {str(e)}")
-        raise
-
-# Delete file from Firebase Storage
-async def delete_file_from_storage(user_id, file_name):
-    try:
-        blob = bucket.blob(f'plant_disease_detection/{user_id}/{file_name}')  
-        if blob.exists():
-            blob.delete()
-    except Exception as e:
-        print(f"❌ Delete failed: {str(e)}")
-        raise
+# Uploads and deletes live in blog/utils/storage.py, which initialises
+# Firebase only when that backend is selected; these names remain for the
+# legacy controllers
+from .storage import upload_file_to_storage, delete_file_from_storage
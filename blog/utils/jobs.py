@@ -0,0 +1,305 @@
+import asyncio
+import json
+import os
+import uuid
+
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+# Background jobs for the side effects of a request: storage deletes, emails,
+# Socket.IO emits, image renditions and timeline fan-out. A handler calls
+# enqueue() with its own session, which inserts a row into job_outbox
+# (migration 013_job_outbox.sql) in the request's transaction, so a job
+# exists exactly when the change it follows was committed. The response then
+# only waits for the DB write.
+#
+# Each app process runs a JobQueue (started from blog/main.py). A commit that
+# enqueued jobs wakes it, and it also polls every JOB_POLL_SECONDS for jobs
+# from other processes or left behind by a crash. Jobs are claimed with
+# FOR UPDATE SKIP LOCKED and leased for JOB_LEASE_SECONDS, so any number of
+# processes can share the table. At most JOB_CONCURRENCY jobs run at a time
+# per process, and a kind can set a lower limit of its own. A failed job is
+# retried with exponential backoff; after its last attempt it stays in the
+# table with failed_at set. Handlers must therefore be safe to run twice.
+#
+# Handlers are registered with @job(kind) below and take the job's payload,
+# a JSON object.
+
+JOBS_ENABLED = os.getenv("JOBS_ENABLED", "1") == "1"
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "8"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", "300"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "10"))
+JOB_RETRY_MAX_SECONDS = 3600
+
+# Session.info key marking a transaction that enqueued jobs
+_ENQUEUED = "jobs_enqueued"
+
+_insert_job = text("""
+    INSERT INTO job_outbox (id, kind, payload, max_attempts, run_after)
+    VALUES (:id, :kind, CAST(:payload AS jsonb), :max_attempts, NOW() + make_interval(secs => :delay))
+""")
+
+_claim_jobs = text("""
+    UPDATE job_outbox
+    SET locked_until = NOW() + make_interval(secs => :lease),
+        attempts = attempts + 1
+    WHERE id IN (
+        SELECT id FROM job_outbox
+        WHERE failed_at IS NULL
+          AND run_after <= NOW()
+          AND (locked_until IS NULL OR locked_until < NOW())
+        ORDER BY run_after
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, kind, payload, attempts, max_attempts
+""")
+
+_finish_job = text("DELETE FROM job_outbox WHERE id = :id")
+
+_retry_job = text("""
+    UPDATE job_outbox
+    SET locked_until = NULL,
+        run_after = NOW() + make_interval(secs => :delay),
+        last_error = :error
+    WHERE id = :id
+""")
+
+_fail_job = text("""
+    UPDATE job_outbox
+    SET locked_until = NULL, failed_at = NOW(), last_error = :error
+    WHERE id = :id
+""")
+
+# kind -> (handler, concurrency limit or None, max attempts)
+_handlers = {}
+
+
+def job(kind, concurrency=None, max_attempts=JOB_MAX_ATTEMPTS):
+    """Registers the decorated coroutine function as the handler of `kind` jobs."""
+    def register(handler):
+        _handlers[kind] = (handler, concurrency, max_attempts)
+        return handler
+    return register
+
+
+async def enqueue(db, kind, payload, delay=0):
+    """
+    Adds a `kind` job to the caller's transaction; it runs after the commit,
+    and never if the transaction rolls back.
+    """
+    if kind not in _handlers:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    await db.execute(_insert_job, {
+        "id": uuid.uuid4(),
+        "kind": kind,
+        "payload": json.dumps(payload, default=str),
+        "max_attempts": _handlers[kind][2],
+        "delay": delay,
+    })
+    db.info[_ENQUEUED] = True
+
+
+def _retry_delay(attempts):
+    return min(JOB_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOB_RETRY_MAX_SECONDS)
+
+
+class JobQueue:
+    """Claims and runs job_outbox rows in this process; see the module comment."""
+
+    def __init__(self, session_factory, concurrency=JOB_CONCURRENCY, poll_seconds=JOB_POLL_SECONDS):
+        self._session_factory = session_factory
+        self.concurrency = concurrency
+        self.poll_seconds = poll_seconds
+        self._wakeup = asyncio.Event()
+        self._running = set()
+        self._kind_slots = {
+            kind: asyncio.Semaphore(limit) for kind, (_, limit, _) in _handlers.items() if limit
+        }
+        self._loop_task = None
+
+    def wake(self):
+        self._wakeup.set()
+
+    def start(self):
+        if self._loop_task is None:
+            self._loop_task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stops claiming and waits for the jobs already running."""
+        if self._loop_task is not None:
+            self._loop_task.cancel()
+            await asyncio.gather(self._loop_task, return_exceptions=True)
+            self._loop_task = None
+        await asyncio.gather(*self._running, return_exceptions=True)
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            free = self.concurrency - len(self._running)
+            claimed = []
+            if free > 0:
+                try:
+                    claimed = await self._claim(free)
+                except Exception as e:
+                    print(f"Claiming jobs failed: {e}")
+
+            for row in claimed:
+                task = asyncio.create_task(self._execute(row))
+                self._running.add(task)
+                task.add_done_callback(self._done)
+
+            # A full batch means more may be waiting; otherwise sleep until a
+            # commit or a finished job wakes us, or the next poll
+            if free > 0 and len(claimed) == free:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+
+    def _done(self, task):
+        self._running.discard(task)
+        self.wake()
+
+    async def _claim(self, limit):
+        async with self._session_factory() as db:
+            result = await db.execute(_claim_jobs, {"lease": JOB_LEASE_SECONDS, "limit": limit})
+            rows = result.fetchall()
+            await db.commit()
+        return rows
+
+    async def _execute(self, row):
+        handler = _handlers.get(row.kind)
+        payload = row.payload if isinstance(row.payload, dict) else json.loads(row.payload)
+        try:
+            if handler is None:
+                raise RuntimeError(f"No handler for job kind {row.kind}")
+            slots = self._kind_slots.get(row.kind)
+            if slots is None:
+                await handler[0](payload)
+            else:
+                async with slots:
+                    await handler[0](payload)
+        except Exception as e:
+            await self._record_failure(row, e)
+            return
+
+        try:
+            async with self._session_factory() as db:
+                await db.execute(_finish_job, {"id": row.id})
+                await db.commit()
+        except Exception as e:
+            # The lease runs out and the job runs again; handlers are idempotent
+            print(f"Finishing job {row.id} ({row.kind}) failed: {e}")
+
+    async def _record_failure(self, row, error):
+        last_attempt = row.attempts >= row.max_attempts
+        print(f"Job {row.id} ({row.kind}) attempt {row.attempts} failed: {error}")
+        try:
+            async with self._session_factory() as db:
+                if last_attempt:
+                    await db.execute(_fail_job, {"id": row.id, "error": str(error)})
+                else:
+                    await db.execute(_retry_job, {
+                        "id": row.id, "error": str(error), "delay": _retry_delay(row.attempts),
+                    })
+                await db.commit()
+        except Exception as e:
+            print(f"Recording failure of job {row.id} failed: {e}")
+
+
+_queue = None
+
+
+def start_queue(session_factory=None):
+    """Starts this process's JobQueue; call from the running event loop."""
+    global _queue
+    if not JOBS_ENABLED or _queue is not None:
+        return _queue
+    if session_factory is None:
+        from ..database import async_session as session_factory
+    _queue = JobQueue(session_factory)
+    _queue.start()
+    return _queue
+
+
+async def stop_queue():
+    global _queue
+    if _queue is not None:
+        await _queue.stop()
+        _queue = None
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_after_commit(session):
+    if session.info.pop(_ENQUEUED, False) and _queue is not None:
+        _queue.wake()
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_after_rollback(session):
+    session.info.pop(_ENQUEUED, None)
+
+
+# ------------------- HANDLERS -------------------
+
+@job("storage.delete")
+async def delete_objects(payload):
+    """Deletes storage objects of one user: {"user_id", "names": [...]}."""
+    from .storage import delete_file_from_storage
+
+    await asyncio.gather(*(
+        delete_file_from_storage(payload["user_id"], name) for name in payload["names"]
+    ))
+
+
+@job("email.verification", concurrency=2)
+async def send_verification_email(payload):
+    """Sends the password verification email; the payload is send_email_to_recipient()'s data."""
+    from . import send_email_to_recipient
+
+    await send_email_to_recipient(payload)
+
+
+# A live update that is late is worth little, so emits are tried only twice
+@job("socket.emit", max_attempts=2)
+async def emit(payload):
+    """
+    Socket.IO room broadcast: {"event", "data", "room"} plus an optional
+    "skip_user" whose socket is left out. Only sockets connected to the
+    process running the job are reached, so emits to one user's socket are
+    sent by the request instead.
+    """
+    from ..socket_manager import sio, getSocket
+
+    skip_user = payload.get("skip_user")
+    skip_sid = getSocket(str(skip_user)) if skip_user is not None else None
+    await sio.emit(payload["event"], payload["data"], room=payload["room"], skip_sid=skip_sid)
+
+
+@job("media.renditions", concurrency=2)
+async def render_upload(payload):
+    """Renditions of a directly uploaded image, written into its rows: {"user_id", "name"}."""
+    from ..database import async_session
+    from . import feed_cache
+    from .media import fill_renditions
+
+    async with async_session() as db:
+        post_ids = await fill_renditions(db, payload["user_id"], payload["name"])
+    for post_id in post_ids:
+        await feed_cache.invalidate_post(post_id)
+
+
+@job("timeline.fan_out")
+async def fan_out(payload):
+    """Writes a new post into its author's and followers' home timelines: {"post_id"}."""
+    from ..database import async_session
+    from .timeline import fan_out_post
+
+    async with async_session() as db:
+        await fan_out_post(db, payload["post_id"])
+        await db.commit()
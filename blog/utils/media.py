@@ -0,0 +1,715 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from collections import Counter, defaultdict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import text
+
+from . import generate_random_string
+from .jobs import enqueue
+from .post_cards import refresh_post_cards
+from .renditions import RENDITIONS_ENABLED, render, rendition_name, stored_names
+from .storage import (
+    STORAGE_CHUNK_BYTES, get_backend, object_key,
+    upload_file_to_storage, upload_stream_to_storage,
+)
+
+# Media ingestion shared by every endpoint that accepts file uploads.
+#
+# upload_media() streams a request's files from their multipart spool files
+# to storage concurrently, at most MEDIA_UPLOAD_CONCURRENCY at a time, so a
+# request with several files costs about one upload's latency instead of the
+# sum of them. Files are never read whole into memory: each upload holds at
+# most one STORAGE_CHUNK_BYTES chunk, and the chunks of all uploads in the
+# process share the MEDIA_INFLIGHT_BYTES budget, so a burst of video posts
+# waits for room instead of growing the worker. Requests over
+# MEDIA_MAX_FILE_BYTES per file or MEDIA_MAX_REQUEST_BYTES in total are
+# rejected with 413 before anything is sent. Images also get the renditions
+# of blog/utils/renditions.py, which needs the whole image, so its bytes are
+# counted against the budget while it is rendered.
+#
+# Objects are content addressed: a file is stored as "<sha256>.<ext>" under
+# its uploader's prefix, hashed from the spool file before anything is sent.
+# media_objects (migration 012_media_objects.sql) has one row per stored
+# object with its renditions and the number of media rows referencing it, so
+# content the user already stored is neither sent nor rendered again. That
+# lookup does not keep a transaction open through the uploads. The count is
+# raised in the same transaction as the media rows (register_media) and
+# lowered by release_media(); objects left at zero are deleted by the media
+# GC rather than inline, so a rollback never loses a shared object. Reusing an
+# object the GC collected meanwhile fails the request with a 409.
+#
+# insert_media() writes the rows of one owner (a post, comment, message or
+# product) with one batched statement per media table. Uploads of a request
+# that fails are not deleted inline: another request may be storing the same
+# content under the same name and not have committed its row yet. Nothing
+# refers to them, so the media GC collects them once GC_GRACE_SECONDS have
+# passed.
+#
+# Clients can also upload straight to storage: create_upload_session() hands
+# out a presigned URL for one object (see migration 010_upload_sessions.sql),
+# and the endpoint that creates the post, comment, message or product turns
+# the finished session ids into media with claim_uploads(), which checks the
+# objects in storage and consumes the sessions in the caller's transaction.
+# The storage checks run before the consuming UPDATE and outside any
+# transaction, and the images are never downloaded in the request: a
+# media.renditions job renders them after the commit (fill_renditions) and
+# fills in the rendition columns. A rollback leaves the sessions unconsumed,
+# so the client can retry with the same ids. A session opened with the file's sha256 is content addressed too,
+# and skips the upload when the object already exists. That digest is the
+# client's word; since names are per user, a wrong one only affects its own
+# uploads.
+
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv("MEDIA_UPLOAD_CONCURRENCY", "5"))
+MEDIA_MAX_FILE_BYTES = int(os.getenv("MEDIA_MAX_FILE_BYTES", str(100 * 1024 * 1024)))
+MEDIA_MAX_REQUEST_BYTES = int(os.getenv("MEDIA_MAX_REQUEST_BYTES", str(200 * 1024 * 1024)))
+MEDIA_INFLIGHT_BYTES = int(os.getenv("MEDIA_INFLIGHT_BYTES", str(64 * 1024 * 1024)))
+UPLOAD_SESSION_TTL = int(os.getenv("UPLOAD_SESSION_TTL", "900"))
+MAX_UPLOAD_IDS = 20
+
+# owner -> (owner column, {kind: (table, url column)})
+_MEDIA_TABLES = {
+    "post": ("post_id", {"image": ("post_images", "image_url"), "video": ("post_videos", "video_url")}),
+    "comment": ("comment_id", {"image": ("comment_images", "image_url"), "video": ("comment_videos", "video_url")}),
+    "message": ("message_id", {"image": ("message_images", "image_url"), "video": ("message_videos", "video_url")}),
+    "product": ("product_id", {"image": ("product_images", "image_url")}),
+}
+
+# Products keep every file as an image, whatever its content type
+_FALLBACK_KIND = {"product": "image"}
+
+_SHA256 = re.compile(r"^[0-9a-f]{64}$")
+
+
+@dataclass(slots=True)
+class StoredMedia:
+    kind: str
+    url: str
+    filename: str
+    generated_name: str
+    content_type: str
+    thumb_url: Optional[str] = None
+    medium_url: Optional[str] = None
+    placeholder: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    sha256: Optional[str] = None
+    size: Optional[int] = None
+    # The object was already in storage before this request
+    reused: bool = False
+
+    def copy_stored(self, other):
+        """Takes the URLs and renditions of `other`, an item with the same object."""
+        self.url, self.thumb_url, self.medium_url = other.url, other.thumb_url, other.medium_url
+        self.placeholder, self.width, self.height = other.placeholder, other.width, other.height
+
+
+def media_kind(owner, content_type):
+    """The media table kind a file goes to for `owner`, or None if it has none."""
+    kind = (content_type or "").split("/")[0]
+    if kind in _MEDIA_TABLES[owner][1]:
+        return kind
+    return _FALLBACK_KIND.get(owner)
+
+
+def storage_name(filename):
+    extension = (filename or "").split(".")[-1]
+    return f"plant.disease.detection.{generate_random_string()}.{extension}"
+
+
+def content_name(digest, filename):
+    """Storage name of content with SHA-256 `digest`, keeping the file's extension."""
+    extension = (filename or "").rsplit(".", 1)[-1].lower() if "." in (filename or "") else ""
+    return f"{digest}.{extension}" if extension.isalnum() else digest
+
+
+def media_urls(media, kind):
+    return [item.url for item in media if item.kind == kind]
+
+
+class ByteBudget:
+    """Bytes shared by all uploads in flight; acquire() waits until there is room."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self, size):
+        # A single request larger than the whole budget still gets to run alone
+        size = min(size, self.limit)
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.in_use + size <= self.limit)
+            self.in_use += size
+        return size
+
+    async def release(self, size):
+        async with self._changed:
+            self.in_use -= size
+            self._changed.notify_all()
+
+
+_inflight = ByteBudget(MEDIA_INFLIGHT_BYTES)
+
+
+def _spooled_size(file):
+    """Size of an UploadFile from its spool file, without reading it."""
+    # Starlette records the size while parsing the form; older versions do not
+    if getattr(file, "size", None) is not None:
+        return file.size
+    file.file.seek(0, os.SEEK_END)
+    size = file.file.tell()
+    file.file.seek(0)
+    return size
+
+
+def _hash_spooled(fileobj):
+    """SHA-256 hex digest of a spool file, read one chunk at a time."""
+    digest = hashlib.sha256()
+    fileobj.seek(0)
+    for chunk in iter(lambda: fileobj.read(STORAGE_CHUNK_BYTES), b""):
+        digest.update(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest()
+
+
+_find_objects = text("""
+    SELECT name, url, thumb_url, medium_url, placeholder, width, height
+    FROM media_objects
+    WHERE user_id = :user_id AND name = ANY(CAST(:names AS text[]))
+""")
+
+_register_object = text("""
+    INSERT INTO media_objects (
+        user_id, name, sha256, size, content_type, url,
+        thumb_url, medium_url, placeholder, width, height, ref_count
+    )
+    VALUES (
+        :user_id, :name, :sha256, :size, :content_type, :url,
+        :thumb_url, :medium_url, :placeholder, :width, :height, :refs
+    )
+    ON CONFLICT (user_id, name) DO UPDATE
+    SET ref_count = media_objects.ref_count + EXCLUDED.ref_count,
+        thumb_url = COALESCE(media_objects.thumb_url, EXCLUDED.thumb_url),
+        medium_url = COALESCE(media_objects.medium_url, EXCLUDED.medium_url),
+        placeholder = COALESCE(media_objects.placeholder, EXCLUDED.placeholder),
+        width = COALESCE(media_objects.width, EXCLUDED.width),
+        height = COALESCE(media_objects.height, EXCLUDED.height),
+        released_at = NULL
+""")
+
+# A reused object must still have its row: the media GC deletes zero-ref rows
+# before their objects, so a missing row means the object is being deleted
+_claim_object = text("""
+    UPDATE media_objects
+    SET ref_count = ref_count + :refs, released_at = NULL
+    WHERE user_id = :user_id AND name = :name
+    RETURNING name
+""")
+
+_release_object = text("""
+    UPDATE media_objects
+    SET ref_count = GREATEST(ref_count - :refs, 0),
+        released_at = CASE WHEN ref_count - :refs <= 0 THEN NOW() END
+    WHERE user_id = :user_id AND name = :name
+""")
+
+_release_object_by_url = text("""
+    UPDATE media_objects
+    SET ref_count = GREATEST(ref_count - 1, 0),
+        released_at = CASE WHEN ref_count - 1 <= 0 THEN NOW() END
+    WHERE user_id = :user_id AND :url IN (url, thumb_url, medium_url)
+""")
+
+
+async def find_objects(db, user_id, names):
+    """The user's media_objects rows among `names`, by name."""
+    if not names:
+        return {}
+    result = await db.execute(_find_objects, {"user_id": user_id, "names": sorted(set(names))})
+    return {row.name: row for row in result.fetchall()}
+
+
+@asynccontextmanager
+async def _brief_transaction(db):
+    """
+    Ends the transaction the block's reads open, so the connection goes back
+    to the pool before any storage round trip. A transaction the caller
+    already had is left alone.
+    """
+    opened = not db.in_transaction()
+    try:
+        yield
+    finally:
+        if opened:
+            await db.rollback()
+
+
+def _reuse(item, row):
+    item.copy_stored(row)
+    item.reused = True
+
+
+async def register_media(db, user_id, media):
+    """
+    Adds a reference per item to its media_objects row, creating rows for new
+    objects. Raises a 409 HTTPException when a reused object's row is gone
+    because the media GC collected it meanwhile; the content must be sent
+    again.
+    """
+    refs = Counter(item.generated_name for item in media)
+    first = {}
+    for item in media:
+        first.setdefault(item.generated_name, item)
+
+    # In name order, so concurrent requests lock the rows in the same order
+    rows = []
+    for name, item in sorted(first.items()):
+        if item.reused:
+            claimed = await db.execute(_claim_object, {"user_id": user_id, "name": name, "refs": refs[name]})
+            if claimed.fetchone() is None:
+                raise HTTPException(
+                    status_code=409, detail=f"{item.filename} is no longer stored; upload it again."
+                )
+            continue
+
+        rows.append({
+            "user_id": user_id,
+            "name": name,
+            "sha256": item.sha256,
+            "size": item.size,
+            "content_type": item.content_type,
+            "url": item.url,
+            "thumb_url": item.thumb_url,
+            "medium_url": item.medium_url,
+            "placeholder": item.placeholder,
+            "width": item.width,
+            "height": item.height,
+            "refs": refs[name],
+        })
+    if rows:
+        await db.execute(_register_object, rows)
+
+
+async def release_media(db, user_id, names):
+    """Drops a reference per name; objects left unreferenced are deleted by the media GC."""
+    refs = Counter(name for name in names if name)
+    if refs:
+        await db.execute(_release_object, [
+            {"user_id": user_id, "name": name, "refs": count} for name, count in sorted(refs.items())
+        ])
+
+
+async def release_media_url(db, user_id, url):
+    """release_media() for a reference kept only as a URL, like users.user_image."""
+    if url:
+        await db.execute(_release_object_by_url, {"user_id": user_id, "url": url})
+
+
+async def drop_media(db, rows):
+    """
+    Lets go of the objects of deleted media rows, given as (user_id,
+    generated_name, kind). Objects in media_objects lose a reference and are
+    left to the media GC; older objects, which belong to that row alone, are
+    deleted by a job after the caller commits.
+    """
+    by_user = defaultdict(list)
+    for user_id, name, kind in rows:
+        if name:
+            by_user[str(user_id)].append((name, kind))
+
+    for user_id, items in by_user.items():
+        known = await find_objects(db, user_id, [name for name, _ in items])
+        await release_media(db, user_id, [name for name, _ in items if name in known])
+
+        untracked = set()
+        for name, kind in items:
+            if name not in known:
+                untracked.update(stored_names(name) if kind == "image" else [name])
+        if untracked:
+            await enqueue(db, "storage.delete", {"user_id": user_id, "names": sorted(untracked)})
+
+
+async def _add_renditions(user_id, item, data):
+    """Renders and stores `item`'s renditions; the image is kept without them if that fails."""
+    rendered = await render(data)
+    if rendered is None:
+        return
+
+    renditions, placeholder, width, height = rendered
+    try:
+        urls = await asyncio.gather(*(
+            upload_file_to_storage(user_id, rendition_name(item.generated_name, name), body, "image/webp")
+            for name, body in renditions.items()
+        ))
+    except Exception as e:
+        print(f"Storing renditions of {item.generated_name} failed: {e}")
+        return
+
+    urls = dict(zip(renditions, urls))
+    item.thumb_url, item.medium_url = urls["thumb"], urls["medium"]
+    item.placeholder, item.width, item.height = placeholder, width, height
+
+
+def _check_sizes(accepted):
+    total = 0
+    for file, _, size in accepted:
+        if size > MEDIA_MAX_FILE_BYTES:
+            raise HTTPException(status_code=413, detail=f"{file.filename} is larger than {MEDIA_MAX_FILE_BYTES} bytes")
+        total += size
+    if total > MEDIA_MAX_REQUEST_BYTES:
+        raise HTTPException(status_code=413, detail=f"Uploads are larger than {MEDIA_MAX_REQUEST_BYTES} bytes in total")
+
+
+async def upload_media(db, user_id, files, owner=None):
+    """
+    Streams `files` to storage concurrently and returns their StoredMedia in
+    request order. Content the user already stored, or that appears more than
+    once in `files`, is sent at most once. With an `owner`, files it has no
+    media table for are skipped instead of uploaded. Raises a 413
+    HTTPException when the size caps are exceeded. If any upload fails, the
+    error is raised once the others are done.
+    """
+    accepted = []
+    for file in files or ():
+        if owner is None:
+            kind = (file.content_type or "").split("/")[0]
+        else:
+            kind = media_kind(owner, file.content_type)
+            if kind is None:
+                continue
+        accepted.append((file, kind, _spooled_size(file)))
+
+    if not accepted:
+        return []
+    _check_sizes(accepted)
+
+    slots = asyncio.Semaphore(MEDIA_UPLOAD_CONCURRENCY)
+
+    async def digest(file, size):
+        async with slots:
+            reserved = await _inflight.acquire(min(size, STORAGE_CHUNK_BYTES))
+            try:
+                return await asyncio.to_thread(_hash_spooled, file.file)
+            finally:
+                await _inflight.release(reserved)
+
+    digests = await asyncio.gather(*(digest(file, size) for file, _, size in accepted))
+    media = [
+        StoredMedia(kind, None, file.filename, content_name(sha256, file.filename), file.content_type,
+                    sha256=sha256, size=size)
+        for (file, kind, size), sha256 in zip(accepted, digests)
+    ]
+
+    async with _brief_transaction(db):
+        existing = await find_objects(db, user_id, [item.generated_name for item in media])
+    pending = {}
+    for (file, _, size), item in zip(accepted, media):
+        if item.generated_name in existing:
+            _reuse(item, existing[item.generated_name])
+        else:
+            pending.setdefault(item.generated_name, (file, size, item))
+
+    async def upload(file, size, item):
+        async with slots:
+            reserved = await _inflight.acquire(min(size, STORAGE_CHUNK_BYTES))
+            try:
+                await file.seek(0)
+                item.url = await upload_stream_to_storage(user_id, item.generated_name, file.file, size, file.content_type)
+            finally:
+                await _inflight.release(reserved)
+            if not item.url:
+                raise RuntimeError(f"Error uploading file {file.filename}")
+
+            if item.kind == "image" and RENDITIONS_ENABLED:
+                reserved = await _inflight.acquire(size)
+                try:
+                    await file.seek(0)
+                    await _add_renditions(user_id, item, await file.read())
+                finally:
+                    await _inflight.release(reserved)
+        return item
+
+    # Uploads that succeeded before a failure are left for the media GC
+    results = await asyncio.gather(*(upload(*entry) for entry in pending.values()), return_exceptions=True)
+    failed = next((result for result in results if isinstance(result, BaseException)), None)
+    if failed is not None:
+        raise failed
+
+    # Repeats within the request share the first upload of their content
+    uploaded = {item.generated_name: item for item in results}
+    for item in media:
+        source = uploaded.get(item.generated_name)
+        if source is not None and source is not item:
+            item.copy_stored(source)
+    return media
+
+
+@lru_cache(maxsize=None)
+def _insert_stmt(table, owner_column, url_column, with_renditions):
+    if with_renditions:
+        return text(f"""
+            INSERT INTO {table} (
+                {owner_column}, {url_column}, filename, user_id, generated_name,
+                thumb_url, medium_url, placeholder, width, height
+            )
+            VALUES (
+                :owner_id, :url, :filename, :user_id, :generated_name,
+                :thumb_url, :medium_url, :placeholder, :width, :height
+            )
+        """)
+    return text(f"""
+        INSERT INTO {table} ({owner_column}, {url_column}, filename, user_id, generated_name)
+        VALUES (:owner_id, :url, :filename, :user_id, :generated_name)
+    """)
+
+
+async def insert_media(db, owner, owner_id, user_id, media):
+    """
+    Inserts the media rows of one owner, one executemany batch per table,
+    and registers their references in media_objects.
+    """
+    owner_column, tables = _MEDIA_TABLES[owner]
+    for kind, (table, url_column) in tables.items():
+        rows = [
+            {
+                "owner_id": owner_id,
+                "url": item.url,
+                "filename": item.filename,
+                "user_id": user_id,
+                "generated_name": item.generated_name,
+                "thumb_url": item.thumb_url,
+                "medium_url": item.medium_url,
+                "placeholder": item.placeholder,
+                "width": item.width,
+                "height": item.height,
+            }
+            for item in media
+            if item.kind == kind
+        ]
+        if rows:
+            # Only image tables have rendition columns
+            await db.execute(_insert_stmt(table, owner_column, url_column, kind == "image"), rows)
+
+    await register_media(db, user_id, media)
+
+
+_insert_upload_session = text("""
+    INSERT INTO upload_sessions (id, user_id, filename, content_type, generated_name, max_size, expires_at)
+    VALUES (:id, :user_id, :filename, :content_type, :generated_name, :max_size, :expires_at)
+""")
+
+_find_upload_sessions = text("""
+    SELECT id, filename, content_type, generated_name, max_size
+    FROM upload_sessions
+    WHERE id = ANY(CAST(:ids AS uuid[]))
+      AND user_id = :user_id
+      AND consumed_at IS NULL
+      AND expires_at > NOW()
+""")
+
+_consume_upload_sessions = text("""
+    UPDATE upload_sessions
+    SET consumed_at = NOW()
+    WHERE id = ANY(CAST(:ids AS uuid[]))
+      AND user_id = :user_id
+      AND consumed_at IS NULL
+      AND expires_at > NOW()
+    RETURNING id
+""")
+
+
+async def create_upload_session(db, user_id, filename, content_type, size, sha256=None):
+    """
+    Records an upload session and returns its presigned upload; commits.
+    With the file's `sha256` the object is content addressed, and when the
+    user already has it the session is returned with exists=True and
+    nothing to upload.
+    """
+    if size > MEDIA_MAX_FILE_BYTES:
+        raise HTTPException(status_code=413, detail=f"{filename} is larger than {MEDIA_MAX_FILE_BYTES} bytes")
+
+    exists = False
+    if sha256 is None:
+        generated_name = storage_name(filename)
+    else:
+        sha256 = sha256.lower()
+        if not _SHA256.match(sha256):
+            raise HTTPException(status_code=400, detail="sha256 must be 64 hexadecimal characters.")
+        generated_name = content_name(sha256, filename)
+        exists = generated_name in await find_objects(db, user_id, [generated_name])
+
+    upload_id = uuid.uuid4()
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=UPLOAD_SESSION_TTL)
+    if exists:
+        presigned = {"url": None, "method": None, "headers": {}}
+    else:
+        presigned = await get_backend().presign_upload(object_key(user_id, generated_name), content_type, size, expires_at)
+
+    await db.execute(_insert_upload_session, {
+        "id": upload_id,
+        "user_id": user_id,
+        "filename": filename,
+        "content_type": content_type,
+        "generated_name": generated_name,
+        "max_size": size,
+        "expires_at": expires_at,
+    })
+    await db.commit()
+    return {"upload_id": upload_id, "expires_at": expires_at, "exists": exists, **presigned}
+
+
+def parse_upload_ids(raw):
+    """Comma-separated upload session ids, without blanks or repeats."""
+    ids = []
+    for value in (raw or "").split(","):
+        value = value.strip()
+        if not value:
+            continue
+        try:
+            upload_id = str(uuid.UUID(value))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid upload id: {value}")
+        if upload_id not in ids:
+            ids.append(upload_id)
+
+    if len(ids) > MAX_UPLOAD_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_UPLOAD_IDS} uploads can be attached.")
+    return ids
+
+
+async def claim_uploads(db, user_id, upload_ids, owner):
+    """
+    Consumes the caller's finished upload sessions for `owner` and returns
+    their StoredMedia in the given order. Raises a 400 HTTPException when a
+    session is unknown, expired or already used, or its object is missing,
+    larger than announced or of a kind `owner` does not take. Images without
+    renditions get them from a media.renditions job after the commit.
+    """
+    if not upload_ids:
+        return []
+
+    async with _brief_transaction(db):
+        result = await db.execute(_find_upload_sessions, {"ids": upload_ids, "user_id": user_id})
+        sessions = {str(row.id): row for row in result.fetchall()}
+        missing = [upload_id for upload_id in upload_ids if upload_id not in sessions]
+        if missing:
+            raise HTTPException(status_code=400, detail=f"Unknown, expired or already used uploads: {', '.join(missing)}")
+        existing = await find_objects(db, user_id, [row.generated_name for row in sessions.values()])
+
+    backend = get_backend()
+    ordered = [sessions[upload_id] for upload_id in upload_ids]
+    sizes = await asyncio.gather(*(backend.size(object_key(user_id, row.generated_name)) for row in ordered))
+
+    media = []
+    for upload_id, row, size in zip(upload_ids, ordered, sizes):
+        kind = media_kind(owner, row.content_type)
+        if kind is None:
+            raise HTTPException(status_code=400, detail=f"Upload {upload_id} ({row.content_type}) cannot be attached here.")
+        if size is None:
+            raise HTTPException(status_code=400, detail=f"Upload {upload_id} has not been completed.")
+        if size > row.max_size:
+            raise HTTPException(status_code=400, detail=f"Upload {upload_id} is larger than announced.")
+
+        key = object_key(user_id, row.generated_name)
+        sha256 = row.generated_name.split(".", 1)[0]
+        item = StoredMedia(kind, backend.url(key), row.filename, row.generated_name, row.content_type,
+                           sha256=sha256 if _SHA256.match(sha256) else None, size=size)
+        if row.generated_name in existing:
+            _reuse(item, existing[row.generated_name])
+        media.append(item)
+
+    # Consumed last, so no session row stays locked across the storage round
+    # trips above; a session used up meanwhile fails the claim here
+    result = await db.execute(_consume_upload_sessions, {"ids": upload_ids, "user_id": user_id})
+    consumed = {str(row.id) for row in result.fetchall()}
+    missing = [upload_id for upload_id in upload_ids if upload_id not in consumed]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Unknown, expired or already used uploads: {', '.join(missing)}")
+
+    if RENDITIONS_ENABLED:
+        for name in sorted({item.generated_name for item in media if item.kind == "image" and not item.thumb_url}):
+            await enqueue(db, "media.renditions", {"user_id": user_id, "name": name})
+    return media
+
+
+_object_renditions = text("""
+    SELECT thumb_url, medium_url, placeholder, width, height
+    FROM media_objects
+    WHERE user_id = :user_id AND name = :name
+""")
+
+_fill_object_renditions = text("""
+    UPDATE media_objects
+    SET thumb_url = :thumb_url, medium_url = :medium_url, placeholder = :placeholder,
+        width = :width, height = :height
+    WHERE user_id = :user_id AND name = :name AND thumb_url IS NULL
+""")
+
+
+@lru_cache(maxsize=None)
+def _fill_renditions_stmt(table, owner_column):
+    return text(f"""
+        UPDATE {table}
+        SET thumb_url = :thumb_url, medium_url = :medium_url, placeholder = :placeholder,
+            width = :width, height = :height
+        WHERE user_id = :user_id AND generated_name = :name AND thumb_url IS NULL
+        RETURNING {owner_column}
+    """)
+
+
+async def fill_renditions(db, user_id, name):
+    """
+    Gives the image `name`, already in storage, its renditions and writes
+    them into its media_objects row and every media row still without them;
+    commits. Renders only when media_objects has no renditions yet. Returns
+    the ids of posts whose cards changed.
+    """
+    async with _brief_transaction(db):
+        stored = (await db.execute(_object_renditions, {"user_id": user_id, "name": name})).fetchone()
+
+    item = StoredMedia("image", None, name, name, None)
+    if stored is not None and stored.thumb_url:
+        item.copy_stored(stored)
+    else:
+        key = object_key(user_id, name)
+        backend = get_backend()
+        size = await backend.size(key)
+        if size is None:
+            return []
+        reserved = await _inflight.acquire(size)
+        try:
+            await _add_renditions(user_id, item, await backend.download(key))
+        finally:
+            await _inflight.release(reserved)
+        if not item.thumb_url:
+            return []
+
+    params = {
+        "user_id": user_id,
+        "name": name,
+        "thumb_url": item.thumb_url,
+        "medium_url": item.medium_url,
+        "placeholder": item.placeholder,
+        "width": item.width,
+        "height": item.height,
+    }
+    await db.execute(_fill_object_renditions, params)
+    post_ids = []
+    for owner, (owner_column, tables) in _MEDIA_TABLES.items():
+        table, _ = tables["image"]
+        result = await db.execute(_fill_renditions_stmt(table, owner_column), params)
+        if owner == "post":
+            post_ids = sorted({row.post_id for row in result.fetchall()}, key=str)
+    if post_ids:
+        await refresh_post_cards(db, post_ids)
+    await db.commit()
+    return post_ids
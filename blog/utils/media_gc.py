@@ -0,0 +1,350 @@
+import asyncio
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from urllib.parse import unquote, urlparse
+
+from sqlalchemy import text
+
+from .media import _MEDIA_TABLES
+from .post_cards import refresh_post_cards
+from .renditions import RENDITIONS
+from .storage import OBJECT_PREFIX, get_backend, object_key, parse_object_key
+
+# Media garbage collection: reconciles object storage with the rows that
+# point into it.
+#
+# collect_garbage() runs in four steps:
+#
+#   1. recompute media_objects.ref_count from the media tables and avatars,
+#      repairing drift from deletes that went around drop_media() (cascades,
+#      manual cleanups), and drop upload_sessions that expired unused or were
+#      consumed more than the grace period ago;
+#   2. load every reference to an object: media rows, predictions, avatars,
+#      open upload sessions and media_objects rows still referenced or
+#      released within the grace period;
+#   3. page through storage GC_BATCH_SIZE keys at a time and delete, with at
+#      most GC_CONCURRENCY requests in flight and GC_PAUSE_SECONDS between
+#      batches, the objects older than the grace period that nothing refers
+#      to, together with their zero-ref media_objects rows;
+#   4. report rows whose object is missing from storage, and with
+#      delete_missing remove them.
+#
+# An image and its renditions count as one group ("<name>" and
+# "<name>.thumb.webp" share "<name>"), so a reference to any of them keeps
+# them all. Renditions stored under the older "<stem>.thumb.webp" names go
+# with every "<stem>.<ext>". The grace period covers uploads whose rows are
+# not committed yet.
+# Zero-ref rows are deleted before their objects, and register_media() refuses
+# to reuse an object whose row is gone, so a request reusing an object while
+# it is collected fails instead of pointing at a deleted object.
+# With dry_run nothing is deleted or committed; the report lists what would
+# be. References are held in memory, about a hundred bytes per media row.
+
+GC_BATCH_SIZE = int(os.getenv("MEDIA_GC_BATCH_SIZE", "500"))
+GC_CONCURRENCY = int(os.getenv("MEDIA_GC_CONCURRENCY", "8"))
+GC_PAUSE_SECONDS = float(os.getenv("MEDIA_GC_PAUSE_SECONDS", "0"))
+GC_GRACE_SECONDS = int(os.getenv("MEDIA_GC_GRACE_SECONDS", str(24 * 3600)))
+
+# table -> URL column of every table whose rows point at stored objects
+_REFERENCING_TABLES = {
+    table: url_column
+    for _, tables in _MEDIA_TABLES.values()
+    for table, url_column in tables.values()
+}
+_REFERENCING_TABLES["predictions"] = "image_url"
+
+# Media that also sits in post_cards, which is refreshed when delete_missing removes rows
+_POST_MEDIA_TABLES = {"post_images", "post_videos"}
+
+_media_refs = " UNION ALL ".join(
+    f"SELECT user_id, generated_name FROM {table}" for table in _REFERENCING_TABLES if table != "predictions"
+)
+
+_reconcile_refs = text(f"""
+    UPDATE media_objects mo
+    SET ref_count = t.refs,
+        released_at = CASE WHEN t.refs = 0 THEN COALESCE(mo.released_at, NOW()) END
+    FROM (
+        SELECT
+            o.user_id,
+            o.name,
+            COALESCE(r.refs, 0) + (
+                SELECT COUNT(*) FROM users u
+                WHERE u.id = o.user_id AND u.user_image IN (o.url, o.thumb_url, o.medium_url)
+            ) AS refs
+        FROM media_objects o
+        LEFT JOIN (
+            SELECT user_id, generated_name AS name, COUNT(*) AS refs
+            FROM ({_media_refs}) m
+            GROUP BY 1, 2
+        ) r ON r.user_id = o.user_id AND r.name = o.name
+    ) t
+    WHERE mo.user_id = t.user_id AND mo.name = t.name AND mo.ref_count IS DISTINCT FROM t.refs
+    RETURNING mo.name
+""")
+
+_expire_upload_sessions = text("""
+    DELETE FROM upload_sessions
+    WHERE (consumed_at IS NULL AND expires_at < :cutoff) OR consumed_at < :cutoff
+""")
+
+_session_refs = text("SELECT user_id, generated_name AS name FROM upload_sessions WHERE consumed_at IS NULL")
+
+# Released objects stay for the grace period, so a request that read the
+# row just before the release can still commit its reference
+_tracked_refs = text("""
+    SELECT user_id, name FROM media_objects
+    WHERE ref_count > 0 OR released_at IS NULL OR released_at >= :cutoff
+""")
+
+_tracked_objects = text("SELECT user_id, name FROM media_objects")
+
+_avatar_refs = text("SELECT id AS user_id, user_image AS url FROM users WHERE user_image IS NOT NULL")
+
+_release_objects = text("""
+    DELETE FROM media_objects mo
+    USING unnest(CAST(:user_ids AS uuid[]), CAST(:names AS text[])) AS c(user_id, name)
+    WHERE mo.user_id = c.user_id AND mo.name = c.name AND mo.ref_count = 0
+""")
+
+_still_tracked = text("""
+    SELECT mo.user_id, mo.name
+    FROM media_objects mo
+    JOIN unnest(CAST(:user_ids AS uuid[]), CAST(:names AS text[])) AS c(user_id, name)
+      ON mo.user_id = c.user_id AND mo.name = c.name
+""")
+
+_drop_object_row = text("""
+    DELETE FROM media_objects WHERE user_id = :user_id AND name = :name AND ref_count = 0
+""")
+
+
+def _rows_stmt(table):
+    return text(f"SELECT id, user_id, generated_name, {_REFERENCING_TABLES[table]} AS url FROM {table}")
+
+
+def _delete_rows_stmt(table):
+    returning = " RETURNING post_id" if table in _POST_MEDIA_TABLES else ""
+    return text(f"DELETE FROM {table} WHERE id = ANY(:ids){returning}")
+
+
+@dataclass(slots=True)
+class GCReport:
+    dry_run: bool
+    repaired_refs: int = 0
+    expired_sessions: int = 0
+    scanned: int = 0
+    # Keys of unreferenced objects, deleted unless dry_run
+    orphaned: list = field(default_factory=list)
+    orphaned_bytes: int = 0
+    deleted: int = 0
+    failed: int = 0
+    # (table, row id, key) of rows whose object is missing
+    missing: list = field(default_factory=list)
+    removed_rows: int = 0
+    released_objects: int = 0
+    # Posts whose cards lost media with delete_missing, for cache invalidation
+    changed_posts: list = field(default_factory=list)
+
+
+def _rendition_of(name):
+    """The name "<name>.<rendition>.webp" was rendered from, None for other objects."""
+    for rendition in RENDITIONS:
+        suffix = f".{rendition}.webp"
+        if name.endswith(suffix):
+            return name[:-len(suffix)]
+    return None
+
+
+def object_groups(name):
+    """
+    Groups that keep the object while any of them is referenced: a rendition
+    goes with the name it was rendered from, an original with its own name
+    and, for renditions stored without the extension, ("renditions", "<stem>").
+    """
+    source = _rendition_of(name)
+    if source is not None:
+        return {source}
+    return {name, ("renditions", name.rsplit(".", 1)[0])}
+
+
+def reference_groups(name):
+    """Groups a reference to `name` keeps: the image and its renditions, under either naming."""
+    source = _rendition_of(name)
+    if source is not None:
+        return {source, ("renditions", source)}
+    return {name, name.rsplit(".", 1)[0]}
+
+
+def _url_name(url):
+    """Object name at the end of a storage URL, for rows without generated_name."""
+    if not url:
+        return None
+    return unquote(urlparse(url).path).rsplit("/", 1)[-1] or None
+
+
+async def _partitions(db, stmt, params=None):
+    result = await db.stream(stmt, params or {})
+    async for rows in result.partitions(GC_BATCH_SIZE):
+        yield rows
+
+
+async def _load_references(db, cutoff):
+    """
+    (user_id, group) pairs something refers to, and (table, id, user_id,
+    name) of every row that must have an object.
+    """
+    groups = set()
+    rows = []
+
+    for table in _REFERENCING_TABLES:
+        async for partition in _partitions(db, _rows_stmt(table)):
+            for row in partition:
+                name = row.generated_name or _url_name(row.url)
+                if row.user_id is None or not name:
+                    continue
+                groups.update((str(row.user_id), group) for group in reference_groups(name))
+                rows.append((table, row.id, str(row.user_id), name))
+
+    async for partition in _partitions(db, _session_refs):
+        groups.update((str(row.user_id), group) for row in partition for group in reference_groups(row.name))
+
+    async for partition in _partitions(db, _avatar_refs):
+        for row in partition:
+            name = _url_name(row.url)
+            if name:
+                groups.update((str(row.user_id), group) for group in reference_groups(name))
+
+    async for partition in _partitions(db, _tracked_refs, {"cutoff": cutoff}):
+        groups.update((str(row.user_id), group) for row in partition for group in reference_groups(row.name))
+
+    async for partition in _partitions(db, _tracked_objects):
+        rows.extend(("media_objects", None, str(row.user_id), row.name) for row in partition)
+    return groups, rows
+
+
+async def _delete_batch(db, backend, batch, report):
+    """Deletes one batch of orphaned keys, skipping groups that were referenced again meanwhile."""
+    parsed = [parse_object_key(key) for key in batch]
+    params = {"user_ids": [user_id for user_id, _ in parsed], "names": [name for _, name in parsed]}
+
+    # Drop the zero-ref rows first: a request that reuses one of these objects
+    # from now on finds no row and uploads it again
+    report.released_objects += (await db.execute(_release_objects, params)).rowcount
+    kept = {
+        (str(row.user_id), group)
+        for row in (await db.execute(_still_tracked, params)).fetchall()
+        for group in reference_groups(row.name)
+    }
+    await db.commit()
+
+    slots = asyncio.Semaphore(GC_CONCURRENCY)
+
+    async def delete(key):
+        async with slots:
+            try:
+                await backend.delete(key)
+                return True
+            except Exception as e:
+                print(f"Deleting {key} failed: {e}")
+                return False
+
+    keys = [
+        key for key, (user_id, name) in zip(batch, parsed)
+        if not any((user_id, group) in kept for group in object_groups(name))
+    ]
+    results = await asyncio.gather(*(delete(key) for key in keys))
+    report.deleted += sum(results)
+    report.failed += len(results) - sum(results)
+
+
+async def collect_garbage(db, backend=None, dry_run=False, delete_missing=False, grace_seconds=GC_GRACE_SECONDS):
+    """
+    Deletes unreferenced objects and reports rows whose object is missing;
+    see the module comment. Returns a GCReport.
+    """
+    backend = backend or get_backend()
+    report = GCReport(dry_run=dry_run)
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+
+    # 1. Repair reference counts, forget stale upload sessions
+    report.repaired_refs = len((await db.execute(_reconcile_refs)).fetchall())
+    report.expired_sessions = (await db.execute(_expire_upload_sessions, {"cutoff": cutoff})).rowcount
+
+    # 2. Everything that refers to an object, as of the repaired counts
+    groups, rows = await _load_references(db, cutoff)
+    if dry_run:
+        await db.rollback()
+    else:
+        await db.commit()
+
+    # 3. Unreferenced objects, a page at a time
+    existing = set()
+    page_token = None
+    while True:
+        page, page_token = await backend.list_objects(OBJECT_PREFIX, page_token, GC_BATCH_SIZE)
+        batch = []
+        for key, size, updated_at in page:
+            parsed = parse_object_key(key)
+            if parsed is None:
+                continue
+            report.scanned += 1
+            existing.add(key)
+
+            user_id, name = parsed
+            referenced = any((user_id, group) in groups for group in object_groups(name))
+            if referenced or updated_at is None or updated_at >= cutoff:
+                continue
+            batch.append(key)
+            report.orphaned_bytes += size or 0
+
+        report.orphaned.extend(batch)
+        if batch and not dry_run:
+            await _delete_batch(db, backend, batch, report)
+            if GC_PAUSE_SECONDS:
+                await asyncio.sleep(GC_PAUSE_SECONDS)
+        if not page_token:
+            break
+
+    # 4. Rows whose object is gone. The listing is not one snapshot, so each
+    # candidate is checked again before it is reported
+    candidates = [(table, row_id, user_id, name) for table, row_id, user_id, name in rows
+                  if object_key(user_id, name) not in existing]
+    slots = asyncio.Semaphore(GC_CONCURRENCY)
+
+    async def still_missing(user_id, name):
+        async with slots:
+            return await backend.size(object_key(user_id, name)) is None
+
+    checks = await asyncio.gather(*(still_missing(user_id, name) for _, _, user_id, name in candidates))
+    missing = [candidate for candidate, gone in zip(candidates, checks) if gone]
+    report.missing = [(table, row_id, object_key(user_id, name)) for table, row_id, user_id, name in missing]
+    if dry_run:
+        return report
+
+    # Zero-ref bookkeeping rows for missing objects go in any case
+    for table, _, user_id, name in missing:
+        if table == "media_objects":
+            report.released_objects += (await db.execute(_drop_object_row, {"user_id": user_id, "name": name})).rowcount
+
+    if delete_missing:
+        by_table = {}
+        for table, row_id, _, _ in missing:
+            if row_id is not None:
+                by_table.setdefault(table, []).append(row_id)
+
+        changed_posts = set()
+        for table, ids in by_table.items():
+            for start in range(0, len(ids), GC_BATCH_SIZE):
+                result = await db.execute(_delete_rows_stmt(table), {"ids": ids[start:start + GC_BATCH_SIZE]})
+                report.removed_rows += result.rowcount
+                if table in _POST_MEDIA_TABLES:
+                    changed_posts.update(row.post_id for row in result.fetchall())
+
+        if changed_posts:
+            report.changed_posts = sorted(changed_posts, key=str)
+            await refresh_post_cards(db, report.changed_posts)
+
+    await db.commit()
+    return report
@@ -0,0 +1,33 @@
+import base64
+from datetime import datetime
+
+
+# Keyset cursors are an opaque, url-safe encoding of the last row's sort key
+# (created_at, id). Clients only ever echo them back as ?cursor=...
+def encode_cursor(created_at: datetime, row_id) -> str:
+    raw = f"{created_at.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8")
+        created_at, row_id = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def page_with_cursor(rows, limit, created_at_key="created_at", id_key="post_id"):
+    """
+    Trims a LIMIT + 1 fetch down to `limit` rows and returns (rows, next_cursor).
+    next_cursor is None when there is nothing after this page.
+    """
+    rows = list(rows)
+    if len(rows) <= limit:
+        return rows, None
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor(last[created_at_key], last[id_key])
@@ -0,0 +1,115 @@
+from sqlalchemy import text
+
+from .stored_procedure_strings import _get_posts_by_ids
+
+# post_cards is the read model behind every post-returning endpoint. Rows are
+# recomputed from the source tables by refresh_post_cards() (create_post and
+# the rebuild-post-cards command), counters are bumped in place through
+# blog/utils/counters.py, and refresh_author_cards() follows profile edits.
+
+_refresh_template = """
+    INSERT INTO post_cards (
+        post_id, user_id, content, created_at, has_video, username, user_image,
+        images, thumbnails, previews, placeholders, videos, tags, likes, saves, comments
+    )
+    SELECT
+        p.id,
+        p.user_id,
+        p.content,
+        p.created_at,
+        COALESCE(p.has_video, 0),
+        u.username,
+        COALESCE(u.user_image, ''),
+        COALESCE(img.images, '{{}}'),
+        COALESCE(img.thumbnails, '{{}}'),
+        COALESCE(img.previews, '{{}}'),
+        COALESCE(img.placeholders, '{{}}'),
+        COALESCE((SELECT ARRAY_AGG(video_url) FROM post_videos WHERE post_id = p.id), '{{}}'),
+        COALESCE((SELECT ARRAY_AGG(tag_name) FROM tags WHERE post_id = p.id), '{{}}'),
+        (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id),
+        (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id),
+        (SELECT COUNT(*) FROM comments WHERE post_id = p.id AND parent_id IS NULL)
+    FROM posts p
+    JOIN users u ON u.id = p.user_id
+    -- One aggregate pass, so the four image arrays stay aligned
+    LEFT JOIN LATERAL (
+        SELECT
+            ARRAY_AGG(image_url) AS images,
+            ARRAY_AGG(COALESCE(thumb_url, image_url)) AS thumbnails,
+            ARRAY_AGG(COALESCE(medium_url, image_url)) AS previews,
+            ARRAY_AGG(COALESCE(placeholder, '')) AS placeholders
+        FROM post_images
+        WHERE post_id = p.id
+    ) img ON TRUE
+    {where}
+    ON CONFLICT (post_id) DO UPDATE
+    SET user_id = EXCLUDED.user_id,
+        content = EXCLUDED.content,
+        created_at = EXCLUDED.created_at,
+        has_video = EXCLUDED.has_video,
+        username = EXCLUDED.username,
+        user_image = EXCLUDED.user_image,
+        images = EXCLUDED.images,
+        thumbnails = EXCLUDED.thumbnails,
+        previews = EXCLUDED.previews,
+        placeholders = EXCLUDED.placeholders,
+        videos = EXCLUDED.videos,
+        tags = EXCLUDED.tags,
+        likes = EXCLUDED.likes,
+        saves = EXCLUDED.saves,
+        comments = EXCLUDED.comments
+    RETURNING post_id
+"""
+
+_refresh_posts = text(_refresh_template.format(where="WHERE p.id = ANY(CAST(:post_ids AS uuid[]))"))
+
+_refresh_all = text(_refresh_template.format(where=""))
+
+# Cards of posts whose source row is gone (only possible if the cascade was
+# bypassed, e.g. by a manual delete with triggers disabled)
+_delete_orphans = text("""
+    DELETE FROM post_cards pc
+    WHERE NOT EXISTS (SELECT 1 FROM posts p WHERE p.id = pc.post_id)
+    RETURNING pc.post_id
+""")
+
+_refresh_author = text("""
+    UPDATE post_cards pc
+    SET username = u.username, user_image = COALESCE(u.user_image, '')
+    FROM users u
+    WHERE u.id = :user_id AND pc.user_id = u.id
+""")
+
+
+async def get_post_cards(db, post_ids):
+    """
+    Viewer-independent post cards for `post_ids`, in the same order.
+    Ids that no longer exist are skipped.
+    """
+    if not post_ids:
+        return []
+
+    post_ids = [str(post_id) for post_id in post_ids]
+    result = await db.execute(_get_posts_by_ids, {"post_ids": post_ids})
+    cards = {str(row.post_id): dict(row._mapping) for row in result.fetchall()}
+
+    return [cards[post_id] for post_id in post_ids if post_id in cards]
+
+
+async def refresh_post_cards(db, post_ids=None):
+    """
+    Recomputes the cards of `post_ids` (every post when None) from the source
+    tables. Runs in the caller's transaction; returns the number of cards written.
+    """
+    if post_ids is None:
+        await db.execute(_delete_orphans)
+        result = await db.execute(_refresh_all)
+    else:
+        result = await db.execute(_refresh_posts, {"post_ids": [str(post_id) for post_id in post_ids]})
+
+    return len(result.fetchall())
+
+
+async def refresh_author_cards(db, user_id):
+    """Copies the author's current username and avatar onto all their cards."""
+    await db.execute(_refresh_author, {"user_id": user_id})
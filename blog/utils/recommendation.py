@@ -1,46 +1,198 @@
-def recommend_posts(user_interests, posts, db):
-    user_interest_arr = [row[0] for row in user_interests]
-    
-    
-        
-    columns = [
-        "post_id", "content", "created_at", "user_id",
-        "user_image","likes", "saved", "comments", "images", "tags", "videos", "username"
-    ]
-
-    posts_arr = [
-        dict(zip(columns, row))
-        for row in posts 
-    ]
-       
-    recommendations = []
-    
-    for post in posts_arr:
-        # Step 1: Check tag match
-        
-        tags_string = getattr(post, "tags", "") or ""
-        
-        # split the tags if string is available
-        post_tags = tags_string.split(",") if tags_string else []
-        
-        tag_match = len(set(user_interest_arr) & set(post_tags))
-        print(f"Tag match: {tag_match}")
-
-        # Step 2: Calculate engagement score
-        engagement_score = (post["likes"] * 1) + (post["comments"] * 2) + (post["saved"] * 3)
-        
-        # Step 3: Overall score
-        if not tag_match and not engagement_score:
-            continue
-        
-        total_score = (tag_match * 10) + engagement_score
-        
-        recommendations.append({
-            "post_id": post["post_id"],
-            "score": total_score
-        })
-    
-    # Step 4: Sort by highest score
-    recommendations = sorted(recommendations, key=lambda x: x["score"], reverse=True)
-    
-    return recommendations
+import asyncio
+import os
+import time
+
+import numpy as np
+from cachetools import LRUCache
+from sqlalchemy import text
+
+from .tags import normalize_tag
+
+# Post recommendations for GET /posts/recommended.
+#
+# Candidates are the most recent posts plus the most engaged posts of the last
+# POPULAR_WINDOW_DAYS. They are loaded once every CANDIDATE_TTL seconds into
+# flat NumPy arrays shared by all viewers, built on a worker thread and
+# swapped in whole; requests arriving during a reload score the previous set.
+# Scoring a viewer is a few vectorized passes over those arrays:
+#
+#   score = (TAG_WEIGHT * tags matching the viewer's interests
+#            + likes * 1 + comments * 2 + saves * 3)
+#           * 0.5 ** (age_hours / HALF_LIFE_HOURS)
+#
+# The viewer's own posts and posts scoring 0 are dropped. Each viewer's top
+# TOP_K post ids are cached for RESULT_TTL seconds.
+
+TAG_WEIGHT = 10
+ENGAGEMENT_WEIGHTS = {"likes": 1, "comments": 2, "saves": 3}
+
+HALF_LIFE_HOURS = float(os.getenv("RECOMMEND_HALF_LIFE_HOURS", "48"))
+RECENT_CANDIDATES = int(os.getenv("RECOMMEND_RECENT_CANDIDATES", "50000"))
+POPULAR_CANDIDATES = int(os.getenv("RECOMMEND_POPULAR_CANDIDATES", "50000"))
+POPULAR_WINDOW_DAYS = int(os.getenv("RECOMMEND_POPULAR_WINDOW_DAYS", "7"))
+CANDIDATE_TTL = int(os.getenv("RECOMMEND_CANDIDATE_TTL", "60"))
+RESULT_TTL = int(os.getenv("RECOMMEND_RESULT_TTL", "300"))
+TOP_K = int(os.getenv("RECOMMEND_TOP_K", "200"))
+
+_get_candidates = text("""
+    (
+        SELECT pc.post_id, pc.user_id, pc.created_at, pc.likes, pc.comments, pc.saves, pc.tags
+        FROM post_cards pc
+        ORDER BY pc.created_at DESC, pc.post_id DESC
+        LIMIT :recent_limit
+    )
+    UNION
+    (
+        SELECT pc.post_id, pc.user_id, pc.created_at, pc.likes, pc.comments, pc.saves, pc.tags
+        FROM post_cards pc
+        WHERE pc.created_at > NOW() - make_interval(days => :popular_days)
+        ORDER BY pc.likes + 2 * pc.comments + 3 * pc.saves DESC
+        LIMIT :popular_limit
+    )
+""")
+
+_get_user_interests = text("SELECT interest FROM user_interests WHERE user_id = :user_id")
+
+
+class CandidateSet:
+    """
+    Candidate posts as column arrays. Tags are stored CSR-style: tag_codes
+    holds every tag of every post as an integer code and tag_owner the index
+    of the post it belongs to.
+    """
+
+    def __init__(self, post_ids, author_ids, created_ts, likes, comments, saves, tags):
+        self.post_ids = list(post_ids)
+        self.size = len(self.post_ids)
+
+        self._author_codes = {}
+        self.author_codes = np.fromiter(
+            (self._author_codes.setdefault(str(author), len(self._author_codes)) for author in author_ids),
+            dtype=np.int32, count=self.size,
+        )
+        self.created_ts = np.asarray(created_ts, dtype=np.float64)
+
+        # Engagement does not depend on the viewer, so it is summed once here
+        self.engagement = (
+            np.asarray(likes, dtype=np.float64) * ENGAGEMENT_WEIGHTS["likes"]
+            + np.asarray(comments, dtype=np.float64) * ENGAGEMENT_WEIGHTS["comments"]
+            + np.asarray(saves, dtype=np.float64) * ENGAGEMENT_WEIGHTS["saves"]
+        )
+
+        self._tag_codes = {}
+        owners, codes = [], []
+        for index, post_tags in enumerate(tags):
+            # A tag repeated on one post only counts once
+            for tag in {normalize_tag(tag) for tag in post_tags or ()} - {""}:
+                owners.append(index)
+                codes.append(self._tag_codes.setdefault(tag, len(self._tag_codes)))
+        self.tag_owner = np.asarray(owners, dtype=np.int32)
+        self.tag_codes = np.asarray(codes, dtype=np.int32)
+
+    @classmethod
+    def from_rows(cls, rows):
+        return cls(
+            [str(row.post_id) for row in rows],
+            [row.user_id for row in rows],
+            [row.created_at.timestamp() for row in rows],
+            [row.likes for row in rows],
+            [row.comments for row in rows],
+            [row.saves for row in rows],
+            [row.tags for row in rows],
+        )
+
+    def tag_matches(self, interests):
+        """Number of each candidate's tags found in `interests`."""
+        codes = [self._tag_codes[tag] for tag in {normalize_tag(i) for i in interests} if tag in self._tag_codes]
+        if not codes:
+            return np.zeros(self.size, dtype=np.float64)
+
+        wanted = np.zeros(len(self._tag_codes), dtype=bool)
+        wanted[codes] = True
+        return np.bincount(self.tag_owner[wanted[self.tag_codes]], minlength=self.size).astype(np.float64)
+
+    def author_mask(self, user_id):
+        code = self._author_codes.get(str(user_id))
+        if code is None:
+            return np.zeros(self.size, dtype=bool)
+        return self.author_codes == code
+
+
+def score_candidates(candidates, interests, viewer_id=None, now=None):
+    """Scores every candidate for one viewer; returns a float64 array."""
+    now = time.time() if now is None else now
+
+    age_hours = np.maximum(now - candidates.created_ts, 0.0) / 3600.0
+    scores = TAG_WEIGHT * candidates.tag_matches(interests) + candidates.engagement
+    scores *= np.exp2(-age_hours / HALF_LIFE_HOURS)
+
+    if viewer_id is not None:
+        scores[candidates.author_mask(viewer_id)] = 0.0
+    return scores
+
+
+def top_post_ids(candidates, scores, k=TOP_K):
+    """Ids of the `k` best-scoring candidates with a positive score, best first."""
+    k = min(k, candidates.size)
+    if k <= 0:
+        return []
+
+    best = np.argpartition(scores, -k)[-k:]
+    best = best[np.argsort(scores[best], kind="stable")[::-1]]
+    return [candidates.post_ids[i] for i in best if scores[i] > 0]
+
+
+_candidates = None
+_candidates_expire_at = 0.0
+_candidates_lock = asyncio.Lock()
+
+_cached_results = LRUCache(maxsize=10_000)
+
+
+async def _reload_candidates(db):
+    global _candidates, _candidates_expire_at
+
+    result = await db.execute(_get_candidates, {
+        "recent_limit": RECENT_CANDIDATES,
+        "popular_limit": POPULAR_CANDIDATES,
+        "popular_days": POPULAR_WINDOW_DAYS,
+    })
+    rows = result.fetchall()
+    # Building the arrays loops over every row in Python; off the event loop
+    # it stalls no other request
+    candidates = await asyncio.to_thread(CandidateSet.from_rows, rows)
+    _candidates, _candidates_expire_at = candidates, time.monotonic() + CANDIDATE_TTL
+
+
+async def load_candidates(db):
+    """
+    The shared candidate set, reloaded at most once per CANDIDATE_TTL. While
+    one caller reloads it, the others get the previous set instead of waiting.
+    """
+    if _candidates is not None and (_candidates_expire_at > time.monotonic() or _candidates_lock.locked()):
+        return _candidates
+
+    async with _candidates_lock:
+        if _candidates is None or _candidates_expire_at <= time.monotonic():
+            await _reload_candidates(db)
+    return _candidates
+
+
+async def recommend_posts(db, user_id):
+    """The viewer's top TOP_K recommended post ids, best first."""
+    now = time.monotonic()
+    hit = _cached_results.get(user_id)
+    if hit and hit[1] > now:
+        return hit[0]
+
+    candidates = await load_candidates(db)
+    result = await db.execute(_get_user_interests, {"user_id": user_id})
+    interests = [row.interest for row in result.fetchall() if row.interest]
+
+    post_ids = top_post_ids(candidates, score_candidates(candidates, interests, viewer_id=user_id))
+    _cached_results[user_id] = (post_ids, now + RESULT_TTL)
+    return post_ids
+
+
+def forget_recommendations(user_id):
+    _cached_results.pop(user_id, None)
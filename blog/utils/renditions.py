@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+
+# Image renditions. Every uploaded image is also stored as WebP at each size
+# in RENDITIONS (longest edge, never upscaled), next to the original as
+# "<name>.<rendition>.webp", plus a PLACEHOLDER_EDGE px blur placeholder kept
+# inline as a data URI. <name> keeps the original's extension, so the same
+# content stored as "<sha256>.jpg" and "<sha256>.png" does not share
+# renditions; images rendered before were stored as "<stem>.<rendition>.webp". Feed cards show the thumb and placeholder instead of
+# the phone-sized original.
+#
+# Decoding and resizing are CPU bound and hold the GIL, so they run in a pool
+# of RENDITION_WORKERS processes; the event loop only ships bytes there and
+# back. An image Pillow cannot read is still stored, just without renditions.
+
+RENDITIONS_ENABLED = os.getenv("MEDIA_RENDITIONS", "1") == "1"
+RENDITION_WORKERS = int(os.getenv("RENDITION_WORKERS", "2"))
+WEBP_QUALITY = int(os.getenv("RENDITION_WEBP_QUALITY", "80"))
+
+RENDITIONS = {"thumb": 480, "medium": 1280}
+PLACEHOLDER_EDGE = 16
+
+_pool = None
+
+
+def rendition_name(generated_name, rendition):
+    return f"{generated_name}.{rendition}.webp"
+
+
+def stored_names(generated_name):
+    """Every storage object name that belongs to an uploaded image."""
+    return [generated_name] + [rendition_name(generated_name, rendition) for rendition in RENDITIONS]
+
+
+def _webp(image, edge, quality):
+    copy = image.copy()
+    copy.thumbnail((edge, edge))
+    buffer = BytesIO()
+    copy.save(buffer, "WEBP", quality=quality)
+    return buffer.getvalue()
+
+
+def render_image(data):
+    """
+    Runs in a worker process. Returns ({rendition: WebP bytes}, placeholder
+    data URI, width, height) for the image in `data`.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as original:
+        # Phones store rotation in EXIF; bake it in since the renditions drop EXIF
+        image = ImageOps.exif_transpose(original)
+        image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+    width, height = image.size
+    renditions = {name: _webp(image, edge, WEBP_QUALITY) for name, edge in RENDITIONS.items()}
+    placeholder = base64.b64encode(_webp(image, PLACEHOLDER_EDGE, 30)).decode("ascii")
+    return renditions, f"data:image/webp;base64,{placeholder}", width, height
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=RENDITION_WORKERS)
+    return _pool
+
+
+async def render(data):
+    """render_image() in the process pool; None if the bytes are not a readable image."""
+    global _pool
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_pool(), render_image, data)
+    except BrokenProcessPool as e:
+        # A worker died (e.g. killed for memory); start a fresh pool next time
+        _pool = None
+        print(f"Image renditions failed: {e}")
+        return None
+    except Exception as e:
+        print(f"Image renditions failed: {e}")
+        return None
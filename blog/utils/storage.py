@@ -0,0 +1,334 @@
+import asyncio
+import hashlib
+import hmac
+import os
+import re
+import time
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urlencode
+
+from starlette.staticfiles import StaticFiles
+
+# Object storage for uploaded media. Every backend has the same async
+# interface:
+#
+#   upload(key, fileobj, size, content_type) -> public URL
+#   delete(key)                     -> None, a missing object is not an error
+#   url(key)                        -> public URL of `key`
+#   size(key)                       -> size in bytes, None if there is no object
+#   download(key)                   -> the object's bytes
+#   list_objects(prefix, page_token, page_size)
+#                                   -> ([(key, size, updated_at)], next page token
+#                                      or None), keys in lexical order
+#   presign_upload(key, content_type, max_size, expires_at)
+#                                   -> {"url", "method", "headers"} a client can
+#                                      upload one object with, without the API
+#
+# Uploads read exactly `size` bytes from a sync file object, STORAGE_CHUNK_BYTES
+# at a time, so memory per upload is bounded by the chunk size rather than the
+# file size. FirebaseStorage wraps the blocking google-cloud-storage client, so
+# its calls run on a dedicated thread pool of STORAGE_THREADS workers rather
+# than on the event loop (or the default executor, which FastAPI's sync
+# dependencies share).
+# The Firebase app is initialised when FirebaseStorage is created, not on
+# import.
+# LocalStorage writes under LOCAL_STORAGE_ROOT and is served by the app itself
+# at LOCAL_STORAGE_URL, so the API runs without Firebase credentials at all.
+# Its presigned uploads are HMAC-signed URLs for PUT LOCAL_UPLOAD_PATH, which
+# blog/routers/uploads.py serves.
+#
+# Objects whose name starts with a SHA-256 digest (see blog/utils/media.py)
+# never change, so both backends serve them with an immutable Cache-Control.
+#
+# STORAGE_BACKEND=firebase (default) or local picks the backend; tests can
+# install any object with the interface above through set_backend().
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firebase")
+STORAGE_THREADS = int(os.getenv("STORAGE_THREADS", "16"))
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", "media")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "/media").rstrip("/")
+LOCAL_UPLOAD_PATH = "/uploads/local"
+FIREBASE_CREDENTIALS = os.getenv(
+    "FIREBASE_CREDENTIALS", "/etc/secrets/file-transfer-app-74625-firebase-adminsdk-4vum9-d106be7043.json"
+)
+
+# Every uploaded object lives under OBJECT_PREFIX/<user id>/
+OBJECT_PREFIX = "plant_disease_detection/"
+
+# Resumable uploads need a multiple of 256 KiB. 8 MiB is also the size up to
+# which the Firebase client sends a file in one request, so no upload buffers
+# more than this
+_CHUNK_UNIT = 256 * 1024
+STORAGE_CHUNK_BYTES = -(-int(os.getenv("STORAGE_CHUNK_BYTES", str(8 * 1024 * 1024))) // _CHUNK_UNIT) * _CHUNK_UNIT
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+_content_addressed = re.compile(r"^[0-9a-f]{64}(\.|$)")
+
+_executor = ThreadPoolExecutor(max_workers=STORAGE_THREADS, thread_name_prefix="storage")
+
+
+async def _offload(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+
+
+def object_key(user_id, file_name):
+    return f"{OBJECT_PREFIX}{user_id}/{file_name}"
+
+
+def parse_object_key(key):
+    """(user_id, file_name) of a key made by object_key(), or None for other keys."""
+    if not key.startswith(OBJECT_PREFIX):
+        return None
+    user_id, _, file_name = key[len(OBJECT_PREFIX):].partition("/")
+    if not user_id or not file_name or "/" in file_name:
+        return None
+    return user_id, file_name
+
+
+def cache_control_for(key):
+    """Cache-Control for the object at `key`, None to leave the default."""
+    if _content_addressed.match(key.rsplit("/", 1)[-1]):
+        return IMMUTABLE_CACHE_CONTROL
+    return None
+
+
+def _firebase_bucket():
+    """The Firebase app's default bucket; the app is initialised on first use."""
+    import firebase_admin
+    from firebase_admin import credentials, storage
+
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(FIREBASE_CREDENTIALS), {
+            "storageBucket": os.getenv("FIREBASE_STORAGE_BUCKET"),
+        })
+    return storage.bucket()
+
+
+class FirebaseStorage:
+    """Firebase Storage bucket; blocking client calls run on the storage thread pool."""
+
+    def __init__(self, bucket=None):
+        # Imported here so the local backend never needs Firebase credentials
+        from google.api_core.exceptions import NotFound
+        self._bucket = bucket if bucket is not None else _firebase_bucket()
+        self._not_found = NotFound
+
+    def _upload(self, key, fileobj, size, content_type):
+        blob = self._bucket.blob(key, chunk_size=STORAGE_CHUNK_BYTES)
+        blob.cache_control = cache_control_for(key)
+        # A public-read ACL set with the upload saves the make_public() round trip
+        blob.upload_from_file(fileobj, size=size, content_type=content_type, predefined_acl="publicRead")
+        return blob.public_url
+
+    def _delete(self, key):
+        # One DELETE instead of exists() + delete(); a 404 means it is already gone
+        try:
+            self._bucket.blob(key).delete()
+        except self._not_found:
+            pass
+
+    def _size(self, key):
+        blob = self._bucket.get_blob(key)
+        return None if blob is None else blob.size
+
+    def _download(self, key):
+        return self._bucket.blob(key).download_as_bytes()
+
+    def _list_objects(self, prefix, page_token, page_size):
+        blobs = self._bucket.list_blobs(prefix=prefix, max_results=page_size, page_token=page_token)
+        page = next(blobs.pages, None)
+        items = [(blob.name, blob.size, blob.updated) for blob in page] if page is not None else []
+        return items, blobs.next_page_token
+
+    def _presign_upload(self, key, content_type, max_size, expires_at):
+        # Both headers are signed, so the client must send them: the object is
+        # public like every other upload and GCS refuses bodies over max_size
+        headers = {"x-goog-acl": "public-read", "x-goog-content-length-range": f"0,{max_size}"}
+        if cache_control_for(key):
+            headers["Cache-Control"] = cache_control_for(key)
+        url = self._bucket.blob(key).generate_signed_url(
+            version="v4", expiration=expires_at, method="PUT", content_type=content_type, headers=headers,
+        )
+        return {"url": url, "method": "PUT", "headers": {"Content-Type": content_type, **headers}}
+
+    async def upload(self, key, fileobj, size, content_type):
+        return await _offload(self._upload, key, fileobj, size, content_type)
+
+    async def delete(self, key):
+        await _offload(self._delete, key)
+
+    async def size(self, key):
+        return await _offload(self._size, key)
+
+    async def download(self, key):
+        return await _offload(self._download, key)
+
+    async def list_objects(self, prefix, page_token=None, page_size=1000):
+        return await _offload(self._list_objects, prefix, page_token, page_size)
+
+    async def presign_upload(self, key, content_type, max_size, expires_at):
+        return await _offload(self._presign_upload, key, content_type, max_size, expires_at)
+
+    def url(self, key):
+        return self._bucket.blob(key).public_url
+
+
+class LocalStorage:
+    """Files under `root`, served at `base_url` (see blog/main.py)."""
+
+    def __init__(self, root=LOCAL_STORAGE_ROOT, base_url=LOCAL_STORAGE_URL, secret=None):
+        self.root = Path(root).resolve()
+        self.base_url = base_url.rstrip("/")
+        self._secret = (secret or os.getenv("SECRET_KEY") or "").encode()
+
+    def path(self, key):
+        path = (self.root / key).resolve()
+        if not path.is_relative_to(self.root):
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def _upload(self, key, fileobj, size):
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write aside and rename, so a reader never sees a partial file
+        partial = path.with_name(f"{path.name}.partial")
+        with open(partial, "wb") as out:
+            remaining = size
+            while remaining > 0:
+                chunk = fileobj.read(min(remaining, STORAGE_CHUNK_BYTES))
+                if not chunk:
+                    break
+                out.write(chunk)
+                remaining -= len(chunk)
+        os.replace(partial, path)
+
+    def _delete(self, key):
+        self.path(key).unlink(missing_ok=True)
+
+    def _size(self, key):
+        try:
+            return self.path(key).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    def _list_objects(self, prefix, page_token, page_size):
+        # Walks the whole tree for every page; fine for the development
+        # backend, where the page token is simply the last key returned
+        keys = sorted(
+            path.relative_to(self.root).as_posix()
+            for path in self.root.rglob("*")
+            if path.is_file()
+        )
+        keys = [key for key in keys if key.startswith(prefix)]
+        if page_token:
+            keys = keys[bisect_right(keys, page_token):]
+
+        items = []
+        for key in keys[:page_size]:
+            try:
+                stat = self.path(key).stat()
+            except FileNotFoundError:
+                continue
+            items.append((key, stat.st_size, datetime.fromtimestamp(stat.st_mtime, timezone.utc)))
+        return items, keys[page_size - 1] if len(keys) > page_size else None
+
+    def _signature(self, key, content_type, max_size, expires):
+        if not self._secret:
+            raise RuntimeError("SECRET_KEY is required to sign local uploads")
+        message = f"{key}\n{content_type}\n{max_size}\n{expires}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def verify_upload(self, key, content_type, max_size, expires, signature):
+        if expires < time.time():
+            return False
+        return hmac.compare_digest(signature, self._signature(key, content_type, max_size, expires))
+
+    async def upload(self, key, fileobj, size, content_type):
+        await _offload(self._upload, key, fileobj, size)
+        return self.url(key)
+
+    async def delete(self, key):
+        await _offload(self._delete, key)
+
+    async def size(self, key):
+        return await _offload(self._size, key)
+
+    async def download(self, key):
+        return await _offload(self.path(key).read_bytes)
+
+    async def list_objects(self, prefix, page_token=None, page_size=1000):
+        return await _offload(self._list_objects, prefix, page_token, page_size)
+
+    async def presign_upload(self, key, content_type, max_size, expires_at):
+        expires = int(expires_at.timestamp())
+        query = urlencode({
+            "key": key,
+            "content_type": content_type,
+            "max_size": max_size,
+            "expires": expires,
+            "signature": self._signature(key, content_type, max_size, expires),
+        })
+        return {"url": f"{LOCAL_UPLOAD_PATH}?{query}", "method": "PUT", "headers": {"Content-Type": content_type}}
+
+    def url(self, key):
+        return f"{self.base_url}/{key}"
+
+
+class LocalMediaFiles(StaticFiles):
+    """Serves LocalStorage objects with the same Cache-Control Firebase would set."""
+
+    def file_response(self, full_path, *args, **kwargs):
+        response = super().file_response(full_path, *args, **kwargs)
+        cache_control = cache_control_for(str(full_path))
+        if cache_control:
+            response.headers["Cache-Control"] = cache_control
+        return response
+
+
+def _backend_from_env():
+    if STORAGE_BACKEND == "local":
+        return LocalStorage()
+    if STORAGE_BACKEND == "firebase":
+        return FirebaseStorage()
+    raise RuntimeError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
+
+
+_backend = None
+
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+
+def get_backend():
+    # Created on first use, so tests can install a backend before Firebase is touched
+    global _backend
+    if _backend is None:
+        _backend = _backend_from_env()
+    return _backend
+
+
+async def upload_stream_to_storage(user_id, file_name, fileobj, size, content_type):
+    try:
+        return await get_backend().upload(object_key(user_id, file_name), fileobj, size, content_type)
+    except Exception as e:
+        print(f"❌ Upload failed: {str(e)}")
+        raise
+
+
+async def upload_file_to_storage(user_id, file_name, file_bytes, content_type):
+    return await upload_stream_to_storage(user_id, file_name, BytesIO(file_bytes), len(file_bytes), content_type)
+
+
+async def delete_file_from_storage(user_id, file_name):
+    try:
+        await get_backend().delete(object_key(user_id, file_name))
+    except Exception as e:
+        print(f"❌ Delete failed: {str(e)}")
+        raise
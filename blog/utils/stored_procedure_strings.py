@@ -11,15 +11,12 @@ _get_user_profile = text("""
         u.firstname,
         u.lastname,
         u.reference_id,
-        (SELECT COUNT (*) FROM notifications WHERE user_id = u.id AND is_read = 0) as notification_count,
+        COALESCE(us.unread_notifications, 0) AS notification_count,
         COALESCE(u.user_image, '') AS user_image,
-        (
-            SELECT COUNT(*) FROM followers WHERE follower_id = u.id
-        ) AS following,
-        (
-            SELECT COUNT(*) FROM followers WHERE following_id = u.id
-        ) AS followers
+        COALESCE(us.following, 0) AS following,
+        COALESCE(us.followers, 0) AS followers
     FROM users u
+    LEFT JOIN user_stats us ON us.user_id = u.id
     WHERE u.id = :userId
 """)
 
@@ -33,15 +30,12 @@ _get_another_user_profile = text("""
         u.firstname,
         u.lastname,
         u.reference_id,
-        (SELECT COUNT (*) FROM notifications WHERE user_id = u.id AND is_read = 0) as notification_count,
+        COALESCE(us.unread_notifications, 0) AS notification_count,
         COALESCE(u.user_image, '') AS user_image,
-        (
-            SELECT COUNT(*) FROM followers WHERE follower_id = u.id
-        ) AS following,
-        (
-            SELECT COUNT(*) FROM followers WHERE following_id = u.id
-        ) AS followers
+        COALESCE(us.following, 0) AS following,
+        COALESCE(us.followers, 0) AS followers
     FROM users u
+    LEFT JOIN user_stats us ON us.user_id = u.id
     WHERE u.id = :userId
 """)
 
@@ -56,13 +50,10 @@ _get_another_user_profile = text("""
         u.lastname,
         u.reference_id,
         COALESCE(u.user_image, '') AS user_image,
-        (
-            SELECT COUNT(*) FROM followers WHERE follower_id = u.id
-        ) AS following,
-        (
-            SELECT COUNT(*) FROM followers WHERE following_id = u.id
-        ) AS followers
+        COALESCE(us.following, 0) AS following,
+        COALESCE(us.followers, 0) AS followers
     FROM users u
+    LEFT JOIN user_stats us ON us.user_id = u.id
     WHERE u.id = :userId
 """)
 
@@ -75,51 +66,26 @@ _view_notifications = text("""
     )
 """)
 
-# Get saved posts
-_get_saved_posts = text("""
-SELECT 
-    p.id AS post_id,
-    p.content,
-    p.created_at,
-    p.user_id,
-    p.has_video,
-
-    COALESCE(u.user_image, '') AS user_image,
-
-    EXISTS (
-        SELECT 1 
-        FROM post_likes  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS liked,
-
-    EXISTS (
-        SELECT 1 
-        FROM saved_posts  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS saved,
-
-    (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-    (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saves,
-    (SELECT COUNT(*) FROM comments WHERE post_id = p.id) AS comments,
-    (SELECT image_url FROM post_images WHERE post_id = p.id LIMIT 1) AS images,
-    (SELECT video_url FROM post_videos WHERE post_id = p.id LIMIT 1) AS videos,
-       COALESCE((
-        SELECT STRING_AGG(tag_name, ',') 
-        FROM tags 
-        WHERE post_id = p.id
-    ), '') AS tags,
-
-    u.username
-FROM posts p
-JOIN users u ON u.id = p.user_id
-WHERE p.id IN (
-    SELECT unnest(string_to_array(:PostIds, ',')::uuid[])
-)
-ORDER BY p.created_at DESC
-OFFSET :offset
-LIMIT :limit;
-""")
-
+# Columns of a post card as the API returns them (media and tags joined
+# with commas). Every post-returning query reads them from post_cards.
+_post_card_columns = """
+    pc.post_id,
+    pc.content,
+    pc.created_at,
+    pc.user_id,
+    pc.has_video,
+    pc.username,
+    pc.user_image,
+    pc.likes,
+    pc.saves,
+    pc.comments,
+    ARRAY_TO_STRING(pc.images, ',') AS images,
+    ARRAY_TO_STRING(pc.thumbnails, ',') AS thumbnails,
+    ARRAY_TO_STRING(pc.previews, ',') AS previews,
+    pc.placeholders,
+    ARRAY_TO_STRING(pc.videos, ',') AS videos,
+    ARRAY_TO_STRING(pc.tags, ',') AS tags
+"""
 
 # Get product history by user
 _get_product_history = text("""
@@ -174,121 +140,20 @@ _get_prediction_history = text("""
 """)
 
 # Get post history
-_get_post_history = text("""
-   SELECT 
-    p.id AS post_id,
-    p.content,
-    p.created_at,
-    p.user_id,
-    p.has_video,
-
-    COALESCE(u.user_image, '') AS user_image,
-
-    (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-
-    (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saves,
-
-    EXISTS (
-        SELECT 1 
-        FROM post_likes  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS liked, 
-
-    EXISTS (
-        SELECT 1 
-        FROM saved_posts  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS saved,
-
-    (SELECT COUNT(*) 
-     FROM comments 
-     WHERE post_id = p.id AND parent_id IS NULL
-    ) AS comments,
-
-    COALESCE((
-        SELECT STRING_AGG(image_url, ',') 
-        FROM post_images 
-        WHERE post_id = p.id
-    ), '') AS images,
-
-    COALESCE((
-        SELECT STRING_AGG(tag_name, ',') 
-        FROM tags 
-        WHERE post_id = p.id
-    ), '') AS tags,
-
-    COALESCE((
-        SELECT STRING_AGG(video_url, ',') 
-        FROM post_videos 
-        WHERE post_id = p.id
-    ), '') AS videos,
-
-    u.username
-
-FROM posts p
-JOIN users u ON u.id = p.user_id
-WHERE p.user_id = :user_id
-ORDER BY p.created_at DESC
-OFFSET :offset
-LIMIT :limit;
-
+_get_post_history = text(f"""
+    SELECT {_post_card_columns}
+    FROM post_cards pc
+    WHERE pc.user_id = :user_id
+    ORDER BY pc.created_at DESC, pc.post_id DESC
+    OFFSET :offset
+    LIMIT :limit;
 """)
 
 # Get post by ID
-_get_post = text("""
-   SELECT 
-    p.id AS post_id,
-    p.content,
-    p.created_at,
-    p.user_id,
-    p.has_video,
-
-    COALESCE(u.user_image, '') AS user_image,
-    u.username,
-
-    (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-
-    EXISTS (
-        SELECT 1 
-        FROM post_likes  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS liked,
-
-    (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saves,
-
-    EXISTS (
-        SELECT 1 
-        FROM saved_posts  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS saved,
-
-    (SELECT COUNT(*) 
-     FROM comments 
-     WHERE post_id = p.id AND parent_id IS NULL
-    ) AS comments,
-
-    COALESCE((
-        SELECT STRING_AGG(image_url, ',') 
-        FROM post_images 
-        WHERE post_id = p.id
-    ), '') AS images,
-
-    COALESCE((
-        SELECT STRING_AGG(tag_name, ',') 
-        FROM tags 
-        WHERE post_id = p.id
-    ), '') AS tags,
-
-    COALESCE((
-        SELECT STRING_AGG(video_url, ',') 
-        FROM post_videos 
-        WHERE post_id = p.id
-    ), '') AS videos
-
-FROM posts p
-JOIN users u ON u.id = p.user_id
-WHERE p.id = :PostId;
-
+_get_post = text(f"""
+    SELECT {_post_card_columns}
+    FROM post_cards pc
+    WHERE pc.post_id = :PostId;
 """)
 
 # Get notifications by user ID
@@ -355,11 +220,12 @@ _get_comments = text("""
             FROM comment_videos 
             WHERE comment_id = c.id::uuid
            ), '') AS videos,  
-        (SELECT COUNT(*) FROM comments WHERE parent_id = c.id) AS replies,
-        (SELECT COUNT(*) FROM comment_likes WHERE comment_id = c.id) AS likes,
+        COALESCE(cs.replies, 0) AS replies,
+        COALESCE(cs.likes, 0) AS likes,
         u.username
     FROM comments c
     LEFT JOIN users u ON u.id = c.user_id
+    LEFT JOIN comment_stats cs ON cs.comment_id = c.id
     WHERE c.post_id = :post_id AND parent_id ISNULL
     ORDER BY c.created_at ASC
 """)
@@ -395,11 +261,12 @@ _get_replies = text("""
             FROM tags 
             WHERE comment_id = c.id::uuid
         ), '') AS tags,
-        (SELECT COUNT(*) FROM comments WHERE parent_id = c.id) AS replies,
-        (SELECT COUNT(*) FROM comment_likes WHERE comment_id = c.id) AS likes,
+        COALESCE(cs.replies, 0) AS replies,
+        COALESCE(cs.likes, 0) AS likes,
         u.username
     FROM comments c
     LEFT JOIN users u ON u.id = c.user_id
+    LEFT JOIN comment_stats cs ON cs.comment_id = c.id
     WHERE c.parent_id = :comment_id
     ORDER BY c.created_at ASC
 """)
@@ -449,11 +316,12 @@ _get_comment = text("""
        ), '') AS tags,
     u.username,
     c.parent_id,
-    (SELECT COUNT(*) FROM comments WHERE parent_id = c.id) AS replies,
-    (SELECT COUNT(*) FROM comment_likes WHERE comment_id = c.id) AS likes
+    COALESCE(cs.replies, 0) AS replies,
+    COALESCE(cs.likes, 0) AS likes
 
 FROM comments c
 LEFT JOIN users u ON u.id = c.user_id
+LEFT JOIN comment_stats cs ON cs.comment_id = c.id
 WHERE c.id = :comment_id;
 """)
 
@@ -477,187 +345,145 @@ _get_all_products = text("""
     FETCH NEXT :limit ROWS ONLY
 """)
 
-# Get all posts
-_get_all_posts = text("""
-
-    SELECT 
-    p.id AS post_id,
-    p.content,
-    p.created_at,
-    p.user_id,
-    p.has_video,
-
-    (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-
-    COALESCE(u.user_image, '') AS user_image,
-
-    EXISTS (
-        SELECT 1 
-        FROM post_likes  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS liked,
-
-    EXISTS (
-        SELECT 1 
-        FROM saved_posts  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS saved,
-
-    (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saves,
-
-    (SELECT COUNT(*) FROM comments WHERE post_id = p.id AND parent_id IS NULL) AS comments,
-
-    COALESCE((
-        SELECT STRING_AGG(image_url, ',') 
-        FROM post_images 
-        WHERE post_id = p.id
-    ), '') AS images,
-
-    COALESCE((
-        SELECT STRING_AGG(tag_name, ',') 
-        FROM tags 
-        WHERE post_id = p.id
-    ), '') AS tags,
-
-    COALESCE((
-        SELECT STRING_AGG(video_url, ',') 
-        FROM post_videos 
-        WHERE post_id = p.id
-    ), '') AS videos,
-
-    u.username
-
-FROM posts p
-JOIN users u ON u.id = p.user_id
-ORDER BY p.created_at DESC
-OFFSET :offset ROWS
-FETCH NEXT :limit ROWS ONLY;
+# Get one page of home feed post ids (cards come from the feed cache)
+_get_all_post_ids = text("""
+    SELECT pc.post_id, pc.created_at
+    FROM post_cards pc
+    ORDER BY pc.created_at DESC, pc.post_id DESC
+    OFFSET :offset ROWS
+    FETCH NEXT :limit ROWS ONLY;
 """)
 
-# Get all posts
-_get_all_streams = text("""
-    SELECT 
-    p.id AS post_id,
-    p.content,
-    p.created_at,
-    p.user_id,
-    p.has_video,
-
-    COALESCE(u.user_image, '') AS user_image,
-    u.username,
-
-    (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-
-    EXISTS (
-        SELECT 1 
-        FROM post_likes  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS liked,
-
-    (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saves,
-
-    EXISTS (
-        SELECT 1 
-        FROM saved_posts  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS saved,
-
-    (SELECT COUNT(*) FROM comments WHERE post_id = p.id) AS comments,
-
-    COALESCE((
-        SELECT STRING_AGG(image_url, ',') 
-        FROM post_images 
-        WHERE post_id = p.id
-    ), '') AS images,
-
-    COALESCE((
-        SELECT STRING_AGG(tag_name, ',') 
-        FROM tags 
-        WHERE post_id = p.id
-    ), '') AS tags,
-
-    COALESCE((
-        SELECT STRING_AGG(video_url, ',') 
-        FROM post_videos 
-        WHERE post_id = p.id
-    ), '') AS videos
-
-FROM posts p
-JOIN users u ON u.id = p.user_id
-WHERE p.has_video = 1 OR p.videos IS NOT NULL
-ORDER BY p.created_at DESC
-OFFSET :offset ROWS
-FETCH NEXT :limit ROWS ONLY 
+# Get one page of home feed post ids after a keyset cursor (created_at, id)
+_get_all_post_ids_after_cursor = text("""
+    SELECT pc.post_id, pc.created_at
+    FROM post_cards pc
+    WHERE (pc.created_at, pc.post_id) < (:cursor_created_at, :cursor_post_id)
+    ORDER BY pc.created_at DESC, pc.post_id DESC
+    FETCH NEXT :limit ROWS ONLY;
 """)
 
-# Get recommended post (sample pattern)
-_get_recommeneded_post = text("""
-    SELECT 
-        p.id AS post_id,
-        p.content,
-        p.created_at,
-        p.user_id,
-        p.has_video,        
-        COALESCE((SELECT user_image FROM users WHERE id = p.user_id), '') AS user_image,
-        (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-        (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saved,
-        (SELECT COUNT(*) FROM comments WHERE post_id = p.id) AS comments,
-        (SELECT TOP 1 image_url FROM post_images WHERE post_id = p.id) AS images,
-        COALESCE((SELECT STRING_AGG(tag_name, ',') FROM tags WHERE post_id = p.id), '') AS tags,
-        (SELECT TOP 1 video_url FROM post_videos WHERE post_id = p.id) AS videos,
-        (SELECT username FROM users WHERE id = p.user_id) AS username
-    FROM posts p
-    WHERE p.id != :currentPostId
-    ORDER BY NEWID()
-    OFFSET 0 ROWS FETCH NEXT :limit ROWS ONLY
+# Get post cards for a set of ids (callers restore the order they need)
+_get_posts_by_ids = text(f"""
+    SELECT {_post_card_columns}
+    FROM post_cards pc
+    WHERE pc.post_id = ANY(CAST(:post_ids AS uuid[]));
 """)
 
+# Following timeline page: fanned-out entries from home_timeline merged with
+# recent posts of followed authors that are too big to fan out on write.
+_following_timeline_template = """
+    (
+        SELECT ht.created_at, ht.post_id
+        FROM home_timeline ht
+        WHERE ht.user_id = :viewer_id {timeline_cursor}
+        ORDER BY ht.created_at DESC, ht.post_id DESC
+        LIMIT :limit
+    )
+    UNION
+    (
+        SELECT cp.created_at, cp.id AS post_id
+        FROM followers f
+        JOIN user_stats us ON us.user_id = f.following_id AND us.followers > :fanout_threshold
+        CROSS JOIN LATERAL (
+            SELECT p.created_at, p.id
+            FROM posts p
+            WHERE p.user_id = f.following_id {posts_cursor}
+            ORDER BY p.created_at DESC, p.id DESC
+            LIMIT :limit
+        ) cp
+        WHERE f.follower_id = :viewer_id
+    )
+    ORDER BY created_at DESC, post_id DESC
+    LIMIT :limit
+"""
+
+_get_following_timeline = text(_following_timeline_template.format(
+    timeline_cursor="",
+    posts_cursor="",
+))
+
+_get_following_timeline_after_cursor = text(_following_timeline_template.format(
+    timeline_cursor="AND (ht.created_at, ht.post_id) < (:cursor_created_at, :cursor_post_id)",
+    posts_cursor="AND (p.created_at, p.id) < (:cursor_created_at, :cursor_post_id)",
+))
+
+# Get one page of video posts (GET /streams), newest first
+_get_all_streams = text(f"""
+    SELECT {_post_card_columns}
+    FROM video_posts vp
+    JOIN post_cards pc ON pc.post_id = vp.post_id
+    ORDER BY vp.created_at DESC, vp.post_id DESC
+    OFFSET :offset ROWS
+    FETCH NEXT :limit ROWS ONLY
+""")
 
-# Get single post (sample pattern)
-_get_single_post = text("""
-  SELECT 
-    p.id AS post_id,
-    p.content,
-    p.created_at,
-    p.user_id,
-    p.has_video,
-
-    COALESCE(u.user_image, '') AS user_image,
-    u.username,
-
-    (SELECT COUNT(*) FROM post_likes WHERE post_id = p.id) AS likes,
-
-    EXISTS (
-        SELECT 1 
-        FROM post_likes  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS liked, 
-
-    EXISTS (
-        SELECT 1 
-        FROM saved_posts  
-        WHERE post_id = p.id AND user_id = :current_user_id
-    ) AS saved, 
-
-    (SELECT COUNT(*) FROM saved_posts WHERE post_id = p.id) AS saves,
-
-    (SELECT COUNT(*) FROM comments WHERE post_id = p.id AND parent_id IS NULL) AS comments,
-
-    (SELECT image_url FROM post_images WHERE post_id = p.id LIMIT 1) AS images,
+# Get one page of video posts after a keyset cursor (created_at, id)
+_get_all_streams_after_cursor = text(f"""
+    SELECT {_post_card_columns}
+    FROM video_posts vp
+    JOIN post_cards pc ON pc.post_id = vp.post_id
+    WHERE (vp.created_at, vp.post_id) < (:cursor_created_at, :cursor_post_id)
+    ORDER BY vp.created_at DESC, vp.post_id DESC
+    FETCH NEXT :limit ROWS ONLY
+""")
 
-    COALESCE((
-        SELECT STRING_AGG(tag_name, ',') 
-        FROM tags 
-        WHERE post_id = p.id
-    ), '') AS tags,
+# One page of the trending ranking (rebuilt by refresh-trending); ranks are
+# contiguous, so a page is a primary-key range
+_get_trending_post_ids = text("""
+    SELECT tp.rank, tp.post_id, (SELECT MAX(rank) FROM trending_posts) AS last_rank
+    FROM trending_posts tp
+    WHERE tp.rank > :offset AND tp.rank <= :offset + :limit
+    ORDER BY tp.rank
+""")
 
-    (SELECT video_url FROM post_videos WHERE post_id = p.id LIMIT 1) AS videos
+_get_trending_tags = text("""
+    SELECT tt.rank, tt.tag_name, tt.score, (SELECT MAX(rank) FROM trending_tags) AS last_rank
+    FROM trending_tags tt
+    WHERE tt.rank > :offset AND tt.rank <= :offset + :limit
+    ORDER BY tt.rank
+""")
 
-FROM posts p
-JOIN users u ON u.id = p.user_id
-WHERE p.id = :currentPostId;
+# Posts a user saved, most recently saved first (created_at is the save time)
+_saved_posts_template = """
+    SELECT sp.created_at, sp.post_id
+    FROM saved_posts sp
+    WHERE sp.user_id = :user_id {cursor}
+    ORDER BY sp.created_at DESC, sp.post_id DESC
+    {paging}
+"""
+
+_get_saved_post_ids = text(_saved_posts_template.format(
+    cursor="",
+    paging="OFFSET :offset LIMIT :limit",
+))
+
+_get_saved_post_ids_after_cursor = text(_saved_posts_template.format(
+    cursor="AND (sp.created_at, sp.post_id) < (:cursor_created_at, :cursor_post_id)",
+    paging="LIMIT :limit",
+))
+
+# Posts a user liked, most recent like first (created_at is the like time)
+_liked_posts_template = """
+    SELECT pl.created_at, pl.post_id
+    FROM post_likes pl
+    WHERE pl.user_id = :user_id {cursor}
+    ORDER BY pl.created_at DESC, pl.post_id DESC
+    LIMIT :limit
+"""
+
+_get_liked_post_ids = text(_liked_posts_template.format(cursor=""))
+
+_get_liked_post_ids_after_cursor = text(_liked_posts_template.format(
+    cursor="AND (pl.created_at, pl.post_id) < (:cursor_created_at, :cursor_post_id)",
+))
 
 
+# Get single post (sample pattern)
+_get_single_post = text(f"""
+    SELECT {_post_card_columns}
+    FROM post_cards pc
+    WHERE pc.post_id = :currentPostId;
 """)
 
 
@@ -0,0 +1,114 @@
+from functools import lru_cache
+
+from sqlalchemy import text
+
+# Tags. `tags` keeps every tag as typed, for posts and comments, and is what
+# cards display. Post tags are also indexed: tag_dictionary maps each
+# normalized name to an integer id and post_tags(tag_id, created_at, post_id)
+# is the posting list of a tag, newest first, so a tag feed is one index range.
+
+# Most tags a multi-tag query may combine
+MAX_QUERY_TAGS = 5
+
+
+def normalize_tag(name):
+    return name.strip().lstrip("#").strip().lower()
+
+
+def parse_tags(raw):
+    """Comma-separated tags as typed, stripped, without blanks or repeats."""
+    seen, names = set(), []
+    for name in (raw or "").split(","):
+        name = name.strip()
+        key = normalize_tag(name)
+        if key and key not in seen:
+            seen.add(key)
+            names.append(name)
+    return names
+
+
+_insert_post_tags = text("""
+    INSERT INTO tags (tag_name, created_at, post_id, creator)
+    SELECT name, NOW(), :post_id, 'user'
+    FROM unnest(CAST(:names AS text[])) AS name
+""")
+
+_insert_comment_tags = text("""
+    INSERT INTO tags (tag_name, created_at, comment_id, creator)
+    SELECT name, NOW(), :comment_id, 'user'
+    FROM unnest(CAST(:names AS text[])) AS name
+""")
+
+_insert_dictionary = text("""
+    INSERT INTO tag_dictionary (name)
+    SELECT unnest(CAST(:keys AS text[]))
+    ON CONFLICT (name) DO NOTHING
+""")
+
+# A separate statement from _insert_dictionary so it also sees names that a
+# concurrent transaction inserted first
+_index_post = text("""
+    INSERT INTO post_tags (tag_id, created_at, post_id)
+    SELECT td.id, p.created_at, p.id
+    FROM posts p
+    JOIN tag_dictionary td ON td.name = ANY(CAST(:keys AS text[]))
+    WHERE p.id = :post_id
+    ON CONFLICT DO NOTHING
+""")
+
+_get_tag_ids = text("""
+    SELECT id, name FROM tag_dictionary WHERE name = ANY(CAST(:keys AS text[]))
+""")
+
+
+async def add_post_tags(db, post_id, names):
+    """Stores and indexes a post's tags with one statement per table."""
+    if not names:
+        return
+
+    keys = sorted({normalize_tag(name) for name in names})
+    await db.execute(_insert_post_tags, {"post_id": post_id, "names": list(names)})
+    await db.execute(_insert_dictionary, {"keys": keys})
+    await db.execute(_index_post, {"post_id": post_id, "keys": keys})
+
+
+async def add_comment_tags(db, comment_id, names):
+    if names:
+        await db.execute(_insert_comment_tags, {"comment_id": comment_id, "names": list(names)})
+
+
+async def get_tag_ids(db, names):
+    """Dictionary ids of `names` (normalized); unknown tags are left out."""
+    keys = sorted({normalize_tag(name) for name in names} - {""})
+    if not keys:
+        return {}
+
+    result = await db.execute(_get_tag_ids, {"keys": keys})
+    return {row.name: row.id for row in result.fetchall()}
+
+
+@lru_cache(maxsize=None)
+def tag_posts_stmt(tag_count, match_all, after_cursor):
+    """
+    One page of post ids carrying all (INTERSECT) or any (UNION) of
+    :tag_0 .. :tag_{n-1}, newest first. Each branch is a single post_tags
+    range; OR branches are cut to :limit before merging since no post past
+    that can make the page.
+    """
+    cursor = "AND (created_at, post_id) < (:cursor_created_at, :cursor_post_id)" if after_cursor else ""
+    branch_limit = "" if match_all else "ORDER BY created_at DESC, post_id DESC LIMIT :limit"
+
+    branches = [
+        f"""(
+            SELECT created_at, post_id FROM post_tags
+            WHERE tag_id = :tag_{i} {cursor}
+            {branch_limit}
+        )"""
+        for i in range(tag_count)
+    ]
+    combined = "\nINTERSECT\n" if match_all else "\nUNION\n"
+    return text(f"""
+        {combined.join(branches)}
+        ORDER BY created_at DESC, post_id DESC
+        LIMIT :limit
+    """)
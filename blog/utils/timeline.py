@@ -0,0 +1,54 @@
+import os
+
+from sqlalchemy import text
+
+# Authors with more followers than this are not fanned out on write; their
+# posts are merged into followers' timelines at read time instead.
+FANOUT_THRESHOLD = int(os.getenv("TIMELINE_FANOUT_THRESHOLD", "5000"))
+
+# Posts copied into a timeline when someone follows a new author
+FOLLOW_BACKFILL = int(os.getenv("TIMELINE_FOLLOW_BACKFILL", "20"))
+
+_fan_out_post = text("""
+    INSERT INTO home_timeline (user_id, created_at, post_id, author_id)
+    SELECT r.user_id, p.created_at, p.id, p.user_id
+    FROM posts p
+    CROSS JOIN LATERAL (
+        SELECT p.user_id AS user_id
+        UNION ALL
+        SELECT f.follower_id
+        FROM followers f
+        WHERE f.following_id = p.user_id
+          AND COALESCE((SELECT followers FROM user_stats WHERE user_id = p.user_id), 0) <= :fanout_threshold
+    ) r
+    WHERE p.id = :post_id
+    ON CONFLICT DO NOTHING
+""")
+
+_backfill_author = text("""
+    INSERT INTO home_timeline (user_id, created_at, post_id, author_id)
+    SELECT CAST(:user_id AS uuid), p.created_at, p.id, p.user_id
+    FROM posts p
+    WHERE p.user_id = :author_id
+    ORDER BY p.created_at DESC, p.id DESC
+    LIMIT :limit
+    ON CONFLICT DO NOTHING
+""")
+
+_remove_author = text("""
+    DELETE FROM home_timeline
+    WHERE user_id = :user_id AND author_id = :author_id
+""")
+
+
+async def fan_out_post(db, post_id):
+    """Writes a new post into its author's and followers' timelines in one batched insert."""
+    await db.execute(_fan_out_post, {"post_id": str(post_id), "fanout_threshold": FANOUT_THRESHOLD})
+
+
+async def follow_author(db, user_id, author_id):
+    await db.execute(_backfill_author, {"user_id": user_id, "author_id": author_id, "limit": FOLLOW_BACKFILL})
+
+
+async def unfollow_author(db, user_id, author_id):
+    await db.execute(_remove_author, {"user_id": user_id, "author_id": author_id})
@@ -0,0 +1,243 @@
+from sqlalchemy import text
+
+from .timeline import FOLLOW_BACKFILL
+
+# Like, save, comment-like and follow toggles, one statement each. Every
+# statement deletes the caller's edge if it exists and inserts it otherwise,
+# moves the counters by the rows it actually changed, writes or removes the
+# like notification (with its unread count) or, for follows, the home
+# timeline entries, and returns the new state. That is one round trip per tap
+# instead of a check followed by writes.
+#
+# The edges have unique indexes (migration 014_toggle_constraints.sql), so
+# two taps racing on a missing edge insert it once: the loser's ON CONFLICT
+# DO NOTHING changes nothing, and the result still reports the edge as set.
+# Counters are bumped per changed row, the same way blog/utils/counters.py
+# does, so reconcile-counters stays the repair path. Removed likes and saves
+# are logged for the trending job (blog/utils/trending.py).
+
+# "added" and "removed" are the edge CTEs; only one of them has rows
+_edge_set = "EXISTS (SELECT 1 FROM added) OR NOT EXISTS (SELECT 1 FROM removed)"
+
+# Like notification of "target" (id, content) for {recipient}, and its unread count
+_like_notification = """
+    unnotified AS (
+        DELETE FROM notifications n
+        WHERE EXISTS (SELECT 1 FROM removed)
+          AND n.actor_id = :user_id AND n.type = 'like'
+          AND n.entity_type = '{entity_type}' AND n.entity_id = :entity_id
+        RETURNING n.user_id, n.is_read
+    ),
+    notified AS (
+        INSERT INTO notifications (
+            user_id, actor_id, type, entity_type, entity_id, message, is_read, created_at
+        )
+        SELECT {recipient}, CAST(:user_id AS uuid), 'like', '{entity_type}', target.id,
+               COALESCE(target.content, ''), 0, NOW()
+        FROM target
+        WHERE EXISTS (SELECT 1 FROM added)
+        ON CONFLICT (actor_id, entity_type, entity_id) WHERE type = 'like' DO NOTHING
+        RETURNING id, user_id
+    ),
+    unread_up AS (
+        INSERT INTO user_stats (user_id, unread_notifications)
+        SELECT user_id, COUNT(*) FROM notified GROUP BY user_id
+        ON CONFLICT (user_id) DO UPDATE
+        SET unread_notifications = user_stats.unread_notifications + EXCLUDED.unread_notifications
+    ),
+    unread_down AS (
+        UPDATE user_stats s
+        SET unread_notifications = GREATEST(s.unread_notifications - d.n, 0)
+        FROM (SELECT user_id, COUNT(*) AS n FROM unnotified WHERE is_read = 0 GROUP BY user_id) d
+        WHERE s.user_id = d.user_id
+    )
+"""
+
+_toggle_post_like = text(f"""
+    WITH target AS (
+        SELECT id, user_id, content FROM posts WHERE id = :entity_id
+    ),
+    removed AS (
+        DELETE FROM post_likes l
+        USING target
+        WHERE l.post_id = target.id AND l.user_id = :user_id
+        RETURNING l.post_id, l.created_at
+    ),
+    logged AS (
+        INSERT INTO engagement_removals (post_id, kind, created_at)
+        SELECT post_id, 'like', created_at FROM removed
+    ),
+    added AS (
+        INSERT INTO post_likes (post_id, user_id, created_at)
+        SELECT target.id, CAST(:user_id AS uuid), NOW()
+        FROM target
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, post_id) DO NOTHING
+        RETURNING id
+    ),
+    counted AS (
+        UPDATE post_cards
+        SET likes = GREATEST(likes + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0)
+        WHERE post_id = :entity_id
+          AND EXISTS (SELECT 1 FROM added UNION ALL SELECT 1 FROM removed)
+    ),
+    {_like_notification.format(entity_type="post", recipient="target.user_id")}
+    SELECT
+        (SELECT user_id FROM target) AS owner_id,
+        {_edge_set} AS liked,
+        (SELECT id FROM added) AS like_id,
+        (SELECT id FROM notified) AS notification_id
+""")
+
+_toggle_comment_like = text(f"""
+    WITH target AS (
+        SELECT id, content FROM comments WHERE id = :entity_id
+    ),
+    removed AS (
+        DELETE FROM comment_likes l
+        USING target
+        WHERE l.comment_id = target.id AND l.user_id = :user_id
+        RETURNING l.comment_id
+    ),
+    added AS (
+        INSERT INTO comment_likes (comment_id, user_id, created_at)
+        SELECT target.id, CAST(:user_id AS uuid), NOW()
+        FROM target
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, comment_id) DO NOTHING
+        RETURNING comment_id
+    ),
+    likes_up AS (
+        INSERT INTO comment_stats (comment_id, likes)
+        SELECT comment_id, 1 FROM added
+        ON CONFLICT (comment_id) DO UPDATE SET likes = comment_stats.likes + 1
+    ),
+    likes_down AS (
+        UPDATE comment_stats
+        SET likes = GREATEST(likes - 1, 0)
+        WHERE comment_id IN (SELECT comment_id FROM removed)
+    ),
+    {_like_notification.format(entity_type="comment", recipient="CAST(:recipient_id AS uuid)")}
+    SELECT
+        EXISTS (SELECT 1 FROM target) AS found,
+        {_edge_set} AS liked
+""")
+
+_toggle_save = text(f"""
+    WITH target AS (
+        SELECT id, user_id FROM posts WHERE id = :post_id
+    ),
+    removed AS (
+        DELETE FROM saved_posts s
+        USING target
+        WHERE s.post_id = target.id AND s.user_id = :user_id
+        RETURNING s.post_id, s.created_at
+    ),
+    logged AS (
+        INSERT INTO engagement_removals (post_id, kind, created_at)
+        SELECT post_id, 'save', created_at FROM removed
+    ),
+    added AS (
+        INSERT INTO saved_posts (post_id, user_id, created_at)
+        SELECT target.id, CAST(:user_id AS uuid), NOW()
+        FROM target
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (user_id, post_id) DO NOTHING
+        RETURNING post_id
+    ),
+    counted AS (
+        UPDATE post_cards
+        SET saves = GREATEST(saves + (SELECT COUNT(*) FROM added) - (SELECT COUNT(*) FROM removed), 0)
+        WHERE post_id = :post_id
+          AND EXISTS (SELECT 1 FROM added UNION ALL SELECT 1 FROM removed)
+    )
+    SELECT
+        (SELECT user_id FROM target) AS owner_id,
+        {_edge_set} AS saved
+""")
+
+# Following yourself moves both counters of one user_stats row, hence the
+# per-user sums in "deltas"
+_toggle_follow = text(f"""
+    WITH target AS (
+        SELECT id FROM users WHERE id = :author_id
+    ),
+    removed AS (
+        DELETE FROM followers f
+        USING target
+        WHERE f.following_id = target.id AND f.follower_id = :user_id
+        RETURNING f.following_id
+    ),
+    added AS (
+        INSERT INTO followers (following_id, follower_id)
+        SELECT target.id, CAST(:user_id AS uuid)
+        FROM target
+        WHERE NOT EXISTS (SELECT 1 FROM removed)
+        ON CONFLICT (follower_id, following_id) DO NOTHING
+        RETURNING following_id
+    ),
+    deltas AS (
+        SELECT user_id, SUM(followers) AS followers, SUM(following) AS following
+        FROM (
+            SELECT CAST(:author_id AS uuid) AS user_id, 1 AS followers, 0 AS following
+            UNION ALL
+            SELECT CAST(:user_id AS uuid), 0, 1
+        ) d
+        GROUP BY user_id
+    ),
+    stats_up AS (
+        INSERT INTO user_stats (user_id, followers, following)
+        SELECT user_id, followers, following FROM deltas
+        WHERE EXISTS (SELECT 1 FROM added)
+        ON CONFLICT (user_id) DO UPDATE
+        SET followers = user_stats.followers + EXCLUDED.followers,
+            following = user_stats.following + EXCLUDED.following
+    ),
+    stats_down AS (
+        UPDATE user_stats s
+        SET followers = GREATEST(s.followers - d.followers, 0),
+            following = GREATEST(s.following - d.following, 0)
+        FROM deltas d
+        WHERE s.user_id = d.user_id AND EXISTS (SELECT 1 FROM removed)
+    ),
+    backfilled AS (
+        INSERT INTO home_timeline (user_id, created_at, post_id, author_id)
+        SELECT CAST(:user_id AS uuid), p.created_at, p.id, p.user_id
+        FROM posts p
+        WHERE p.user_id = :author_id AND EXISTS (SELECT 1 FROM added)
+        ORDER BY p.created_at DESC, p.id DESC
+        LIMIT :backfill
+        ON CONFLICT DO NOTHING
+    ),
+    pruned AS (
+        DELETE FROM home_timeline
+        WHERE user_id = :user_id AND author_id = :author_id AND EXISTS (SELECT 1 FROM removed)
+    )
+    SELECT
+        EXISTS (SELECT 1 FROM target) AS found,
+        {_edge_set} AS following
+""")
+
+
+async def toggle_post_like(db, user_id, post_id):
+    """Row of (owner_id, liked, like_id, notification_id); owner_id is None if the post does not exist."""
+    return (await db.execute(_toggle_post_like, {"user_id": user_id, "entity_id": post_id})).fetchone()
+
+
+async def toggle_comment_like(db, user_id, comment_id, recipient_id):
+    """Row of (found, liked); the like notification goes to `recipient_id`."""
+    return (await db.execute(_toggle_comment_like, {
+        "user_id": user_id, "entity_id": comment_id, "recipient_id": recipient_id,
+    })).fetchone()
+
+
+async def toggle_save(db, user_id, post_id):
+    """Row of (owner_id, saved); owner_id is None if the post does not exist."""
+    return (await db.execute(_toggle_save, {"user_id": user_id, "post_id": post_id})).fetchone()
+
+
+async def toggle_follow(db, user_id, author_id):
+    """Row of (found, following) for `user_id` following `author_id`."""
+    return (await db.execute(_toggle_follow, {
+        "user_id": user_id, "author_id": author_id, "backfill": FOLLOW_BACKFILL,
+    })).fetchone()
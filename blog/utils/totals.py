@@ -0,0 +1,59 @@
+import time
+
+from cachetools import LRUCache
+from sqlalchemy import text
+
+# Strategies for the numb_found field of list responses. Each endpoint picks
+# the cheapest one its clients can live with:
+#
+#   exact_total     - plain COUNT(*) every request
+#   cached_total    - exact COUNT(*) memoised per key for `ttl` seconds;
+#                     write paths call forget_total(key) to drop stale values
+#   estimated_total - planner estimate from pg_class.reltuples, for whole-table
+#                     counts on large tables
+#   paged_total     - no count query at all; derived from a LIMIT + 1 fetch
+#                     so numb_found only says whether another page exists
+
+_cached_totals = LRUCache(maxsize=10_000)
+
+_estimate_stmt = text("""
+    SELECT reltuples::bigint AS estimate
+    FROM pg_class
+    WHERE oid = to_regclass(:table_name)
+""")
+
+
+async def exact_total(db, count_stmt, params=None):
+    result = await db.execute(count_stmt, params or {})
+    return result.scalar() or 0
+
+
+async def cached_total(db, key, count_stmt, params=None, ttl=60):
+    now = time.monotonic()
+    hit = _cached_totals.get(key)
+    if hit and hit[1] > now:
+        return hit[0]
+
+    total = await exact_total(db, count_stmt, params)
+    _cached_totals[key] = (total, now + ttl)
+    return total
+
+
+def forget_total(key):
+    _cached_totals.pop(key, None)
+
+
+async def estimated_total(db, table_name, ttl=300):
+    result = await db.execute(_estimate_stmt, {"table_name": table_name})
+    estimate = result.scalar()
+
+    # reltuples is -1 (or missing) until the table has been analyzed
+    if estimate is None or estimate < 0:
+        return await cached_total(db, f"count:{table_name}", text(f"SELECT COUNT(*) FROM {table_name}"), ttl=ttl)
+
+    return int(estimate)
+
+
+def paged_total(offset_rows, page_size, has_more):
+    """numb_found for endpoints that only know whether another page exists."""
+    return offset_rows + page_size + (1 if has_more else 0)
@@ -0,0 +1,268 @@
+import math
+import os
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+# Trending posts and tags (see migration 006_trending.sql for the tables).
+#
+# refresh_trending() reads only the engagement since the watermark and keeps
+# net hourly counts of likes, saves and comments per post and per tag in the
+# bucket tables. Each like or save counts once in the run covering its
+# created_at, whether it still exists or was removed since, and an unlike or
+# unsave (logged in engagement_removals by the toggles, migration
+# 015_engagement_removals.sql) takes it out again in the run covering the
+# removal, from the bucket it was counted in. Toggling a like therefore never
+# adds up.
+#
+# The posts and tags a run touched are then rescored from their buckets
+#
+#   score = sum(weight * count * 0.5 ** (age_hours / HALF_LIFE_HOURS))
+#
+# with each bucket aged from its middle, kept as log2(score) relative to
+# EPOCH. An untouched score therefore never has to be decayed in place:
+# ordering by log_score is the same as ordering by the decayed score at any
+# moment. Buckets older than BUCKET_RETENTION_DAYS are dropped; by then their
+# weight is negligible. The top TRENDING_SIZE posts and tags are then written,
+# ranked, into trending_posts / trending_tags, which the endpoints page
+# through by rank.
+
+WEIGHTS = {"likes": 1, "comments": 2, "saves": 3}
+
+HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "12"))
+TRENDING_SIZE = int(os.getenv("TRENDING_SIZE", "1000"))
+BUCKET_RETENTION_DAYS = int(os.getenv("TRENDING_BUCKET_RETENTION_DAYS", "7"))
+
+# Scores that have decayed below this are dropped
+MIN_SCORE = float(os.getenv("TRENDING_MIN_SCORE", "0.05"))
+
+# Engagement younger than this is left for the next run, so rows from
+# transactions still in flight when a run starts are not skipped
+LAG_SECONDS = int(os.getenv("TRENDING_LAG_SECONDS", "60"))
+
+# Changing EPOCH or HALF_LIFE_HOURS invalidates stored log scores
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+_WATERMARK = "engagement"
+
+# 2 ** -60 is far below anything that can change a ranking; clamping there
+# keeps POWER() clear of float underflow errors
+_MIN_EXPONENT = -60
+
+_lock_watermark = text("""
+    SELECT processed_until, NOW() - make_interval(secs => :lag) AS run_until
+    FROM trending_watermark
+    WHERE name = :name
+    FOR UPDATE
+""")
+
+_create_events = text("""
+    CREATE TEMP TABLE trending_events (
+        post_id UUID NOT NULL,
+        created_at TIMESTAMPTZ NOT NULL,
+        likes INTEGER NOT NULL,
+        saves INTEGER NOT NULL,
+        comments INTEGER NOT NULL
+    ) ON COMMIT DROP
+""")
+
+# Every like and save created in the window counts once, including those
+# removed since; removals in the window are taken back out
+_collect_events = text("""
+    INSERT INTO trending_events (post_id, created_at, likes, saves, comments)
+    SELECT post_id, created_at, 1, 0, 0 FROM post_likes
+    WHERE created_at > :since AND created_at <= :until
+    UNION ALL
+    SELECT post_id, created_at, 0, 1, 0 FROM saved_posts
+    WHERE created_at > :since AND created_at <= :until
+    UNION ALL
+    SELECT post_id, created_at, 0, 0, 1 FROM comments
+    WHERE created_at > :since AND created_at <= :until AND post_id IS NOT NULL
+    UNION ALL
+    SELECT post_id, created_at, (kind = 'like')::int, (kind = 'save')::int, 0 FROM engagement_removals
+    WHERE created_at > :since AND created_at <= :until
+    UNION ALL
+    SELECT post_id, created_at, -(kind = 'like')::int, -(kind = 'save')::int, 0 FROM engagement_removals
+    WHERE removed_at > :since AND removed_at <= :until
+""")
+
+_forget_removals = text("DELETE FROM engagement_removals WHERE removed_at <= :until")
+
+_bucket_posts = text("""
+    INSERT INTO post_engagement_buckets (post_id, bucket, likes, saves, comments)
+    SELECT e.post_id, date_trunc('hour', e.created_at), SUM(e.likes), SUM(e.saves), SUM(e.comments)
+    FROM trending_events e
+    JOIN posts p ON p.id = e.post_id
+    GROUP BY 1, 2
+    ON CONFLICT (post_id, bucket) DO UPDATE
+    SET likes = post_engagement_buckets.likes + EXCLUDED.likes,
+        saves = post_engagement_buckets.saves + EXCLUDED.saves,
+        comments = post_engagement_buckets.comments + EXCLUDED.comments
+""")
+
+_bucket_tags = text("""
+    INSERT INTO tag_engagement_buckets (tag_name, bucket, likes, saves, comments)
+    SELECT td.name, date_trunc('hour', e.created_at), SUM(e.likes), SUM(e.saves), SUM(e.comments)
+    FROM trending_events e
+    JOIN post_tags pt ON pt.post_id = e.post_id
+    JOIN tag_dictionary td ON td.id = pt.tag_id
+    GROUP BY 1, 2
+    ON CONFLICT (tag_name, bucket) DO UPDATE
+    SET likes = tag_engagement_buckets.likes + EXCLUDED.likes,
+        saves = tag_engagement_buckets.saves + EXCLUDED.saves,
+        comments = tag_engagement_buckets.comments + EXCLUDED.comments
+""")
+
+# Weight of one bucket, decayed from its middle to the end of the run
+_bucket_weight = f"""
+    (b.likes * {WEIGHTS["likes"]} + b.saves * {WEIGHTS["saves"]} + b.comments * {WEIGHTS["comments"]})
+    * POWER(2.0, GREATEST((EXTRACT(EPOCH FROM b.bucket)::float8 + 1800 - :epoch) / :half_life - :ref, {_MIN_EXPONENT}))
+"""
+
+_touched_posts = "SELECT DISTINCT post_id FROM trending_events"
+
+_touched_tags = """
+    SELECT DISTINCT td.name
+    FROM trending_events e
+    JOIN post_tags pt ON pt.post_id = e.post_id
+    JOIN tag_dictionary td ON td.id = pt.tag_id
+"""
+
+_post_scores = f"""
+    SELECT b.post_id, SUM({_bucket_weight}) AS score
+    FROM post_engagement_buckets b
+    WHERE b.post_id IN ({_touched_posts})
+    GROUP BY b.post_id
+"""
+
+_tag_scores = f"""
+    SELECT b.tag_name, SUM({_bucket_weight}) AS score
+    FROM tag_engagement_buckets b
+    WHERE b.tag_name IN ({_touched_tags})
+    GROUP BY b.tag_name
+"""
+
+# Touched rows whose buckets no longer add up to anything
+_unscore_posts = text(f"""
+    DELETE FROM post_trend_scores
+    WHERE post_id IN ({_touched_posts})
+      AND post_id NOT IN (SELECT post_id FROM ({_post_scores}) s WHERE s.score > 0)
+""")
+
+_unscore_tags = text(f"""
+    DELETE FROM tag_trend_scores
+    WHERE tag_name IN ({_touched_tags})
+      AND tag_name NOT IN (SELECT tag_name FROM ({_tag_scores}) s WHERE s.score > 0)
+""")
+
+_score_posts = text(f"""
+    INSERT INTO post_trend_scores (post_id, log_score)
+    SELECT s.post_id, :ref + LN(s.score) / LN(2.0)
+    FROM ({_post_scores}) s
+    WHERE s.score > 0
+    ON CONFLICT (post_id) DO UPDATE
+    SET log_score = EXCLUDED.log_score
+""")
+
+_score_tags = text(f"""
+    INSERT INTO tag_trend_scores (tag_name, log_score)
+    SELECT s.tag_name, :ref + LN(s.score) / LN(2.0)
+    FROM ({_tag_scores}) s
+    WHERE s.score > 0
+    ON CONFLICT (tag_name) DO UPDATE
+    SET log_score = EXCLUDED.log_score
+""")
+
+_prune = [
+    text("DELETE FROM post_trend_scores WHERE log_score < :min_log_score"),
+    text("DELETE FROM tag_trend_scores WHERE log_score < :min_log_score"),
+    text("DELETE FROM post_engagement_buckets WHERE bucket < :bucket_cutoff"),
+    text("DELETE FROM tag_engagement_buckets WHERE bucket < :bucket_cutoff"),
+]
+
+# DELETE rather than TRUNCATE so readers keep seeing the previous ranking
+# until this transaction commits
+_rank_posts = [
+    text("DELETE FROM trending_posts"),
+    text(f"""
+        INSERT INTO trending_posts (rank, post_id, score)
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY s.log_score DESC, s.post_id DESC),
+            s.post_id,
+            POWER(2.0, GREATEST(s.log_score - :ref, {_MIN_EXPONENT}))
+        FROM (
+            SELECT post_id, log_score FROM post_trend_scores
+            ORDER BY log_score DESC, post_id DESC
+            LIMIT :size
+        ) s
+    """),
+]
+
+_rank_tags = [
+    text("DELETE FROM trending_tags"),
+    text(f"""
+        INSERT INTO trending_tags (rank, tag_name, score)
+        SELECT
+            ROW_NUMBER() OVER (ORDER BY s.log_score DESC, s.tag_name),
+            s.tag_name,
+            POWER(2.0, GREATEST(s.log_score - :ref, {_MIN_EXPONENT}))
+        FROM (
+            SELECT tag_name, log_score FROM tag_trend_scores
+            ORDER BY log_score DESC, tag_name
+            LIMIT :size
+        ) s
+    """),
+]
+
+_advance_watermark = text("""
+    UPDATE trending_watermark SET processed_until = :until WHERE name = :name
+""")
+
+
+def _log_offset(moment):
+    """log2 of the decay factor between EPOCH and `moment`."""
+    return (moment - EPOCH).total_seconds() / (HALF_LIFE_HOURS * 3600)
+
+
+async def refresh_trending(db):
+    """
+    Folds the engagement since the last run into the trending tables and
+    commits. Returns the number of events read and of ranked posts and tags.
+    """
+    watermark = (await db.execute(_lock_watermark, {"lag": LAG_SECONDS, "name": _WATERMARK})).fetchone()
+    if watermark is None:
+        raise RuntimeError("trending_watermark is missing; run `python -m blog.cli migrate`")
+
+    since, until = watermark.processed_until, watermark.run_until
+    if until <= since:
+        await db.rollback()
+        return {"events": 0, "posts": 0, "tags": 0}
+
+    ref = _log_offset(until)
+    score_params = {"epoch": EPOCH.timestamp(), "half_life": HALF_LIFE_HOURS * 3600, "ref": ref}
+
+    await db.execute(_create_events)
+    events = await db.execute(_collect_events, {"since": since, "until": until})
+
+    await db.execute(_forget_removals, {"until": until})
+
+    await db.execute(_bucket_posts)
+    await db.execute(_bucket_tags)
+    for stmt in (_unscore_posts, _unscore_tags, _score_posts, _score_tags):
+        await db.execute(stmt, score_params)
+
+    for stmt in _prune:
+        await db.execute(stmt, {
+            "min_log_score": ref + math.log2(MIN_SCORE),
+            "bucket_cutoff": until - timedelta(days=BUCKET_RETENTION_DAYS),
+        })
+
+    ranked = {}
+    for name, (clear, rank) in (("posts", _rank_posts), ("tags", _rank_tags)):
+        await db.execute(clear)
+        ranked[name] = (await db.execute(rank, {"ref": ref, "size": TRENDING_SIZE})).rowcount
+
+    await db.execute(_advance_watermark, {"until": until, "name": _WATERMARK})
+    await db.commit()
+
+    return {"events": events.rowcount, **ranked}
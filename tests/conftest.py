@@ -0,0 +1,84 @@
+import os
+import uuid
+from pathlib import Path
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from blog.utils import storage as storage_module
+from blog.utils.storage import LocalStorage, set_backend
+
+# Tests that need Postgres run against TEST_DATABASE_URL (an asyncpg URL,
+# e.g. postgresql+asyncpg://postgres@localhost/test) and are skipped without
+# it. Each test gets a schema of its own, dropped afterwards.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    # blog.database reflects DATABASE_URL on import (see blog/routers/uploads.py)
+    os.environ.setdefault("DATABASE_URL", TEST_DATABASE_URL)
+
+MIGRATIONS_DIR = Path(__file__).parent.parent / "blog" / "database" / "migrations"
+
+# Migrations that only create tables of their own
+MIGRATIONS = ["010_upload_sessions.sql", "012_media_objects.sql", "013_job_outbox.sql"]
+
+# Just the columns the media code reads from the base tables, which predate
+# the migrations
+BASE_TABLES = """
+    CREATE TABLE users (id UUID PRIMARY KEY, user_image TEXT);
+    CREATE TABLE predictions (id SERIAL PRIMARY KEY, user_id UUID, generated_name TEXT, image_url TEXT);
+    CREATE TABLE post_images (id SERIAL PRIMARY KEY, post_id UUID, user_id UUID, generated_name TEXT, image_url TEXT);
+    CREATE TABLE post_videos (id SERIAL PRIMARY KEY, post_id UUID, user_id UUID, generated_name TEXT, video_url TEXT);
+    CREATE TABLE comment_images (id SERIAL PRIMARY KEY, comment_id UUID, user_id UUID, generated_name TEXT, image_url TEXT);
+    CREATE TABLE comment_videos (id SERIAL PRIMARY KEY, comment_id UUID, user_id UUID, generated_name TEXT, video_url TEXT);
+    CREATE TABLE message_images (id SERIAL PRIMARY KEY, message_id UUID, user_id UUID, generated_name TEXT, image_url TEXT);
+    CREATE TABLE message_videos (id SERIAL PRIMARY KEY, message_id UUID, user_id UUID, generated_name TEXT, video_url TEXT);
+    CREATE TABLE product_images (id SERIAL PRIMARY KEY, product_id UUID, user_id UUID, generated_name TEXT, image_url TEXT);
+"""
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """A LocalStorage under tmp_path, installed as the storage backend."""
+    previous = storage_module._backend  # not get_backend(), which would create the env's backend
+    backend = LocalStorage(tmp_path, base_url="http://testserver/media", secret="test-secret")
+    set_backend(backend)
+    yield backend
+    set_backend(previous)
+
+
+async def _run_script(conn, sql):
+    # asyncpg runs a multi-statement script only without parameters, on the raw connection
+    raw = await conn.get_raw_connection()
+    await raw.driver_connection.execute(sql)
+
+
+@pytest.fixture
+async def db():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    schema = f"test_{uuid.uuid4().hex}"
+    admin = create_async_engine(TEST_DATABASE_URL)
+    async with admin.begin() as conn:
+        await conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+    engine = create_async_engine(TEST_DATABASE_URL, connect_args={"server_settings": {"search_path": schema}})
+    async with engine.begin() as conn:
+        await _run_script(conn, BASE_TABLES)
+        for name in MIGRATIONS:
+            await _run_script(conn, (MIGRATIONS_DIR / name).read_text())
+
+    try:
+        async with async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)() as session:
+            yield session
+    finally:
+        await engine.dispose()
+        async with admin.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        await admin.dispose()
@@ -0,0 +1,190 @@
+import os
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import httpx
+import pytest
+from fastapi import FastAPI, HTTPException
+from sqlalchemy import text
+
+from blog.utils import media
+from blog.utils.media import _check_sizes, claim_uploads, create_upload_session
+from blog.utils.media_gc import collect_garbage
+from blog.utils.storage import LOCAL_UPLOAD_PATH, object_key
+
+pytestmark = pytest.mark.anyio
+
+USER_ID = str(uuid.uuid4())
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 24
+
+
+@pytest.fixture
+async def client(db, storage):
+    """An app serving only the upload routes, whose PUT target writes to `storage`."""
+    from blog.routers import uploads
+
+    app = FastAPI()
+    app.include_router(uploads.router)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://testserver") as client:
+        yield client
+
+
+async def _upload(client, session, body):
+    return await client.request(session["method"], session["url"], headers=session["headers"], content=body)
+
+
+def _with_query(url, **changes):
+    query = {key: values[0] for key, values in parse_qs(urlsplit(url).query).items()}
+    return f"{LOCAL_UPLOAD_PATH}?{urlencode({**query, **changes})}"
+
+
+async def test_presigned_upload_is_claimed(db, storage, client):
+    session = await create_upload_session(db, USER_ID, "leaf.png", "image/png", len(PNG))
+    assert session["method"] == "PUT" and not session["exists"]
+
+    response = await _upload(client, session, PNG)
+    assert response.status_code == 200
+
+    upload_id = str(session["upload_id"])
+    [item] = await claim_uploads(db, USER_ID, [upload_id], "post")
+    await db.commit()
+    assert item.kind == "image"
+    assert item.size == len(PNG)
+    assert item.url == storage.url(object_key(USER_ID, item.generated_name))
+    assert storage.path(object_key(USER_ID, item.generated_name)).read_bytes() == PNG
+
+    jobs = (await db.execute(text("SELECT kind, payload FROM job_outbox"))).fetchall()
+    assert [(job.kind, job.payload["name"]) for job in jobs] == [("media.renditions", item.generated_name)]
+
+    # A session is consumed once
+    with pytest.raises(HTTPException) as error:
+        await claim_uploads(db, USER_ID, [upload_id], "post")
+    assert error.value.status_code == 400
+
+
+async def test_expired_session_is_not_claimed(db, storage, client):
+    session = await create_upload_session(db, USER_ID, "leaf.png", "image/png", len(PNG))
+    assert (await _upload(client, session, PNG)).status_code == 200
+    await db.execute(text("UPDATE upload_sessions SET expires_at = NOW() - INTERVAL '1 second'"))
+    await db.commit()
+
+    with pytest.raises(HTTPException) as error:
+        await claim_uploads(db, USER_ID, [str(session["upload_id"])], "post")
+    assert error.value.status_code == 400
+    assert "expired" in error.value.detail
+
+
+async def test_expired_url_is_refused(db, storage, client):
+    key = object_key(USER_ID, "leaf.png")
+    presigned = await storage.presign_upload(key, "image/png", len(PNG), datetime.now(timezone.utc) - timedelta(seconds=1))
+
+    response = await _upload(client, presigned, PNG)
+    assert response.status_code == 403
+    assert storage.path(key).exists() is False
+
+
+async def test_bad_signature_is_refused(db, storage, client):
+    session = await create_upload_session(db, USER_ID, "leaf.png", "image/png", len(PNG))
+
+    for changes in ({"signature": "0" * 64}, {"max_size": len(PNG) * 10}, {"expires": int(time.time()) + 86400}):
+        tampered = {**session, "url": _with_query(session["url"], **changes)}
+        assert (await _upload(client, tampered, PNG)).status_code == 403
+
+
+async def test_oversize_upload_is_refused(db, storage, client):
+    session = await create_upload_session(db, USER_ID, "leaf.png", "image/png", len(PNG))
+
+    response = await _upload(client, session, PNG + b"\x00")
+    assert response.status_code == 413
+
+    # Nothing was stored, so the session cannot be claimed either
+    with pytest.raises(HTTPException) as error:
+        await claim_uploads(db, USER_ID, [str(session["upload_id"])], "post")
+    assert error.value.status_code == 400
+    assert "not been completed" in error.value.detail
+
+
+async def test_object_larger_than_announced_is_not_claimed(db, storage):
+    session = await create_upload_session(db, USER_ID, "leaf.png", "image/png", len(PNG))
+    # Written around the PUT route, as a misbehaving storage client could
+    [name] = (await db.execute(text("SELECT generated_name FROM upload_sessions"))).scalars().all()
+    path = storage.path(object_key(USER_ID, name))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(PNG + b"\x00")
+
+    with pytest.raises(HTTPException) as error:
+        await claim_uploads(db, USER_ID, [str(session["upload_id"])], "post")
+    assert error.value.status_code == 400
+    assert "larger than announced" in error.value.detail
+
+
+async def test_collect_garbage_dry_run(db, storage):
+    old = time.time() - 2 * 86400
+
+    def store(name, mtime=None):
+        path = storage.path(object_key(USER_ID, name))
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * 10)
+        if mtime:
+            os.utime(path, (mtime, mtime))
+
+    store("kept.jpg", old)
+    store("kept.jpg.thumb.webp", old)
+    # The same content under another extension has renditions of its own
+    store("kept.png", old)
+    store("kept.png.thumb.webp", old)
+    # Renditions stored before they kept the extension
+    store("legacy.jpg", old)
+    store("legacy.thumb.webp", old)
+    store("orphan.jpg", old)
+    store("recent.jpg")
+    await db.execute(text("""
+        INSERT INTO post_images (post_id, user_id, generated_name, image_url)
+        VALUES (:post_id, :user_id, 'kept.jpg', ''), (:post_id, :user_id, 'legacy.jpg', ''),
+               (:post_id, :user_id, 'gone.jpg', '')
+    """), {"post_id": uuid.uuid4(), "user_id": USER_ID})
+    await db.commit()
+
+    report = await collect_garbage(db, dry_run=True, grace_seconds=86400)
+
+    assert report.dry_run
+    assert report.scanned == 8
+    assert report.orphaned == [object_key(USER_ID, name) for name in ("kept.png", "kept.png.thumb.webp", "orphan.jpg")]
+    assert report.orphaned_bytes == 30
+    assert [(table, key) for table, _, key in report.missing] == [("post_images", object_key(USER_ID, "gone.jpg"))]
+    assert report.deleted == 0
+    assert storage.path(object_key(USER_ID, "orphan.jpg")).exists()
+    assert (await db.execute(text("SELECT COUNT(*) FROM post_images"))).scalar() == 3
+
+
+def _files(*sizes):
+    return [(SimpleNamespace(filename=f"file{i}.jpg"), "image", size) for i, size in enumerate(sizes)]
+
+
+def test_size_caps(monkeypatch):
+    monkeypatch.setattr(media, "MEDIA_MAX_FILE_BYTES", 100)
+    monkeypatch.setattr(media, "MEDIA_MAX_REQUEST_BYTES", 150)
+
+    _check_sizes(_files(100, 50))
+
+    with pytest.raises(HTTPException) as error:
+        _check_sizes(_files(10, 101))
+    assert error.value.status_code == 413
+    assert "file1.jpg" in error.value.detail
+
+    with pytest.raises(HTTPException) as error:
+        _check_sizes(_files(100, 51))
+    assert error.value.status_code == 413
+    assert "in total" in error.value.detail
+
+
+async def test_upload_session_size_cap(monkeypatch):
+    monkeypatch.setattr(media, "MEDIA_MAX_FILE_BYTES", 100)
+
+    # Refused before the database is touched
+    with pytest.raises(HTTPException) as error:
+        await create_upload_session(None, USER_ID, "big.mp4", "video/mp4", 101)
+    assert error.value.status_code == 413